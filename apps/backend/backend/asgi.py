@@ -25,9 +25,8 @@ from django.contrib.auth import get_user_model
 from urllib.parse import parse_qs
 from chats.routing import websocket_urlpatterns  # import after setup
 from loguru import logger
-from users.models import UserProfile
+from users.identity import user_id_from_token, identity_loader
 from django.conf import settings
-from asgiref.sync import sync_to_async
 
 User = get_user_model()
 
@@ -42,13 +41,12 @@ class TokenAuthMiddleware(BaseMiddleware):
 
         if token:
             try:
-                # Verify the token and get the user
-                access_token = AccessToken(token)
-                user_id = access_token['user_id']
+                # Verify the token and get the user (both cached per worker)
+                user_id = user_id_from_token(token)
                 logger.info(f"Token decoded successfully. User ID: {user_id}")
                 
-                # Get the UserProfile asynchronously
-                user = await self.get_user_profile(user_id)
+                # Misses of concurrent connects are loaded with one query
+                user = await identity_loader.load(user_id)
                 if user:
                     logger.info(f"User authenticated successfully: {user.email}")
                     scope['user'] = user
@@ -65,12 +63,10 @@ class TokenAuthMiddleware(BaseMiddleware):
 
         return await super().__call__(scope, receive, send)
 
-    @sync_to_async
-    def get_user_profile(self, user_id):
-        try:
-            return UserProfile.objects.get(user_id=user_id)
-        except UserProfile.DoesNotExist:
-            return None
+if not settings.DEBUG and not settings.CHANNEL_REDIS_HOSTS:
+    logger.warning(
+        "CHANNEL_REDIS_HOSTS is not set: chat messages only reach clients connected to the same worker process"
+    )
 
 application = ProtocolTypeRouter({
     "http": get_asgi_application(),
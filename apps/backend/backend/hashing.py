@@ -0,0 +1,158 @@
+"""
+Password hashing off the request threads.
+
+PBKDF2 holds the GIL for its whole run, so hashing inside sync views (which
+run in the asgiref thread pool under uvicorn) stalls every other request of
+the worker during a login burst. hash_password() and verify_password() hand
+the work to a small process pool instead and the request thread just waits on
+the result. The number of hashes queued or running is capped; beyond that the
+caller gets a 503 straight away rather than piling up behind the burst.
+
+verify_password() also reports when a stored hash uses outdated hasher
+parameters (e.g. a raised PBKDF2 iteration count), returning a fresh hash the
+caller saves, so hashes upgrade transparently on the next successful login.
+
+Set PASSWORD_HASHING["WORKERS"] to 0 to hash inline, e.g. in tests.
+"""
+import multiprocessing
+import threading
+import time
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor, TimeoutError as FutureTimeout
+from concurrent.futures.process import BrokenProcessPool
+
+from django.conf import settings
+from django.contrib.auth.hashers import make_password, check_password
+from loguru import logger
+from ninja.errors import HttpError
+
+_config = getattr(settings, "PASSWORD_HASHING", {})
+WORKERS = _config.get("WORKERS", 2)
+MAX_PENDING = _config.get("MAX_PENDING", 64)
+TIMEOUT_SECONDS = _config.get("TIMEOUT_SECONDS", 10)
+LATENCY_SAMPLES = 1000
+
+
+class HashingBusy(HttpError):
+    def __init__(self):
+        super().__init__(503, "Too many login requests right now, please retry shortly.")
+
+
+def _hash(password):
+    return make_password(password)
+
+
+def _verify(password, encoded):
+    """(is_correct, new encoded hash if the stored one should be upgraded, else None)"""
+    outdated = []
+    is_correct = check_password(password, encoded, setter=outdated.append)
+    return is_correct, make_password(password) if is_correct and outdated else None
+
+
+class HashingExecutor:
+    def __init__(self, workers=WORKERS, max_pending=MAX_PENDING, timeout=TIMEOUT_SECONDS):
+        self.workers = workers
+        self.max_pending = max_pending
+        self.timeout = timeout
+        self._pool = None
+        self._lock = threading.Lock()
+        self._slots = threading.BoundedSemaphore(max_pending)
+        self._latencies = deque(maxlen=LATENCY_SAMPLES)   # seconds from submit to result, incl. queueing
+        self.pending = 0      # jobs queued or running, including ones whose caller timed out
+        self.completed = 0
+        self.failed = 0
+        self.timed_out = 0    # callers that stopped waiting; their jobs still finish and are counted above
+        self.rejected = 0
+
+    def _get_pool(self):
+        with self._lock:
+            if self._pool is None:
+                # spawn: forking a process that already runs threads (uvicorn, asgiref) is unsafe
+                self._pool = ProcessPoolExecutor(
+                    max_workers=self.workers, mp_context=multiprocessing.get_context("spawn")
+                )
+                logger.info(f"Started password hashing pool with {self.workers} processes")
+            return self._pool
+
+    def run(self, fn, *args):
+        if not self._slots.acquire(blocking=False):
+            with self._lock:
+                self.rejected += 1
+            logger.warning(f"Password hashing queue full ({self.max_pending} pending), rejecting request")
+            raise HashingBusy()
+        started = time.monotonic()
+        with self._lock:
+            self.pending += 1
+        if not self.workers:
+            try:
+                result = fn(*args)
+            except BaseException:
+                self._finish(started, failed=True)
+                raise
+            self._finish(started, failed=False)
+            return result
+        try:
+            future = self._get_pool().submit(fn, *args)
+        except BaseException:
+            self._finish(started, failed=True)
+            raise
+        # The slot is held until the job itself ends, not until this caller stops
+        # waiting, so MAX_PENDING bounds the work really queued in the pool
+        future.add_done_callback(
+            lambda f: self._finish(started, failed=f.cancelled() or f.exception() is not None)
+        )
+        try:
+            return future.result(timeout=self.timeout)
+        except FutureTimeout:
+            with self._lock:
+                self.timed_out += 1
+            logger.warning(f"Password hash took longer than {self.timeout}s, giving up on it")
+            raise HashingBusy()
+        except BrokenProcessPool:
+            logger.error("Password hashing pool broke, restarting it on the next request")
+            with self._lock:
+                self._pool = None
+            raise
+
+    def _finish(self, started, failed):
+        with self._lock:
+            self.pending -= 1
+            if failed:
+                self.failed += 1
+            else:
+                self.completed += 1
+            self._latencies.append(time.monotonic() - started)
+        self._slots.release()
+
+    def shutdown(self):
+        with self._lock:
+            pool, self._pool = self._pool, None
+        if pool is not None:
+            pool.shutdown(wait=True)
+
+    def stats(self):
+        with self._lock:
+            latencies = sorted(self._latencies)
+        percentile = lambda p: round(latencies[min(int(len(latencies) * p), len(latencies) - 1)] * 1000, 2) if latencies else None
+        return {
+            "workers": self.workers,
+            "max_pending": self.max_pending,
+            "pending": self.pending,
+            "completed": self.completed,
+            "failed": self.failed,
+            "timed_out": self.timed_out,
+            "rejected": self.rejected,
+            "latency_ms": {"p50": percentile(0.5), "p95": percentile(0.95), "p99": percentile(0.99), "samples": len(latencies)},
+        }
+
+
+password_hasher = HashingExecutor()
+
+
+def hash_password(password):
+    return password_hasher.run(_hash, password)
+
+
+def verify_password(password, encoded):
+    """Returns (is_correct, upgraded_hash_or_None)."""
+    return password_hasher.run(_verify, password, encoded)
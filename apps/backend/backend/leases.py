@@ -0,0 +1,63 @@
+"""
+Leased work queues for moderation.
+
+A moderator claims a batch of pending items; each claimed row records who holds
+it (claimed_by) and until when (claim_expires_at). Claiming locks candidate
+rows with SELECT ... FOR UPDATE SKIP LOCKED, so concurrent moderators never
+wait on each other or receive the same item, and a lease that ran out (the
+moderator closed the tab) simply makes the item claimable again.
+
+Deciding on an item goes through the same check: the decision's UPDATE
+filters on claimable_by() and clears the lease (LEASE_CLEARED) in the same
+statement, so a moderator can't overrule a colleague's live claim and a
+decided item never stays leased.
+
+Models taking part need nullable `claimed_by` (moderator id) and
+`claim_expires_at` fields.
+"""
+from datetime import timedelta
+
+from django.conf import settings
+from django.db import transaction
+from django.db.models import Q
+from django.utils import timezone
+
+DEFAULT_LEASE_SECONDS = getattr(settings, "MODERATION_LEASE_SECONDS", 300)
+MAX_CLAIM_BATCH = 100
+LEASE_CLEARED = {"claimed_by": None, "claim_expires_at": None}
+
+
+def claimable_by(moderator_id, now=None):
+    """Rows with no live lease, or leased to this moderator (None: no moderator)."""
+    now = now or timezone.now()
+    return Q(claimed_by__isnull=True) | Q(claim_expires_at__lte=now) | Q(claimed_by=moderator_id)
+
+
+def held_by_other(claimed_by, claim_expires_at, moderator_id, now=None):
+    """Whether an item's lease, as read from its row, keeps this moderator from deciding on it."""
+    now = now or timezone.now()
+    return claimed_by is not None and claimed_by != moderator_id and claim_expires_at > now
+
+
+def claim_batch(queryset, moderator_id: int, limit: int, lease_seconds: int = None):
+    """
+    Lease up to `limit` items of an ordered queryset of pending work to a moderator.
+    Items the moderator already holds are returned again with a renewed lease.
+    Returns (primary keys in queryset order, lease expiry).
+    """
+    now = timezone.now()
+    expires_at = now + timedelta(seconds=lease_seconds or DEFAULT_LEASE_SECONDS)
+    with transaction.atomic():
+        claimable = queryset.filter(claimable_by(moderator_id, now))
+        pks = list(claimable.select_for_update(skip_locked=True).values_list("pk", flat=True)[:limit])
+        if pks:
+            queryset.model.objects.filter(pk__in=pks).update(claimed_by=moderator_id, claim_expires_at=expires_at)
+    return pks, expires_at
+
+
+def release_claims(model, moderator_id: int, pks=None):
+    """Give a moderator's leases back to the pool, all of them or only the given items."""
+    queryset = model.objects.filter(claimed_by=moderator_id)
+    if pks is not None:
+        queryset = queryset.filter(pk__in=pks)
+    return queryset.update(claimed_by=None, claim_expires_at=None)
@@ -0,0 +1,153 @@
+"""
+Keeping the per-worker in-memory indexes current without stalling requests.
+
+Every worker holds its own copy of the product search, facet, geo,
+autocomplete and delivery matching indexes. Changes made in the worker reach
+them through signals; changes made in other workers are picked up by a daemon
+thread per index, never on the request path:
+
+- every `refresh_seconds` it calls catch_up(), which re-reads only the rows
+  changed since the previous pass (models with a change timestamp) or
+  rebuilds the index (models without one);
+- every `rebuild_seconds` it rebuilds the index anyway, which also drops rows
+  deleted outright in another worker.
+
+A rebuild loads fresh structures into a detached copy of the index without
+holding the index lock, then swaps them in under it, so searches and signal
+updates never wait for a table scan. Changes recorded while the copy loads
+are replayed onto it before the swap. Only the very first build runs in the
+request that needs the index.
+
+Subclasses list their data attributes in STATE and implement _reset(),
+_load(), _apply(change) and optionally _changed_since(since).
+"""
+import copy
+import threading
+import time
+from datetime import timedelta
+
+from django.db import connections
+from django.utils import timezone
+from loguru import logger
+
+
+class RefreshingIndex:
+    STATE = ()      # attributes set by _reset() and filled by _load()
+    name = "index"
+
+    def __init__(self, refresh_seconds=60, rebuild_seconds=3600):
+        self.refresh_seconds = refresh_seconds
+        self.rebuild_seconds = rebuild_seconds
+        self._lock = threading.RLock()       # guards STATE
+        self._build_lock = threading.Lock()  # one build at a time
+        self._built_at = None                # monotonic time of the last build
+        self._synced_at = None               # wall-clock time the last pass started reading
+        self._pending = None                 # changes recorded while a build loads
+        self._refresher = None
+        self._reset()
+
+    def _reset(self):
+        raise NotImplementedError
+
+    def _load(self):
+        """Fill the empty structures from the database. Runs on a detached copy, without the lock."""
+        raise NotImplementedError
+
+    def _apply(self, change):
+        """Apply one recorded change to the structures. Called with the lock held."""
+        raise NotImplementedError
+
+    def _changed_since(self, since):
+        """Changes for rows written at or after `since`, or None when only a rebuild can tell."""
+        return None
+
+    def build(self):
+        """(Re)build from the database and swap the result in."""
+        with self._build_lock:
+            self._build()
+
+    def _build(self):
+        started, clock = timezone.now(), time.monotonic()
+        with self._lock:
+            self._pending = []
+        try:
+            fresh = copy.copy(self)
+            fresh._reset()
+            fresh._load()
+            with self._lock:
+                for change in self._pending:
+                    fresh._apply(change)
+                for name in self.STATE:
+                    setattr(self, name, getattr(fresh, name))
+                self._built_at = time.monotonic()
+                self._synced_at = started
+        finally:
+            with self._lock:
+                self._pending = None
+        logger.info(f"{self.name} built in {time.monotonic() - clock:.2f}s: {self.describe()}")
+
+    def describe(self):
+        return ""
+
+    def invalidate(self):
+        """Rebuild from the database on next use."""
+        self._built_at = None
+
+    def ensure_built(self):
+        """Build on first use; later refreshes happen in the background."""
+        if self._built_at is None:
+            with self._build_lock:
+                if self._built_at is None:
+                    self._build()
+        if self._refresher is None:
+            self._start_refresher()
+
+    @property
+    def tracking(self):
+        """Whether changes are being recorded; callers can skip preparing a change otherwise."""
+        return self._built_at is not None or self._pending is not None
+
+    def record(self, change):
+        """Apply a change made in this worker (no-op until the index is built)."""
+        with self._lock:
+            if self._pending is not None:
+                self._pending.append(change)
+            if self._built_at is not None:
+                self._apply(change)
+
+    def catch_up(self):
+        """Apply rows changed since the last pass, or rebuild if the model can't tell which."""
+        if self._synced_at is None:
+            return self.build()
+        started = timezone.now()
+        # Re-read a window before the last pass so rows committed late by slow transactions aren't missed
+        changes = self._changed_since(self._synced_at - timedelta(seconds=self.refresh_seconds))
+        if changes is None:
+            return self.build()
+        for change in changes:
+            self.record(change)
+        self._synced_at = started
+
+    def _start_refresher(self):
+        if not self.refresh_seconds:
+            return
+        with self._lock:
+            if self._refresher is None:
+                self._refresher = threading.Thread(target=self._refresh_loop, name=f"{self.name} refresh", daemon=True)
+                self._refresher.start()
+
+    def _refresh_loop(self):
+        rebuilt_at = time.monotonic()
+        while True:
+            time.sleep(self.refresh_seconds)
+            try:
+                if time.monotonic() - rebuilt_at >= self.rebuild_seconds:
+                    self.build()
+                    rebuilt_at = time.monotonic()
+                else:
+                    self.catch_up()
+            except Exception as e:
+                logger.error(f"Refreshing {self.name} failed: {str(e)}")
+            finally:
+                # This thread's connections would otherwise stay open between passes
+                connections.close_all()
@@ -41,6 +41,7 @@ MIDDLEWARE = [
     'django.contrib.auth.middleware.AuthenticationMiddleware',
     'django.contrib.messages.middleware.MessageMiddleware',
     'django.middleware.clickjacking.XFrameOptionsMiddleware',
+    'delivery_agent.middleware.DeliveryAgentAuthMiddleware',
 ]
 
 ROOT_URLCONF = 'backend.urls'
@@ -98,12 +99,81 @@ DEFAULT_AUTO_FIELD = 'django.db.models.BigAutoField'
 # CORS
 CORS_ALLOW_ALL_ORIGINS = True
 
-# ✅ Channels WebSocket layer (in-memory for development)
-CHANNEL_LAYERS = {
-    "default": {
-        "BACKEND": "channels.layers.InMemoryChannelLayer",
-    },
+# Channels WebSocket layer shared by every uvicorn worker and replica.
+# CHANNEL_REDIS_HOSTS is a comma-separated list of Redis-protocol servers (Redis,
+# Valkey, KeyDB, ...). Groups and channels are sharded across them by consistent
+# hashing, so every replica must list the same hosts in the same order; a group
+# send costs one pipeline and one Lua script per shard, however many members the
+# room has. Without hosts a process-local layer is used, which only works with a
+# single worker (development, tests).
+CHANNEL_REDIS_HOSTS = [host.strip() for host in os.getenv("CHANNEL_REDIS_HOSTS", "").split(",") if host.strip()]
+if CHANNEL_REDIS_HOSTS:
+    CHANNEL_LAYERS = {
+        "default": {
+            "BACKEND": "channels_redis.core.RedisChannelLayer",
+            "CONFIG": {
+                "hosts": CHANNEL_REDIS_HOSTS,
+                "prefix": os.getenv("CHANNEL_LAYER_PREFIX", "hand2hand"),
+                "capacity": int(os.getenv("CHANNEL_LAYER_CAPACITY", "1000")),
+                "expiry": int(os.getenv("CHANNEL_LAYER_EXPIRY", "30")),
+            },
+        },
+    }
+else:
+    CHANNEL_LAYERS = {
+        "default": {
+            "BACKEND": "chats.layers.LocalChannelLayer",
+        },
+    }
+
+# Messages per chat history frame sent on connect and per "history" request (clients may ask for fewer)
+CHAT_HISTORY_PAGE_SIZE = int(os.getenv("CHAT_HISTORY_PAGE_SIZE", "20"))
+CHAT_HISTORY_MAX_PAGE_SIZE = int(os.getenv("CHAT_HISTORY_MAX_PAGE_SIZE", "100"))
+# Messages per "sync" frame when a client reconnects with ?since=<last seen message id>
+CHAT_SYNC_BATCH_SIZE = int(os.getenv("CHAT_SYNC_BATCH_SIZE", "100"))
+
+# Per-worker caches used to authenticate WebSocket connects
+WEBSOCKET_AUTH_CACHE = {
+    "MAX_ENTRIES": int(os.getenv("WEBSOCKET_AUTH_CACHE_MAX_ENTRIES", "10000")),
+    "TOKEN_TTL_SECONDS": int(os.getenv("WEBSOCKET_TOKEN_CACHE_TTL", "3600")),
+    "IDENTITY_TTL_SECONDS": int(os.getenv("WEBSOCKET_IDENTITY_CACHE_TTL", "300")),
+    "BATCH_WINDOW_MS": int(os.getenv("WEBSOCKET_IDENTITY_BATCH_MS", "5")),
+}
+
+# Per-worker caches used by DeliveryAgentAuthMiddleware
+DELIVERY_AGENT_AUTH_CACHE = {
+    "MAX_ENTRIES": int(os.getenv("DELIVERY_AGENT_AUTH_CACHE_MAX_ENTRIES", "10000")),
+    "TOKEN_TTL_SECONDS": int(os.getenv("DELIVERY_AGENT_TOKEN_CACHE_TTL", "1800")),
+    "STATUS_TTL_SECONDS": int(os.getenv("DELIVERY_AGENT_STATUS_CACHE_TTL", "60")),
 }
+
+# Read-through cache for product listing pages (per worker process)
+PRODUCT_LISTING_CACHE = {
+    "MAX_ENTRIES": int(os.getenv("PRODUCT_LISTING_CACHE_MAX_ENTRIES", "512")),
+    "TTL_SECONDS": int(os.getenv("PRODUCT_LISTING_CACHE_TTL", "30")),
+}
+
+# Per-worker product search/facet/geo/autocomplete indexes: a background thread applies rows other workers
+# changed every REFRESH seconds and rebuilds from scratch (dropping hard-deleted rows) every REBUILD seconds
+PRODUCT_INDEX_REFRESH_SECONDS = int(os.getenv("PRODUCT_INDEX_REFRESH_SECONDS", "60"))
+PRODUCT_INDEX_REBUILD_SECONDS = int(os.getenv("PRODUCT_INDEX_REBUILD_SECONDS", "3600"))
+
+# Rebuild interval of the per-worker agent/request matching index, picking up other workers' changes
+MATCHING_REBUILD_SECONDS = int(os.getenv("MATCHING_REBUILD_SECONDS", "60"))
+
+# How long a moderator keeps claimed queue items before they return to the pool
+MODERATION_LEASE_SECONDS = int(os.getenv("MODERATION_LEASE_SECONDS", "300"))
+
+# Process pool that runs PBKDF2 off the request threads (WORKERS=0 hashes inline)
+PASSWORD_HASHING = {
+    "WORKERS": int(os.getenv("PASSWORD_HASHING_WORKERS", "2")),
+    "MAX_PENDING": int(os.getenv("PASSWORD_HASHING_MAX_PENDING", "64")),
+    "TIMEOUT_SECONDS": int(os.getenv("PASSWORD_HASHING_TIMEOUT", "10")),
+}
+
+# Pending reports after which a listing is hidden until a moderator reviews it (0 disables)
+PRODUCT_REPORT_HIDE_THRESHOLD = int(os.getenv("PRODUCT_REPORT_HIDE_THRESHOLD", "5"))
+
 REST_FRAMEWORK = {
     'DEFAULT_AUTHENTICATION_CLASSES': (
         'rest_framework_simplejwt.authentication.JWTAuthentication',
@@ -8,11 +8,78 @@ from django.contrib.auth.models import AnonymousUser
 from asgiref.sync import sync_to_async
 from users.models import UserProfile
 from chats.models import ChatMessage
-import datetime
+from chats.rooms import get_or_create_room, record_message, mark_read
+from django.db import transaction
+from django.conf import settings
+from urllib.parse import parse_qs
 
 # Configure loguru
 logger.add("logs/chat_consumer.log", rotation="500 MB", level="INFO")
 
+HISTORY_PAGE_SIZE = getattr(settings, "CHAT_HISTORY_PAGE_SIZE", 20)
+HISTORY_MAX_PAGE_SIZE = getattr(settings, "CHAT_HISTORY_MAX_PAGE_SIZE", 100)
+SYNC_BATCH_SIZE = getattr(settings, "CHAT_SYNC_BATCH_SIZE", 100)
+MESSAGE_FIELDS = ("id", "message", "translated_message", "language", "timestamp", "user__email")
+
+
+def serialize_message(msg):
+    return {
+        "id": msg.id,
+        "message": msg.message,
+        "translated": msg.translated_message,
+        "language": msg.language,
+        "sender": msg.user.email if msg.user else "anonymous",
+        "timestamp": msg.timestamp.isoformat(),
+    }
+
+
+def load_history(room_name, before=None, limit=HISTORY_PAGE_SIZE):
+    """
+    One page of a room's messages older than message id `before` (latest page if
+    None), oldest first, as a "history" frame. One query, sender included.
+    """
+    messages = ChatMessage.objects.filter(room_name=room_name)
+    if before is not None:
+        messages = messages.filter(id__lt=before)
+    messages = list(messages.select_related("user").only(*MESSAGE_FIELDS).order_by("-id")[:limit + 1])
+    has_more = len(messages) > limit
+    messages = messages[:limit][::-1]
+    return {
+        "type": "history",
+        "messages": [serialize_message(msg) for msg in messages],
+        "has_more": has_more,
+        "before": messages[0].id if messages else before,
+    }
+
+
+def load_since(room_name, since, limit=SYNC_BATCH_SIZE):
+    """
+    The next batch of a room's messages newer than message id `since`, oldest
+    first, as a "sync" frame; `since` of the frame is where the next batch starts.
+    """
+    messages = list(
+        ChatMessage.objects.filter(room_name=room_name, id__gt=since)
+        .select_related("user").only(*MESSAGE_FIELDS).order_by("id")[:limit + 1]
+    )
+    has_more = len(messages) > limit
+    messages = messages[:limit]
+    return {
+        "type": "sync",
+        "messages": [serialize_message(msg) for msg in messages],
+        "has_more": has_more,
+        "since": messages[-1].id if messages else since,
+    }
+
+
+def parse_since(query_string):
+    """The `since` message id of a connect query string, or None if absent or invalid."""
+    value = parse_qs(query_string.decode() if isinstance(query_string, bytes) else query_string).get("since", [None])[0]
+    try:
+        since = int(value)
+    except (TypeError, ValueError):
+        return None
+    return since if since >= 0 else None
+
 class ChatConsumer(AsyncWebsocketConsumer):
     async def connect(self):
         self.room_name = self.scope["url_route"]["kwargs"]["room_name"]
@@ -35,16 +102,22 @@ class ChatConsumer(AsyncWebsocketConsumer):
             self.translator = None
             logger.error(f"DeepL translator initialization failed: {e}. Translation will be disabled.")
         
+        try:
+            self.room = await sync_to_async(get_or_create_room)(self.room_name)
+        except Exception as e:
+            self.room = None
+            logger.error(f"Failed to register chat room {self.room_name}: {str(e)}")
+
         await self.channel_layer.group_add(self.room_group_name, self.channel_name)
         await self.accept()
 
-        messages = await self.get_past_messages(self.room_name)
-        logger.info(f"Retrieved {len(messages)} past messages for room {self.room_name}")
-        
-        for msg in messages:
-            # Get message data asynchronously
-            message_data = await self.get_message_data(msg)
-            await self.send(text_data=json.dumps(message_data))
+        # The group is joined first, so messages sent while catching up arrive as
+        # broadcasts too; clients drop the duplicates by id.
+        since = parse_since(self.scope.get("query_string", b""))
+        if since is not None:
+            await self.send_missed(since)
+        else:
+            await self.send_history()
 
     async def disconnect(self, close_code):
         logger.info(f"Disconnected from room {self.room_name} with code {close_code}")
@@ -59,6 +132,42 @@ class ChatConsumer(AsyncWebsocketConsumer):
             await self.handle_chat_message(data)
         elif msg_type == "translate":
             await self.handle_translation_request(data)
+        elif msg_type == "history":
+            await self.send_history(data.get("before"), data.get("limit"))
+        elif msg_type == "read":
+            await self.handle_read(data)
+
+    async def send_history(self, before=None, limit=None):
+        """Send one page of past messages as a single frame; `before` pages further back."""
+        try:
+            before = int(before) if before is not None else None
+            limit = min(max(int(limit), 1), HISTORY_MAX_PAGE_SIZE) if limit is not None else HISTORY_PAGE_SIZE
+        except (TypeError, ValueError):
+            await self.send(text_data=json.dumps({"type": "error", "message": "Invalid history request"}))
+            return
+        try:
+            frame = await sync_to_async(load_history)(self.room_name, before, limit)
+        except Exception as e:
+            logger.error(f"Error retrieving history for room {self.room_name}: {str(e)}")
+            return
+        logger.info(f"Sending {len(frame['messages'])} past messages for room {self.room_name}")
+        await self.send(text_data=json.dumps(frame))
+
+    async def send_missed(self, since):
+        """Stream every message after `since` in SYNC_BATCH_SIZE frames, one range scan each."""
+        sent = 0
+        while True:
+            try:
+                frame = await sync_to_async(load_since)(self.room_name, since)
+            except Exception as e:
+                logger.error(f"Error syncing room {self.room_name} since {since}: {str(e)}")
+                return
+            await self.send(text_data=json.dumps(frame))
+            sent += len(frame["messages"])
+            if not frame["has_more"]:
+                break
+            since = frame["since"]
+        logger.info(f"Sent {sent} missed messages for room {self.room_name}")
 
     async def handle_chat_message(self, data):
         message = data.get("message", "")
@@ -68,16 +177,21 @@ class ChatConsumer(AsyncWebsocketConsumer):
         logger.info(f"Processing chat message from {user_email} in room {self.room_name}")
         
         # Save message with proper parameters
-        await self.save_message(self.room_name, self.user, message, None, None)
+        saved = await self.save_message(self.room_name, self.user, message, None, None)
+        if saved is None:
+            await self.send(text_data=json.dumps({"type": "error", "message": "Message could not be sent"}))
+            return
         
-        # Create message data with consistent user information
+        # Create message data with consistent user information; the id lets
+        # clients resume from it with ?since= after a reconnect
         message_data = {
             "type": "chat_message",
+            "id": saved.id,
             "message": message,
             "original": message,
             "language": None,
             "sender": user_email,
-            "timestamp": datetime.datetime.now().isoformat()
+            "timestamp": saved.timestamp.isoformat()
         }
         
         # Send to the group
@@ -90,6 +204,27 @@ class ChatConsumer(AsyncWebsocketConsumer):
         )
         logger.debug(f"Message broadcasted to room {self.room_name}")
 
+    async def handle_read(self, data):
+        """Move the user's read cursor to message_id and tell the room how far they have read."""
+        if isinstance(self.user, AnonymousUser) or self.room is None:
+            return
+        try:
+            message_id = int(data.get("message_id"))
+        except (TypeError, ValueError):
+            await self.send(text_data=json.dumps({"type": "error", "message": "Invalid read receipt"}))
+            return
+        try:
+            result = await sync_to_async(mark_read)(self.room.pk, self.user.user_id, message_id)
+        except Exception as e:
+            logger.error(f"Failed to mark room {self.room_name} read for {self.user.email}: {str(e)}")
+            return
+        if result is None:
+            return
+        await self.channel_layer.group_send(
+            self.room_group_name,
+            {"type": "read_receipt", "reader": self.user.email, "message_id": result[0]}
+        )
+
     async def handle_translation_request(self, data):
         original = data.get("message", "")
         target_lang = data.get("target", "EN-US")
@@ -121,56 +256,33 @@ class ChatConsumer(AsyncWebsocketConsumer):
         await self.send(text_data=json.dumps(message_data))
         logger.debug("Chat message sent to client")
 
-    @sync_to_async
-    def get_message_data(self, msg):
-        try:
-            user_email = msg.user.email if msg.user else "anonymous"
-            return {
-                "message": msg.message,
-                "translated": msg.translated_message,
-                "language": msg.language,
-                "sender": user_email,
-                "timestamp": msg.timestamp.isoformat(),
-            }
-        except Exception as e:
-            logger.error(f"Error getting message data: {str(e)}")
-            return {
-                "message": msg.message,
-                "translated": msg.translated_message,
-                "language": msg.language,
-                "sender": "unknown",
-                "timestamp": msg.timestamp.isoformat(),
-            }
+    async def read_receipt(self, event):
+        await self.send(text_data=json.dumps({
+            "type": "read", "reader": event["reader"], "message_id": event["message_id"]
+        }))
 
     @sync_to_async
     def save_message(self, room_name, user, original, translated, language):
-        user_obj = None
+        user_id = None
         if not isinstance(user, AnonymousUser):
-            try:
-                # User is already a UserProfile instance
-                user_obj = user
-                logger.debug(f"Using existing UserProfile for message: {user.email}")
-            except Exception as e:
-                logger.error(f"Error accessing user profile: {str(e)}")
+            # scope["user"] is a cached UserIdentity, not a model instance
+            user_id = user.user_id
+            logger.debug(f"Saving message for user: {user.email}")
         
         try:
-            ChatMessage.objects.create(
-                room_name=room_name,
-                user=user_obj,
-                message=original,
-                translated_message=translated,
-                language=language
-            )
+            if self.room is None:
+                self.room = get_or_create_room(room_name)
+            with transaction.atomic():
+                saved = ChatMessage.objects.create(
+                    room_name=room_name,
+                    user_id=user_id,
+                    message=original,
+                    translated_message=translated,
+                    language=language
+                )
+                record_message(self.room.pk, saved)
             logger.debug(f"Message saved successfully for room {room_name}")
+            return saved
         except Exception as e:
             logger.error(f"Failed to save message: {str(e)}")
-
-    @sync_to_async
-    def get_past_messages(self, room_name):
-        try:
-            messages = list(ChatMessage.objects.filter(room_name=room_name).order_by("-timestamp")[:20][::-1])
-            logger.debug(f"Retrieved {len(messages)} messages for room {room_name}")
-            return messages
-        except Exception as e:
-            logger.error(f"Error retrieving past messages: {str(e)}")
-            return []
\ No newline at end of file
+            return None
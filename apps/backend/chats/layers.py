@@ -0,0 +1,25 @@
+"""
+Process-local stand-in for the Redis channel layer.
+
+InMemoryChannelLayer keeps channels and groups per layer instance, so two
+instances never see each other's messages. LocalChannelLayer instances that
+name the same `store` share them instead, which lets tests and the fan-out
+benchmark run several "workers" (one layer each) inside one process the way
+replicas share a Redis. It still cannot cross process boundaries: with more
+than one uvicorn worker or replica, set CHANNEL_REDIS_HOSTS.
+"""
+from channels.layers import InMemoryChannelLayer
+
+
+class LocalChannelLayer(InMemoryChannelLayer):
+    _stores = {}   # store name -> (channels, groups) shared by every instance using it
+
+    def __init__(self, store="default", **kwargs):
+        super().__init__(**kwargs)
+        self.store = store
+        self.channels, self.groups = self._stores.setdefault(store, ({}, {}))
+
+    async def flush(self):
+        # Clear in place so the other instances of the store see it too
+        self.channels.clear()
+        self.groups.clear()
@@ -0,0 +1,120 @@
+import asyncio
+import random
+import time
+import uuid
+from itertools import product
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from django.utils.module_loading import import_string
+
+RECEIVE_TIMEOUT_SECONDS = 10
+MAX_IN_FLIGHT_SENDS = 100
+
+
+def _int_list(value):
+    try:
+        return [int(part) for part in value.split(",") if part.strip()]
+    except ValueError:
+        raise CommandError(f"Expected a comma-separated list of integers, got '{value}'")
+
+
+class Command(BaseCommand):
+    help = (
+        "Measure chat fan-out through the configured channel layer: messages per second and "
+        "delivery latency as rooms, workers and members per room grow. Each worker is a separate "
+        "layer instance (its own connections), members are spread across workers round-robin, "
+        "and every message is checked to reach every member of its room."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--rooms", type=_int_list, default=[1, 10, 100], help="Comma-separated room counts.")
+        parser.add_argument("--workers", type=_int_list, default=[1, 3], help="Comma-separated worker counts.")
+        parser.add_argument("--members", type=_int_list, default=[2, 10], help="Comma-separated members per room.")
+        parser.add_argument("--messages", type=int, default=50, help="Messages sent to each room.")
+
+    def handle(self, *args, **options):
+        layer = settings.CHANNEL_LAYERS["default"]
+        self.stdout.write(f"Channel layer: {layer['BACKEND']} {layer.get('CONFIG', {}).get('hosts', '')}")
+        self.stdout.write(
+            f"{'rooms':>6} {'workers':>7} {'members':>7} {'msgs/s':>9} {'deliv/s':>9} "
+            f"{'p50 ms':>8} {'p99 ms':>8} {'lost':>6}"
+        )
+        lost_total = 0
+        for rooms, workers, members in product(options["rooms"], options["workers"], options["members"]):
+            result = asyncio.run(self._run(layer, rooms, workers, members, options["messages"]))
+            lost_total += result["lost"]
+            self.stdout.write(
+                f"{rooms:>6} {workers:>7} {members:>7} {result['messages_per_second']:>9.0f} "
+                f"{result['deliveries_per_second']:>9.0f} {result['p50_ms']:>8.2f} {result['p99_ms']:>8.2f} "
+                f"{result['lost']:>6}"
+            )
+        if lost_total:
+            raise CommandError(f"{lost_total} deliveries never arrived")
+
+    async def _run(self, layer, rooms, workers, members, messages):
+        backend = import_string(layer["BACKEND"])
+        config = dict(layer.get("CONFIG", {}), capacity=messages + 10)
+        if layer["BACKEND"].endswith("LocalChannelLayer"):
+            config["store"] = f"benchmark-{uuid.uuid4().hex}"
+        layers = [backend(**config) for _ in range(workers)]
+        run = uuid.uuid4().hex[:8]
+
+        groups = [f"bench_{run}_{room}" for room in range(rooms)]
+        members_of = []   # per room: [(layer, channel), ...]
+        for room, group in enumerate(groups):
+            room_members = []
+            for member in range(members):
+                member_layer = layers[(room * members + member) % workers]
+                channel = await member_layer.new_channel()
+                await member_layer.group_add(group, channel)
+                room_members.append((member_layer, channel))
+            members_of.append(room_members)
+
+        latencies = []
+        lost = 0
+
+        async def receive_all(member_layer, channel):
+            nonlocal lost
+            for received in range(messages):
+                try:
+                    message = await asyncio.wait_for(member_layer.receive(channel), RECEIVE_TIMEOUT_SECONDS)
+                except asyncio.TimeoutError:
+                    lost += messages - received
+                    return
+                latencies.append(time.perf_counter() - message["sent_at"])
+
+        in_flight = asyncio.Semaphore(MAX_IN_FLIGHT_SENDS)
+
+        async def send(room):
+            sender_layer = random.choice(members_of[room])[0]
+            async with in_flight:
+                await sender_layer.group_send(groups[room], {"type": "chat.message", "sent_at": time.perf_counter()})
+
+        receivers = [
+            asyncio.ensure_future(receive_all(member_layer, channel))
+            for room_members in members_of for member_layer, channel in room_members
+        ]
+        started = time.perf_counter()
+        await asyncio.gather(*(send(room) for room in range(rooms) for _ in range(messages)))
+        await asyncio.gather(*receivers)
+        elapsed = time.perf_counter() - started
+
+        for room, group in enumerate(groups):
+            for member_layer, channel in members_of[room]:
+                await member_layer.group_discard(group, channel)
+        if layer["BACKEND"].endswith("LocalChannelLayer"):
+            await layers[0].flush()
+        for member_layer in layers:
+            if hasattr(member_layer, "close_pools"):
+                await member_layer.close_pools()
+
+        latencies.sort()
+        percentile = lambda p: latencies[min(int(len(latencies) * p), len(latencies) - 1)] * 1000 if latencies else 0.0
+        return {
+            "messages_per_second": rooms * messages / elapsed,
+            "deliveries_per_second": len(latencies) / elapsed,
+            "p50_ms": percentile(0.5),
+            "p99_ms": percentile(0.99),
+            "lost": lost,
+        }
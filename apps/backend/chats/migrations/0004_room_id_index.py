@@ -0,0 +1,18 @@
+# Generated by Django 5.2 on 2026-10-17 03:05
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('chats', '0003_alter_chatmessage_language'),
+        ('users', '0004_favourite_products'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='chatmessage',
+            index=models.Index(fields=['room_name', 'id'], name='chat_room_id_idx'),
+        ),
+    ]
@@ -0,0 +1,114 @@
+# Generated by Django 5.2 on 2026-10-17 03:08
+
+import django.db.models.deletion
+from django.db import migrations, models
+from django.db.models import Count, Max
+
+BATCH_SIZE = 1000
+
+
+def parse_room_name(room_name):
+    parts = room_name.split('_')
+    if len(parts) != 4 or parts[0] != 'product':
+        return None
+    try:
+        return int(parts[1]), int(parts[2]), int(parts[3])
+    except ValueError:
+        return None
+
+
+def backfill_rooms(apps, schema_editor):
+    """One ChatRoom per distinct room_name in chat_messages, plus its participants and counters."""
+    ChatMessage = apps.get_model('chats', 'ChatMessage')
+    ChatRoom = apps.get_model('chats', 'ChatRoom')
+    ChatParticipant = apps.get_model('chats', 'ChatParticipant')
+    UserProfile = apps.get_model('users', 'UserProfile')
+
+    user_ids = set(UserProfile.objects.values_list('user_id', flat=True))
+    sent = {
+        (row['room_name'], row['user_id']): row['n']
+        for row in ChatMessage.objects.filter(user__isnull=False)
+        .values('room_name', 'user_id').annotate(n=Count('id')).iterator()
+    }
+    rooms = ChatMessage.objects.values('room_name').annotate(last_id=Max('id'), n=Count('id')).order_by('room_name')
+    batch = []
+    for row in rooms.iterator():
+        batch.append(row)
+        if len(batch) >= BATCH_SIZE:
+            _create_rooms(batch, ChatMessage, ChatRoom, ChatParticipant, user_ids, sent)
+            batch = []
+    if batch:
+        _create_rooms(batch, ChatMessage, ChatRoom, ChatParticipant, user_ids, sent)
+
+
+def _create_rooms(rows, ChatMessage, ChatRoom, ChatParticipant, user_ids, sent):
+    timestamps = dict(ChatMessage.objects.filter(id__in=[row['last_id'] for row in rows]).values_list('id', 'timestamp'))
+    rooms = []
+    for row in rows:
+        parsed = parse_room_name(row['room_name'])
+        rooms.append(ChatRoom(
+            room_name=row['room_name'],
+            product_id=parsed[0] if parsed else None,
+            last_message_id=row['last_id'],
+            last_message_at=timestamps.get(row['last_id']),
+            message_count=row['n'],
+        ))
+    ChatRoom.objects.bulk_create(rooms)
+    room_ids = dict(ChatRoom.objects.filter(room_name__in=[row['room_name'] for row in rows]).values_list('room_name', 'id'))
+    participants = []
+    for row in rows:
+        parsed = parse_room_name(row['room_name'])
+        if not parsed:
+            continue
+        first, second = parsed[1], parsed[2]
+        for user_id in {first, second} & user_ids:
+            other_id = second if user_id == first else first
+            participants.append(ChatParticipant(
+                room_id=room_ids[row['room_name']],
+                user_id=user_id,
+                other_user_id=other_id if other_id in user_ids else None,
+                sent_count=sent.get((row['room_name'], user_id), 0),
+            ))
+    ChatParticipant.objects.bulk_create(participants)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('chats', '0004_room_id_index'),
+        ('products', '0010_deduplicate_reports'),
+        ('users', '0004_favourite_products'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ChatRoom',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('room_name', models.CharField(max_length=255, unique=True)),
+                ('last_message_at', models.DateTimeField(blank=True, null=True)),
+                ('message_count', models.PositiveIntegerField(default=0)),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('last_message', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='+', to='chats.chatmessage')),
+                ('product', models.ForeignKey(blank=True, db_constraint=False, null=True, on_delete=django.db.models.deletion.DO_NOTHING, related_name='+', to='products.product')),
+            ],
+            options={
+                'db_table': 'chat_rooms',
+            },
+        ),
+        migrations.CreateModel(
+            name='ChatParticipant',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('sent_count', models.PositiveIntegerField(default=0)),
+                ('other_user', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='+', to='users.userprofile')),
+                ('user', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='chat_participations', to='users.userprofile')),
+                ('room', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='participants', to='chats.chatroom')),
+            ],
+            options={
+                'db_table': 'chat_participants',
+                'constraints': [models.UniqueConstraint(fields=('user', 'room'), name='unique_chat_participant')],
+            },
+        ),
+        migrations.RunPython(backfill_rooms, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,67 @@
+# Generated by Django 5.2 on 2026-10-17 03:10
+
+import django.db.models.deletion
+from django.db import migrations, models
+from django.db.models import Count, OuterRef, Q, Subquery, Value
+from django.db.models.functions import Coalesce
+
+BATCH_SIZE = 1000
+
+
+def seed_counters(apps, schema_editor):
+    """
+    Start every read cursor at its room's latest message (there were no read
+    receipts before, so existing history counts as read) and create each
+    participant's counter row with the number of rooms that have messages.
+    """
+    ChatRoom = apps.get_model('chats', 'ChatRoom')
+    ChatParticipant = apps.get_model('chats', 'ChatParticipant')
+    ChatUserCounter = apps.get_model('chats', 'ChatUserCounter')
+
+    ChatParticipant.objects.update(last_read_id=Coalesce(
+        Subquery(ChatRoom.objects.filter(pk=OuterRef('room_id')).values('last_message_id')[:1]), Value(0)
+    ))
+    totals = ChatParticipant.objects.values('user_id').annotate(
+        n=Count('id', filter=Q(room__last_message__isnull=False))
+    ).order_by('user_id')
+    batch = []
+    for row in totals.iterator():
+        batch.append(ChatUserCounter(user_id=row['user_id'], active_chats=row['n']))
+        if len(batch) >= BATCH_SIZE:
+            ChatUserCounter.objects.bulk_create(batch)
+            batch = []
+    ChatUserCounter.objects.bulk_create(batch)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('chats', '0005_chat_rooms'),
+        ('users', '0004_favourite_products'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ChatUserCounter',
+            fields=[
+                ('user', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, primary_key=True, related_name='chat_counter', serialize=False, to='users.userprofile')),
+                ('active_chats', models.PositiveIntegerField(default=0)),
+                ('unread_chats', models.PositiveIntegerField(default=0)),
+                ('unread_messages', models.PositiveIntegerField(default=0)),
+            ],
+            options={
+                'db_table': 'chat_user_counters',
+            },
+        ),
+        migrations.AddField(
+            model_name='chatparticipant',
+            name='last_read_id',
+            field=models.BigIntegerField(default=0),
+        ),
+        migrations.AddField(
+            model_name='chatparticipant',
+            name='unread_count',
+            field=models.PositiveIntegerField(default=0),
+        ),
+        migrations.RunPython(seed_counters, migrations.RunPython.noop),
+    ]
@@ -1,5 +1,6 @@
 from django.db import models
 from users.models import UserProfile
+from products.models import Product
 
 class ChatMessage(models.Model):
     room_name = models.CharField(max_length=255)
@@ -12,3 +13,58 @@ class ChatMessage(models.Model):
     class Meta:
         db_table = "chat_messages"
         ordering = ["timestamp"]
+        indexes = [
+            # History pages and delta syncs are range scans over one room's ids
+            models.Index(fields=["room_name", "id"], name="chat_room_id_idx"),
+        ]
+
+
+class ChatRoom(models.Model):
+    """
+    One row per room_name ("product_{product_id}_{smaller_user_id}_{larger_user_id}").
+    The latest message is denormalized here so room lists never scan chat_messages.
+    """
+    room_name = models.CharField(max_length=255, unique=True)
+    product = models.ForeignKey(
+        Product, null=True, blank=True, on_delete=models.DO_NOTHING, db_constraint=False, related_name="+",
+    )
+    last_message = models.ForeignKey(
+        ChatMessage, null=True, blank=True, on_delete=models.SET_NULL, related_name="+",
+    )
+    last_message_at = models.DateTimeField(null=True, blank=True)
+    message_count = models.PositiveIntegerField(default=0)
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        db_table = "chat_rooms"
+
+    def __str__(self):
+        return self.room_name
+
+
+class ChatParticipant(models.Model):
+    """A user's membership of a room, with the other side denormalized for room lists."""
+    room = models.ForeignKey(ChatRoom, on_delete=models.CASCADE, related_name="participants")
+    user = models.ForeignKey(UserProfile, on_delete=models.CASCADE, related_name="chat_participations")
+    other_user = models.ForeignKey(UserProfile, null=True, blank=True, on_delete=models.SET_NULL, related_name="+")
+    sent_count = models.PositiveIntegerField(default=0)
+    # Read cursor: id of the newest message the user has seen, and how many came after it from others
+    last_read_id = models.BigIntegerField(default=0)
+    unread_count = models.PositiveIntegerField(default=0)
+
+    class Meta:
+        db_table = "chat_participants"
+        constraints = [
+            models.UniqueConstraint(fields=["user", "room"], name="unique_chat_participant"),
+        ]
+
+
+class ChatUserCounter(models.Model):
+    """Per-user totals over ChatParticipant rows, kept in step on every send and read."""
+    user = models.OneToOneField(UserProfile, primary_key=True, on_delete=models.CASCADE, related_name="chat_counter")
+    active_chats = models.PositiveIntegerField(default=0)     # rooms with at least one message
+    unread_chats = models.PositiveIntegerField(default=0)     # rooms with unread_count > 0
+    unread_messages = models.PositiveIntegerField(default=0)
+
+    class Meta:
+        db_table = "chat_user_counters"
@@ -0,0 +1,128 @@
+"""
+ChatRoom / ChatParticipant bookkeeping.
+
+Rooms are created by create_chat_room or, for rooms opened straight over the
+WebSocket, by the consumer on connect. Every saved message bumps the room's
+counters and moves its last-message pointer, so listing a user's rooms is one
+join from chat_participants instead of LIKE scans over chat_messages.
+
+Unread state is maintained incrementally: a send adds one to each recipient's
+unread_count, a read moves the reader's cursor and recounts only the messages
+after it, and both apply the difference to the user's ChatUserCounter row in
+the same transaction, so the notification badge is a primary-key read. Both
+lock participant rows before counter rows, so sends and reads can't deadlock.
+"""
+from django.db import IntegrityError, transaction
+from django.db.models import F
+
+from users.models import UserProfile
+from .models import ChatMessage, ChatRoom, ChatParticipant, ChatUserCounter
+
+
+def room_name_for(product_id, user1_id, user2_id):
+    low, high = sorted([int(user1_id), int(user2_id)])
+    return f"product_{product_id}_{low}_{high}"
+
+
+def parse_room_name(room_name):
+    """(product_id, user1_id, user2_id) of a room name, or None if it doesn't follow the format."""
+    parts = room_name.split("_")
+    if len(parts) != 4 or parts[0] != "product":
+        return None
+    try:
+        return int(parts[1]), int(parts[2]), int(parts[3])
+    except ValueError:
+        return None
+
+
+def get_or_create_room(room_name):
+    """The room and, for well-formed names, a participant row for each existing user."""
+    room = ChatRoom.objects.filter(room_name=room_name).first()
+    if room is not None:
+        return room
+    parsed = parse_room_name(room_name)
+    product_id, user_ids = (parsed[0], parsed[1:]) if parsed else (None, ())
+    try:
+        with transaction.atomic():
+            room = ChatRoom.objects.create(room_name=room_name, product_id=product_id)
+            existing = set(UserProfile.objects.filter(user_id__in=user_ids).values_list("user_id", flat=True))
+            ChatParticipant.objects.bulk_create([
+                ChatParticipant(room=room, user_id=user_id, other_user_id=_other(user_ids, user_id, existing))
+                for user_id in sorted(existing)
+            ])
+            ChatUserCounter.objects.bulk_create(
+                [ChatUserCounter(user_id=user_id) for user_id in sorted(existing)], ignore_conflicts=True
+            )
+    except IntegrityError:
+        # Created concurrently by the other side of the conversation
+        room = ChatRoom.objects.get(room_name=room_name)
+    return room
+
+
+def _other(user_ids, user_id, existing):
+    other = user_ids[0] if user_ids[1] == user_id else user_ids[1]
+    return other if other in existing else None
+
+
+def record_message(room_id, message: ChatMessage):
+    """
+    Count a just-saved message: move the room's last-message pointer forward to
+    it and add it to every other participant's unread counters.
+    """
+    with transaction.atomic():
+        first = ChatRoom.objects.filter(pk=room_id, last_message__isnull=True).update(
+            last_message=message, last_message_at=message.timestamp, message_count=F("message_count") + 1
+        )
+        if not first:
+            ChatRoom.objects.filter(pk=room_id).update(message_count=F("message_count") + 1)
+            # Concurrent senders may commit out of order; never move the pointer back
+            ChatRoom.objects.filter(pk=room_id, last_message_id__lt=message.id).update(
+                last_message=message, last_message_at=message.timestamp
+            )
+        participants = list(ChatParticipant.objects.filter(room_id=room_id).values_list("pk", "user_id"))
+        for pk, user_id in participants:
+            if user_id == message.user_id:
+                ChatParticipant.objects.filter(pk=pk).update(sent_count=F("sent_count") + 1)
+                continue
+            became_unread = ChatParticipant.objects.filter(pk=pk, unread_count=0).update(unread_count=1)
+            if not became_unread:
+                ChatParticipant.objects.filter(pk=pk).update(unread_count=F("unread_count") + 1)
+            ChatUserCounter.objects.filter(user_id=user_id).update(
+                unread_messages=F("unread_messages") + 1, unread_chats=F("unread_chats") + became_unread
+            )
+        if first and participants:
+            ChatUserCounter.objects.filter(user_id__in=[user_id for _, user_id in participants]).update(
+                active_chats=F("active_chats") + 1
+            )
+
+
+def mark_read(room_id, user_id, message_id):
+    """
+    Move the user's read cursor in the room up to message_id and recount what
+    is still unread after it. Returns (cursor, unread_count), or None if the
+    user is not a participant.
+    """
+    with transaction.atomic():
+        participant = ChatParticipant.objects.select_for_update().only(
+            "last_read_id", "unread_count"
+        ).filter(room_id=room_id, user_id=user_id).first()
+        if participant is None:
+            return None
+        room_name, last_message_id = ChatRoom.objects.filter(pk=room_id).values_list(
+            "room_name", "last_message_id"
+        ).get()
+        message_id = min(message_id, last_message_id or 0)
+        if message_id <= participant.last_read_id:
+            return participant.last_read_id, participant.unread_count
+        # A range scan on (room_name, id) over the messages still unread, not the whole room
+        unread = ChatMessage.objects.filter(
+            room_name=room_name, id__gt=message_id
+        ).exclude(user_id=user_id).count()
+        ChatParticipant.objects.filter(pk=participant.pk).update(last_read_id=message_id, unread_count=unread)
+        cleared = participant.unread_count - unread
+        if cleared:
+            ChatUserCounter.objects.filter(user_id=user_id).update(
+                unread_messages=F("unread_messages") - cleared,
+                unread_chats=F("unread_chats") - (1 if unread == 0 and participant.unread_count else 0),
+            )
+    return message_id, unread
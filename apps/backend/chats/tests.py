@@ -1,3 +1,219 @@
-from django.test import TestCase
+from asgiref.sync import async_to_sync, sync_to_async
+from channels.testing import WebsocketCommunicator
+from django.contrib.auth.models import AnonymousUser
+from django.test import SimpleTestCase, TestCase
 
-# Create your tests here.
+from products.models import Product
+from users.identity import UserIdentity
+from users.models import UserProfile
+from .consumers import ChatConsumer, load_history, load_since
+from .layers import LocalChannelLayer
+from .models import ChatMessage, ChatRoom, ChatParticipant, ChatUserCounter
+from .rooms import get_or_create_room, record_message, mark_read
+
+
+class LocalChannelLayerTests(SimpleTestCase):
+    def test_instances_of_a_store_share_groups(self):
+        async def exchange():
+            worker_a, worker_b = LocalChannelLayer(store="test-share"), LocalChannelLayer(store="test-share")
+            other = LocalChannelLayer(store="test-other")
+            channel = await worker_b.new_channel()
+            await worker_b.group_add("chat_room", channel)
+            await other.group_send("chat_room", {"type": "chat.message", "message": "lost"})
+            await worker_a.group_send("chat_room", {"type": "chat.message", "message": "hi"})
+            message = await worker_b.receive(channel)
+            await worker_a.flush()
+            return message, worker_b.groups
+
+        message, groups_after_flush = async_to_sync(exchange)()
+        self.assertEqual(message["message"], "hi")
+        self.assertEqual(groups_after_flush, {})
+
+
+class ChatHistoryTests(TestCase):
+    ROOM = "product_1_1_2"
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = UserProfile.objects.create(
+            first_name="Cat", last_name="Chatter", email="chatter@example.com",
+            user_type="user", joined_date="2024-01-01",
+        )
+        ChatMessage.objects.bulk_create([
+            ChatMessage(room_name=cls.ROOM, user=cls.user if i % 2 else None, message=f"m{i}")
+            for i in range(25)
+        ])
+        ChatMessage.objects.create(room_name="product_9_1_2", message="elsewhere")
+
+    def test_history_page_is_one_query(self):
+        with self.assertNumQueries(1):
+            frame = load_history(self.ROOM, limit=10)
+        self.assertEqual([m["message"] for m in frame["messages"]], [f"m{i}" for i in range(15, 25)])
+        self.assertTrue(frame["has_more"])
+        self.assertEqual(frame["messages"][-1]["sender"], "anonymous")
+        self.assertEqual(frame["messages"][-2]["sender"], "chatter@example.com")
+
+    def communicator(self, query=""):
+        communicator = WebsocketCommunicator(ChatConsumer.as_asgi(), f"/ws/chat/{self.ROOM}/{query}")
+        communicator.scope["url_route"] = {"kwargs": {"room_name": self.ROOM}}
+        communicator.scope["user"] = AnonymousUser()
+        return communicator
+
+    async def test_connect_sends_one_frame_and_pages_back(self):
+        communicator = self.communicator()
+        connected, _ = await communicator.connect()
+        self.assertTrue(connected)
+
+        latest = await communicator.receive_json_from()
+        self.assertEqual(latest["type"], "history")
+        self.assertEqual(len(latest["messages"]), 20)
+        self.assertTrue(latest["has_more"])
+        self.assertTrue(await communicator.receive_nothing())
+
+        await communicator.send_json_to({"type": "history", "before": latest["before"]})
+        older = await communicator.receive_json_from()
+        self.assertEqual([m["message"] for m in older["messages"]], [f"m{i}" for i in range(5)])
+        self.assertFalse(older["has_more"])
+        await communicator.disconnect()
+
+    def test_sync_batches_cover_exactly_the_missed_messages(self):
+        ids = list(ChatMessage.objects.filter(room_name=self.ROOM).order_by("id").values_list("id", flat=True))
+        since, seen = ids[9], []
+        while True:
+            with self.assertNumQueries(1):
+                frame = load_since(self.ROOM, since, limit=6)
+            self.assertLessEqual(len(frame["messages"]), 6)
+            seen += [m["id"] for m in frame["messages"]]
+            since = frame["since"]
+            if not frame["has_more"]:
+                break
+        self.assertEqual(seen, ids[10:])
+
+    async def test_reconnect_with_since_sends_only_missed_messages(self):
+        last_seen = await ChatMessage.objects.filter(room_name=self.ROOM, message="m19").values_list("id", flat=True).aget()
+        communicator = self.communicator(f"?token=x&since={last_seen}")
+        connected, _ = await communicator.connect()
+        self.assertTrue(connected)
+
+        frame = await communicator.receive_json_from()
+        self.assertEqual(frame["type"], "sync")
+        self.assertEqual([m["message"] for m in frame["messages"]], [f"m{i}" for i in range(20, 25)])
+        self.assertFalse(frame["has_more"])
+        self.assertTrue(await communicator.receive_nothing())
+
+        await communicator.send_json_to({"type": "chat", "message": "back online"})
+        broadcast = await communicator.receive_json_from()
+        self.assertEqual(broadcast["message"], "back online")
+        self.assertGreater(broadcast["id"], frame["since"])
+        await communicator.disconnect()
+
+
+class ChatRoomTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        def user(name):
+            return UserProfile.objects.create(
+                first_name=name, last_name="Test", email=f"{name}@example.com",
+                user_type="user", joined_date="2024-01-01",
+            )
+        cls.seller, cls.buyer, cls.other = user("seller"), user("buyer"), user("other")
+        cls.products = [
+            Product.objects.create(
+                name=f"Lamp {i}", description="desc", price=i, condition="Used",
+                seller=cls.seller, status="Available",
+            )
+            for i in range(3)
+        ]
+
+    def open_room(self, product, buyer):
+        response = self.client.post(
+            "/api/chats/room/create/",
+            {"product_id": product.product_id, "user1_id": buyer.user_id, "user2_id": self.seller.user_id},
+            content_type="application/json",
+        )
+        self.assertEqual(response.status_code, 200)
+        return response.json()
+
+    def send(self, room_name, user, text):
+        room = get_or_create_room(room_name)
+        message = ChatMessage.objects.create(room_name=room_name, user=user, message=text)
+        record_message(room.pk, message)
+        return message
+
+    def counter(self, user):
+        return ChatUserCounter.objects.values_list("active_chats", "unread_chats", "unread_messages").get(user=user)
+
+    def test_create_room_registers_both_participants(self):
+        first = self.open_room(self.products[0], self.buyer)
+        self.assertTrue(first["is_new_room"])
+        room = ChatRoom.objects.get(room_name=first["room_name"])
+        self.assertEqual(room.product_id, self.products[0].product_id)
+        self.assertEqual(
+            set(room.participants.values_list("user_id", "other_user_id")),
+            {(self.buyer.user_id, self.seller.user_id), (self.seller.user_id, self.buyer.user_id)},
+        )
+        self.send(first["room_name"], self.buyer, "hi")
+        self.assertFalse(self.open_room(self.products[0], self.buyer)["is_new_room"])
+
+    def test_room_list_is_two_queries(self):
+        rooms = [self.open_room(product, buyer)["room_name"] for product, buyer in (
+            (self.products[0], self.buyer), (self.products[1], self.other), (self.products[2], self.buyer),
+        )]
+        self.send(rooms[0], self.buyer, "is it still available?")
+        self.send(rooms[1], self.other, "hello")
+        self.send(rooms[0], self.seller, "yes")   # rooms[2] has no messages and is not listed
+
+        with self.assertNumQueries(2):
+            response = self.client.get(f"/api/chats/rooms/{self.seller.user_id}/")
+        listed = response.json()
+        self.assertEqual([r["room_name"] for r in listed], [rooms[0], rooms[1]])
+        self.assertEqual(listed[0]["last_message"], "yes")
+        self.assertEqual(listed[0]["other_user_email"], "buyer@example.com")
+        self.assertEqual(listed[0]["product_name"], "Lamp 0")
+
+        room = ChatRoom.objects.get(room_name=rooms[0])
+        self.assertEqual(room.message_count, 2)
+        self.assertEqual(ChatParticipant.objects.get(room=room, user=self.buyer).sent_count, 1)
+
+        response = self.client.get(f"/api/chats/count/{self.seller.user_id}/")
+        self.assertEqual(response.json()["active_chats_count"], 2)
+        self.assertEqual(self.client.get("/api/chats/rooms/999999/").status_code, 404)
+
+    def test_unread_counters_follow_sends_and_reads(self):
+        room_name = self.open_room(self.products[0], self.buyer)["room_name"]
+        room = ChatRoom.objects.get(room_name=room_name)
+        sent = [self.send(room_name, self.buyer, f"question {i}") for i in range(3)]
+        self.assertEqual(self.counter(self.seller), (1, 1, 3))
+        self.assertEqual(self.counter(self.buyer), (1, 0, 0))
+
+        with self.assertNumQueries(1):
+            response = self.client.get(f"/api/chats/count/{self.seller.user_id}/")
+        self.assertEqual(response.json(), {"active_chats_count": 1, "unread_chats_count": 1, "unread_messages_count": 3})
+
+        self.assertEqual(mark_read(room.pk, self.seller.user_id, sent[1].id), (sent[1].id, 1))
+        self.assertEqual(self.counter(self.seller), (1, 1, 1))
+        self.assertEqual(mark_read(room.pk, self.seller.user_id, sent[0].id), (sent[1].id, 1))   # never moves back
+        self.assertEqual(mark_read(room.pk, self.seller.user_id, 10 ** 9), (sent[2].id, 0))     # clamped to the last message
+        self.assertEqual(self.counter(self.seller), (1, 0, 0))
+        self.assertIsNone(mark_read(room.pk, self.other.user_id, sent[2].id))
+
+        self.send(room_name, self.seller, "yes")
+        self.send(room_name, self.seller, "still here")
+        listed = self.client.get(f"/api/chats/rooms/{self.buyer.user_id}/").json()
+        self.assertEqual(listed[0]["unread_count"], 2)
+        self.assertEqual(self.counter(self.buyer), (1, 1, 2))
+
+    async def test_read_message_broadcasts_receipt(self):
+        room_name = (await sync_to_async(self.open_room)(self.products[0], self.buyer))["room_name"]
+        message = await sync_to_async(self.send)(room_name, self.buyer, "hi")
+        communicator = WebsocketCommunicator(ChatConsumer.as_asgi(), f"/ws/chat/{room_name}/?since={message.id}")
+        communicator.scope["url_route"] = {"kwargs": {"room_name": room_name}}
+        communicator.scope["user"] = UserIdentity(self.seller.user_id, self.seller.email, "seller", "Test")
+        await communicator.connect()
+        await communicator.receive_json_from()   # empty sync frame
+
+        await communicator.send_json_to({"type": "read", "message_id": message.id})
+        receipt = await communicator.receive_json_from()
+        self.assertEqual(receipt, {"type": "read", "reader": "seller@example.com", "message_id": message.id})
+        self.assertEqual(await sync_to_async(self.counter)(self.seller), (1, 0, 0))
+        await communicator.disconnect()
@@ -1,5 +1,6 @@
-from ninja import Router
+from ninja import Router, Query
 from ninja.errors import HttpError
+from django.http import Http404
 from loguru import logger
 from .models import DeliveryRequest
 from .schemas import DeliveryRequestOut, DeliveryRequestIn, DeliveryAgentSignup, DeliveryAgentOut, DeliveryAgentLogin, AuthResponse, RefreshTokenRequest, DeliveryDetailsOut
@@ -12,16 +13,26 @@ from .database import (
     refresh_access_token,
     accept_delivery_request
 )
+from .middleware import auth_cache_stats
+from products.database import DEFAULT_PAGE_SIZE, MAX_PAGE_SIZE
 
 delivery_agent_router = Router()
 
+
+def require_agent(request, agent_id):
+    """Reject calls made with another agent's token; the middleware sets delivery_agent_id."""
+    if getattr(request, "delivery_agent_id", None) != agent_id:
+        raise HttpError(403, "Not allowed to act for another delivery agent.")
+
+
 @delivery_agent_router.get("/previous-deliveries/{agent_id}", response=list[DeliveryRequestOut], tags=["DeliveryAgent"])
-def get_previous_deliveries_api(request, agent_id: int):
+def get_previous_deliveries_api(request, agent_id: int, limit: int = Query(DEFAULT_PAGE_SIZE, ge=1, le=MAX_PAGE_SIZE), offset: int = Query(0, ge=0)):
     """
     API endpoint to fetch previous deliveries for a specific delivery agent.
     """
+    require_agent(request, agent_id)
     try:
-        deliveries = get_previous_deliveries_for_agent(agent_id)
+        deliveries = get_previous_deliveries_for_agent(agent_id, limit, offset)
         if not deliveries:
             raise HttpError(404, f"No previous deliveries found for agent ID {agent_id}.")
         return deliveries
@@ -32,13 +43,16 @@ def get_previous_deliveries_api(request, agent_id: int):
         raise HttpError(500, f"An error occurred while fetching previous deliveries: {str(e)}")
     
 @delivery_agent_router.get("/pending-requests/{agent_id}", response=list[DeliveryRequestOut], tags=["DeliveryAgent"])
-def get_pending_requests_api(request, agent_id: int):
+def get_pending_requests_api(request, agent_id: int, limit: int = Query(DEFAULT_PAGE_SIZE, ge=1, le=MAX_PAGE_SIZE), offset: int = Query(0, ge=0)):
     """
     API endpoint to fetch pending delivery requests for a specific delivery agent.
     """
+    require_agent(request, agent_id)
     try:
         from .database import get_pending_requests_for_agent
-        return get_pending_requests_for_agent(agent_id)
+        return get_pending_requests_for_agent(agent_id, limit, offset)
+    except HttpError:
+        raise
     except Exception as e:
         logger.error(f"Error fetching pending requests for agent ID {agent_id}: {e}")
         raise HttpError(500, f"An error occurred: {str(e)}")
@@ -47,22 +61,27 @@ def get_pending_requests_api(request, agent_id: int):
 def accept_request_api(request, request_id: int, agent_id: int):
     """
     Assigns a delivery request to the agent and marks it accepted.
+    Returns 409 if another agent got it first.
     """
+    require_agent(request, agent_id)
     try:
         return accept_delivery_request(request_id, agent_id)
     except HttpError:
         raise
+    except Http404 as e:
+        raise HttpError(404, str(e))
     except Exception as e:
         logger.error(f"Error accepting request {request_id} by agent {agent_id}: {e}")
         raise HttpError(500, f"Failed to accept request: {str(e)}")
     
 @delivery_agent_router.get("/accepted-deliveries/{agent_id}", response=list[DeliveryRequestOut], tags=["DeliveryAgent"])
-def get_accepted_deliveries_api(request, agent_id: int):
+def get_accepted_deliveries_api(request, agent_id: int, limit: int = Query(DEFAULT_PAGE_SIZE, ge=1, le=MAX_PAGE_SIZE), offset: int = Query(0, ge=0)):
     """
     API endpoint to fetch accepted deliveries for a specific delivery agent.
     """
+    require_agent(request, agent_id)
     try:
-        deliveries = get_accepted_requests_for_agent(agent_id)
+        deliveries = get_accepted_requests_for_agent(agent_id, limit, offset)
         if not deliveries:
             raise HttpError(404, f"No accepted deliveries found for agent ID {agent_id}.")
         return deliveries
@@ -148,6 +167,13 @@ def refresh_token(request, refresh_data: RefreshTokenRequest):
         logger.error(f"Error in refresh token API: {e}")
         raise HttpError(500, f"Failed to refresh token: {str(e)}")
     
+@delivery_agent_router.get("/auth-cache-stats", tags=["DeliveryAgent"])
+def auth_cache_stats_api(request):
+    """
+    Hit ratios of this worker's token and approval-status caches used by the auth middleware.
+    """
+    return auth_cache_stats()
+
 @delivery_agent_router.get("/accepted-delivery-details/{request_id}", response=DeliveryDetailsOut)
 def get_delivery_details(request, request_id: int):
     try:
@@ -4,3 +4,7 @@ from django.apps import AppConfig
 class DeliveryAgentConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
     name = 'delivery_agent'
+
+    def ready(self):
+        # Register signal receivers that keep the auth cache and matching index current
+        from . import signals, middleware, matching  # noqa: F401
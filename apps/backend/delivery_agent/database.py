@@ -3,14 +3,19 @@ from django.http import Http404
 from .models import DeliveryAgent, DeliveryRequest
 from ninja.errors import HttpError
 from loguru import logger  
-from products.database import get_product_by_id
+from products.database import serialize_products, DEFAULT_PAGE_SIZE
 from products.models import Product
 from .schemas import DeliveryRequestIn, DeliveryAgentOut, DeliveryAgentSignup, DeliveryAgentLogin, AuthResponse, RefreshTokenRequest
-from django.contrib.auth.hashers import make_password, check_password
+from backend.hashing import hash_password, verify_password
 from datetime import datetime, timedelta
 import jwt
 from django.conf import settings
-from django.db.models import Q
+from django.db.models import Exists, Q
+from django.db import transaction
+from django.utils import timezone
+from backend.leases import claim_batch, release_claims, claimable_by, held_by_other, LEASE_CLEARED
+from .signals import agent_status_changed, delivery_requests_changed
+from .matching import matching_engine
 
 def get_pending_delivery_agent(agent_id: int):
     """
@@ -44,66 +49,144 @@ def get_pending_delivery_agents():
         logger.error(f"Error fetching pending delivery agents: {e}")
         raise Exception(f"Error fetching pending delivery agents: {str(e)}")
     
-def approve_agent(agent_id: int):
+def claim_pending_delivery_agents(moderator_id: int, limit: int):
+    """
+    Lease the next `limit` pending delivery agents, oldest first, to a moderator.
+    """
+    logger.info(f"Moderator {moderator_id} claiming up to {limit} pending delivery agents.")
+    try:
+        queryset = DeliveryAgent.objects.filter(approval_status="pending").order_by("joined_date", "agent_id")
+        agent_ids, expires_at = claim_batch(queryset, moderator_id, limit)
+        agents = DeliveryAgent.objects.filter(agent_id__in=agent_ids).order_by("joined_date", "agent_id")
+        items = [serialize_delivery_agent(agent) for agent in agents]
+        logger.success(f"Moderator {moderator_id} claimed {len(items)} delivery agents.")
+        return {"lease_expires_at": expires_at, "items": items}
+    except Exception as e:
+        logger.error(f"Error claiming pending delivery agents: {e}")
+        raise Exception(f"Error claiming pending delivery agents: {str(e)}")
+
+def release_delivery_agents(moderator_id: int, agent_ids=None):
+    logger.info(f"Moderator {moderator_id} releasing delivery agent claims: {agent_ids or 'all'}")
+    return release_claims(DeliveryAgent, moderator_id, agent_ids)
+
+def _decide_agent(agent_id: int, approval_status: str, moderator_id: int = None):
+    """
+    Move a pending agent to approval_status and drop its review lease in one
+    conditional UPDATE. Raises DeliveryAgent.DoesNotExist, or HttpError 400/409
+    if the agent was already decided or is claimed by another moderator.
+    """
+    decided = DeliveryAgent.objects.filter(
+        claimable_by(moderator_id), agent_id=agent_id, approval_status="pending"
+    ).update(approval_status=approval_status, **LEASE_CLEARED)
+    agent = DeliveryAgent.objects.get(agent_id=agent_id)
+    if not decided:
+        if agent.approval_status != "pending":
+            logger.warning(f"Delivery agent {agent_id} is already {agent.approval_status}.")
+            raise HttpError(400, f"Delivery agent is already {agent.approval_status}.")
+        logger.warning(f"Delivery agent {agent_id} is claimed by moderator {agent.claimed_by}.")
+        raise HttpError(409, "Delivery agent is claimed by another moderator.")
+    # .update() skips post_save, so tell the status caches ourselves
+    agent_status_changed.send(sender=DeliveryAgent, agent_ids=[agent_id])
+    return agent
+
+def approve_agent(agent_id: int, moderator_id: int = None):
     """
     Approve a delivery agent by ID.
     """
     logger.info(f"Approving delivery agent with ID {agent_id}.")
     try:
-        agent = DeliveryAgent.objects.get(agent_id=agent_id, approval_status="pending")
-        agent.approval_status = "approved"
-        agent.save()
+        agent = _decide_agent(agent_id, "approved", moderator_id)
         logger.success(f"Delivery agent {agent_id} approved.")
         return serialize_delivery_agent(agent)
     except DeliveryAgent.DoesNotExist:
-        logger.warning(f"Delivery agent with ID {agent_id} not found or not pending.")
-        raise Http404(f"Delivery agent with ID {agent_id} not found or not pending.")
+        logger.warning(f"Delivery agent with ID {agent_id} not found.")
+        raise Http404(f"Delivery agent with ID {agent_id} not found.")
+    except HttpError:
+        raise
     except Exception as e:
         logger.error(f"Error approving delivery agent {agent_id}: {e}")
         raise Exception(f"Error approving delivery agent: {str(e)}")
     
-def reject_agent(agent_id: int):
+def reject_agent(agent_id: int, moderator_id: int = None):
     """
     Reject a delivery agent by ID.
     """
     logger.info(f"Rejecting delivery agent with ID {agent_id}.")
     try:
-        agent = DeliveryAgent.objects.get(agent_id=agent_id)
-        if agent.approval_status == "approved":
-            logger.warning(f"Delivery agent {agent_id} is already approved.")
-            raise HttpError(400, "Delivery agent is already approved.")
-        if agent.approval_status == "rejected":
-            logger.warning(f"Delivery agent {agent_id} is already rejected.")
-            raise HttpError(400, "Delivery agent is already rejected.")
-        agent.approval_status = "rejected"
-        agent.save()
+        agent = _decide_agent(agent_id, "rejected", moderator_id)
         logger.success(f"Delivery agent {agent_id} rejected.")
         return serialize_delivery_agent(agent)
     except DeliveryAgent.DoesNotExist:
-        logger.warning(f"Delivery agent with ID {agent_id} not found or not pending.")
-        raise Http404(f"Delivery agent with ID {agent_id} not found or not pending.")
+        logger.warning(f"Delivery agent with ID {agent_id} not found.")
+        raise Http404(f"Delivery agent with ID {agent_id} not found.")
+    except HttpError:
+        raise
     except Exception as e:
         logger.error(f"Error rejecting delivery agent {agent_id}: {e}")
         raise Exception(f"Error rejecting delivery agent: {str(e)}")
     
 
-def get_previous_deliveries_for_agent(agent_id: int):
+def bulk_set_agent_approval(agent_ids, approval_status: str, moderator_id: int = None):
+    """
+    Approve or reject many pending delivery agents with one conditional UPDATE.
+    Returns {"updated": n, "results": [{"id", "result"}, ...]} in request order, where
+    result is the new status, "not_found", "already_approved", "already_rejected"
+    or "claimed" (another moderator holds a live lease on it).
+    """
+    if approval_status not in ("approved", "rejected"):
+        raise ValueError(f"Invalid approval status: {approval_status}")
+    agent_ids = list(dict.fromkeys(agent_ids))
+    logger.info(f"Bulk setting {len(agent_ids)} delivery agents to {approval_status}.")
+    try:
+        now = timezone.now()
+        with transaction.atomic():
+            rows = list(
+                DeliveryAgent.objects.select_for_update()
+                .filter(agent_id__in=agent_ids)
+                .values_list("agent_id", "approval_status", "claimed_by", "claim_expires_at")
+            )
+            current = {aid: status for aid, status, _, _ in rows}
+            claimed = {aid for aid, _, claimed_by, expires_at in rows if held_by_other(claimed_by, expires_at, moderator_id, now)}
+            eligible = [aid for aid in agent_ids if current.get(aid) == "pending" and aid not in claimed]
+            updated = DeliveryAgent.objects.filter(
+                claimable_by(moderator_id, now), agent_id__in=eligible, approval_status="pending"
+            ).update(approval_status=approval_status, **LEASE_CLEARED)
+        if updated:
+            # .update() skips post_save, so tell the status caches ourselves
+            agent_status_changed.send(sender=DeliveryAgent, agent_ids=eligible)
+
+        results = []
+        for aid in agent_ids:
+            if aid not in current:
+                result = "not_found"
+            elif current[aid] != "pending":
+                result = f"already_{current[aid]}"
+            elif aid in claimed:
+                result = "claimed"
+            else:
+                result = approval_status
+            results.append({"id": aid, "result": result})
+        logger.success(f"Bulk {approval_status} {updated} of {len(agent_ids)} delivery agents.")
+        return {"updated": updated, "results": results}
+    except Exception as e:
+        logger.error(f"Error bulk updating delivery agents: {e}")
+        raise Exception(f"Error bulk updating delivery agents: {str(e)}")
+
+def get_previous_deliveries_for_agent(agent_id: int, limit: int = DEFAULT_PAGE_SIZE, offset: int = 0):
     """
     Fetch previous deliveries for a specific delivery agent.
     """
     logger.info(f"Fetching previous deliveries for agent ID {agent_id}.")
     try:
-        deliveries = DeliveryRequest.objects.filter(agent_id=agent_id, status="completed").order_by('-request_date')
-        if not deliveries.exists():
-            logger.warning(f"No previous deliveries found for agent ID {agent_id}.")
-            return []
-        logger.success(f"Found {deliveries.count()} previous deliveries for agent ID {agent_id}.")
-        return [serialize_delivery_request(delivery) for delivery in deliveries]
+        deliveries = DeliveryRequest.objects.filter(agent_id=agent_id, status="completed").order_by('-request_date', '-request_id')
+        deliveries = serialize_delivery_requests(deliveries[offset:offset + limit])
+        logger.success(f"Found {len(deliveries)} previous deliveries for agent ID {agent_id}.")
+        return deliveries
     except Exception as e:
         logger.error(f"Error fetching previous deliveries for agent ID {agent_id}: {e}")
         raise Exception(f"Error fetching previous deliveries: {str(e)}")
 
-def get_previous_deliveries_for_user(user_id: int):
+def get_previous_deliveries_for_user(user_id: int, limit: int = DEFAULT_PAGE_SIZE, offset: int = 0):
     """
     Fetch previous deliveries for a specific user.
     """
@@ -112,12 +195,10 @@ def get_previous_deliveries_for_user(user_id: int):
         deliveries = DeliveryRequest.objects.filter(
             buyer_id=user_id,
             status__in=["completed", "pending", "accepted"]
-        ).order_by('-request_date')
-        if not deliveries.exists():
-            logger.warning(f"No previous deliveries found for user ID {user_id}.")
-            return []
-        logger.success(f"Found {deliveries.count()} previous deliveries for user ID {user_id}.")
-        return [serialize_delivery_request(delivery) for delivery in deliveries]
+        ).order_by('-request_date', '-request_id')
+        deliveries = serialize_delivery_requests(deliveries[offset:offset + limit])
+        logger.success(f"Found {len(deliveries)} previous deliveries for user ID {user_id}.")
+        return deliveries
     except Exception as e:
         logger.error(f"Error fetching previous deliveries for user ID {user_id}: {e}")
         raise Exception(f"Error fetching previous deliveries: {str(e)}")
@@ -131,7 +212,7 @@ def get_delivery_request_by_id(request_id: int):
     try:
         request = DeliveryRequest.objects.get(request_id=request_id)
         logger.success(f"Found delivery request with ID {request_id}.")
-        return serialize_delivery_request(request)
+        return serialize_delivery_requests([request])[0]
     except DeliveryRequest.DoesNotExist:
         logger.warning(f"Delivery request with ID {request_id} not found.")
         raise Http404(f"Delivery request with ID {request_id} not found.")
@@ -139,18 +220,23 @@ def get_delivery_request_by_id(request_id: int):
         logger.error(f"Error fetching delivery request {request_id}: {e}")
         raise Exception(f"Error fetching delivery request: {str(e)}")
     
-def serialize_delivery_request(request):
-    # Get product details using the existing function
-    product = None
-    if request.product_id:
-        try:
-            product = get_product_by_id(request.product_id)
-        except Exception:
-            product = None
+def serialize_delivery_requests(requests):
+    """
+    Serialize delivery requests with their products loaded in one joined query,
+    however many requests there are. A product that no longer exists serializes as None.
+    """
+    requests = list(requests)
+    product_ids = {request.product_id for request in requests}
+    products = {
+        product["product_id"]: product
+        for product in serialize_products(Product.objects.filter(product_id__in=product_ids))
+    } if product_ids else {}
+    return [serialize_delivery_request(request, products.get(request.product_id)) for request in requests]
 
+def serialize_delivery_request(request, product=None):
     return {
         "request_id": request.request_id,
-        "agent_id": request.agent.agent_id if request.agent else None,
+        "agent_id": request.agent_id,
         "product_id": request.product_id,
         "product": product, 
         "request_date": request.request_date.isoformat() if request.request_date else None,
@@ -215,24 +301,24 @@ def serialize_delivery_agent(agent):
         "user_type": "delivery_agent",
     }
 
-def get_pending_requests_for_agent(agent_id: int):
+def get_pending_requests_for_agent(agent_id: int, limit: int = DEFAULT_PAGE_SIZE, offset: int = 0):
     """
-    Fetch delivery requests that are pending and either unassigned (agent is null)
-    or assigned to a non-approved agent.
+    Fetch the pending delivery requests that match the agent's categories and
+    availability, best fit first (see matching.py). Only requests that are
+    unassigned or assigned to a non-approved agent are included.
     """
     logger.info(f"Fetching pending delivery requests for agent ID {agent_id}.")
     try:
         # Ensure requesting agent is approved
-        agent = DeliveryAgent.objects.get(agent_id=agent_id, approval_status="approved")
+        DeliveryAgent.objects.get(agent_id=agent_id, approval_status="approved")
 
-        # Get all pending requests that are either:
-        # - Not assigned to any agent (agent is null)
-        # - Assigned to agents who are not approved
+        request_ids = matching_engine.feed(agent_id)[offset:offset + limit]
+        # The index may lag behind other workers, so re-check the conditions on the page
         requests = DeliveryRequest.objects.filter(
-            status="pending"
-        ).filter(Q(agent=None) | ~Q(agent__approval_status="approved"))
+            request_id__in=request_ids, status="pending"
+        ).filter(Q(agent=None) | ~Q(agent__approval_status="approved")).in_bulk()
 
-        return [serialize_delivery_request(req) for req in requests]
+        return serialize_delivery_requests(requests[rid] for rid in request_ids if rid in requests)
 
     except DeliveryAgent.DoesNotExist:
         raise Http404("Approved delivery agent not found.")
@@ -241,27 +327,42 @@ def get_pending_requests_for_agent(agent_id: int):
 def accept_delivery_request(request_id: int, agent_id: int):
     """
     Assigns the delivery request to an agent and marks it as accepted.
+
+    The assignment is one conditional UPDATE (compare-and-set on status and
+    agent), so when agents race for the same request exactly one wins without
+    holding row locks; the others get a 409. The agent's approval is part of
+    the same UPDATE rather than read from the middleware's status cache, so an
+    agent rejected a moment ago can't still take work.
     """
     logger.info(f"Agent {agent_id} accepting delivery request {request_id}.")
     try:
+        approved = DeliveryAgent.objects.filter(agent_id=agent_id, approval_status="approved")
+        accepted = DeliveryRequest.objects.filter(
+            Exists(approved), request_id=request_id, status="pending", agent__isnull=True
+        ).update(agent_id=agent_id, status="accepted")
+        if not accepted:
+            if not approved.exists():
+                raise DeliveryAgent.DoesNotExist()
+            if not DeliveryRequest.objects.filter(request_id=request_id).exists():
+                raise DeliveryRequest.DoesNotExist()
+            logger.warning(f"Agent {agent_id} lost the race for delivery request {request_id}.")
+            raise HttpError(409, "Request is already assigned or not pending.")
         delivery_request = DeliveryRequest.objects.get(request_id=request_id)
-        if delivery_request.status != "pending" or delivery_request.agent_id is not None:
-            raise HttpError(400, "Request is already assigned or not pending.")
-        agent = DeliveryAgent.objects.get(agent_id=agent_id, approval_status="approved")
-        delivery_request.agent = agent
-        delivery_request.status = "accepted"
-        delivery_request.save()
+        # .update() skips post_save, so tell the matching index ourselves
+        delivery_requests_changed.send(sender=DeliveryRequest, requests=[delivery_request], deleted=False)
         logger.success(f"Request {request_id} assigned to agent {agent_id}.")
-        return serialize_delivery_request(delivery_request)
+        return serialize_delivery_requests([delivery_request])[0]
     except DeliveryRequest.DoesNotExist:
         raise Http404(f"Delivery request {request_id} not found.")
     except DeliveryAgent.DoesNotExist:
         raise Http404(f"Delivery agent {agent_id} not found.")
+    except HttpError:
+        raise
     except Exception as e:
         logger.error(f"Error accepting delivery request {request_id}: {e}")
         raise Exception(f"Failed to accept delivery request: {str(e)}")
 
-def get_accepted_requests_for_agent(agent_id: int):
+def get_accepted_requests_for_agent(agent_id: int, limit: int = DEFAULT_PAGE_SIZE, offset: int = 0):
     """
     Fetch delivery requests that were accepted or completed by a specific delivery agent.
     """
@@ -270,14 +371,10 @@ def get_accepted_requests_for_agent(agent_id: int):
         deliveries = DeliveryRequest.objects.filter(
             agent_id=agent_id,
             status__in=["accepted", "completed"]
-        ).order_by('-request_date')
-        
-        if not deliveries.exists():
-            logger.warning(f"No accepted or completed deliveries found for agent ID {agent_id}.")
-            return []
-        
-        logger.success(f"Found {deliveries.count()} accepted or completed deliveries for agent ID {agent_id}.")
-        return [serialize_delivery_request(delivery) for delivery in deliveries]
+        ).order_by('-request_date', '-request_id')
+        deliveries = serialize_delivery_requests(deliveries[offset:offset + limit])
+        logger.success(f"Found {len(deliveries)} accepted or completed deliveries for agent ID {agent_id}.")
+        return deliveries
     except Exception as e:
         logger.error(f"Error fetching deliveries for agent ID {agent_id}: {e}")
         raise Exception(f"Error fetching deliveries: {str(e)}")
@@ -300,7 +397,7 @@ def update_delivery_status(request_id: int, status: str):
         request.status = status
         request.save()
         logger.success(f"Delivery status updated to {status} for request {request_id}.")
-        return serialize_delivery_request(request)
+        return serialize_delivery_requests([request])[0]
     except DeliveryRequest.DoesNotExist:
         raise Http404(f"Request {request_id} not found.")
     except Exception as e:
@@ -317,7 +414,7 @@ def create_delivery_request(delivery_request: DeliveryRequestIn):
     seller_id = product.seller_id
     try:
         new_request = DeliveryRequest.objects.create(
-            product_id=delivery_request.product_id,
+            product=product,
             seller_id=seller_id,
             dropoff_location=delivery_request.dropoff_location,
             pickup_location=delivery_request.pickup_location,
@@ -328,8 +425,9 @@ def create_delivery_request(delivery_request: DeliveryRequestIn):
             buyer_id=delivery_request.buyer_id,
             delivery_date=delivery_request.delivery_date_time,
         )
+        # post_save adds it to the matching index; eligible agents see it in their feed
         logger.success(f"Delivery request {new_request.request_id} created successfully.")
-        return serialize_delivery_request(new_request)
+        return serialize_delivery_requests([new_request])[0]
     except Exception as e:
         logger.error(f"Error creating delivery request: {e}")
         raise Exception(f"Failed to create delivery request: {str(e)}")
@@ -349,7 +447,7 @@ def create_delivery_agent(agent_data: DeliveryAgentSignup):
             raise HttpError(400, "Phone number already registered")
 
         # Hash the password
-        hashed_password = make_password(agent_data.password)
+        hashed_password = hash_password(agent_data.password)
 
         # Create new delivery agent
         new_agent = DeliveryAgent.objects.create(
@@ -456,8 +554,12 @@ def login_delivery_agent(login_data: DeliveryAgentLogin) -> AuthResponse:
         agent = DeliveryAgent.objects.get(email=login_data.email)
 
         # Verify password
-        if not check_password(login_data.password, agent.password):
+        is_correct, upgraded = verify_password(login_data.password, agent.password)
+        if not is_correct:
             raise HttpError(401, "Invalid credentials")
+        if upgraded:
+            # Only if nobody changed the password meanwhile
+            DeliveryAgent.objects.filter(agent_id=agent.agent_id, password=agent.password).update(password=upgraded)
         if agent.approval_status != 'approved':
             raise HttpError(401, "Delivery Agent Account is not approved yet. Please wait for approval.")
         
@@ -477,6 +579,8 @@ def login_delivery_agent(login_data: DeliveryAgentLogin) -> AuthResponse:
 
     except DeliveryAgent.DoesNotExist:
         raise HttpError(401, "Invalid credentials")
+    except HttpError:
+        raise
     except Exception as e:
         logger.error(f"Login error for email {login_data.email}: {e}")
         raise HttpError(500, f"Login failed: {str(e)}")
@@ -0,0 +1,139 @@
+import threading
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+from loguru import logger
+from ninja.errors import HttpError
+
+from delivery_agent.database import accept_delivery_request
+from delivery_agent.middleware import get_agent_status
+from delivery_agent.models import DeliveryAgent, DeliveryRequest
+from products.models import Product, ProductStatus
+from users.models import UserProfile
+
+
+class Command(BaseCommand):
+    help = (
+        "Fire simultaneous accepts at delivery requests and report throughput and correctness. "
+        "Creates throwaway agents, products and requests and deletes them afterwards; "
+        "run it against a disposable database (MySQL, SQLite serializes the writers)."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--agents", type=int, default=200, help="Concurrent agents, one accept each per round.")
+        parser.add_argument("--mode", choices=["same", "different", "both"], default="both",
+                            help="Race for one request, accept one request each, or run both rounds.")
+        parser.add_argument("--quiet", action="store_true", help="Silence per-accept logging while running.")
+
+    def handle(self, *args, **options):
+        agents = options["agents"]
+        if agents < 2:
+            raise CommandError("--agents must be at least 2.")
+        if options["quiet"]:
+            logger.disable("delivery_agent")
+        tag = uuid.uuid4().hex[:8]
+        seller = UserProfile.objects.create(
+            first_name="Benchmark", last_name="Seller", email=f"benchmark-{tag}@example.invalid",
+            user_type="user", joined_date="2024-01-01",
+        )
+        try:
+            agent_ids = self._create_agents(tag, agents)
+            failures = []
+            modes = ["same", "different"] if options["mode"] == "both" else [options["mode"]]
+            for mode in modes:
+                request_ids = self._create_requests(seller, 1 if mode == "same" else agents)
+                targets = [request_ids[0] if mode == "same" else request_ids[i] for i in range(agents)]
+                failures += self._round(mode, agent_ids, targets)
+        finally:
+            DeliveryRequest.objects.filter(seller_id=seller.user_id).delete()
+            Product.objects.filter(seller=seller).delete()
+            DeliveryAgent.objects.filter(email__startswith=f"benchmark-{tag}-").delete()
+            seller.delete()
+            logger.enable("delivery_agent")
+        if failures:
+            raise CommandError("; ".join(failures))
+        self.stdout.write(self.style.SUCCESS("All rounds correct"))
+
+    def _create_agents(self, tag, count):
+        DeliveryAgent.objects.bulk_create([
+            DeliveryAgent(
+                first_name="Benchmark", last_name=f"Agent {i}", email=f"benchmark-{tag}-{i}@example.invalid",
+                phone_number=f"b{tag}{i}", transport_mode="bike", joined_date="2024-01-01",
+                approval_status="approved",
+            )
+            for i in range(count)
+        ])
+        agent_ids = list(
+            DeliveryAgent.objects.filter(email__startswith=f"benchmark-{tag}-").order_by("agent_id").values_list("agent_id", flat=True)
+        )
+        for agent_id in agent_ids:
+            get_agent_status(agent_id)   # warm the status cache so the rounds time the accept itself
+        return agent_ids
+
+    def _create_requests(self, seller, count):
+        request_ids = []
+        for i in range(count):
+            product = Product.objects.create(
+                name=f"Benchmark item {i}", description="benchmark", price=1, condition="Used",
+                seller=seller, status=ProductStatus.AVAILABLE,
+            )
+            request = DeliveryRequest.objects.create(
+                product=product, seller_id=seller.user_id, buyer_id=seller.user_id,
+                dropoff_location="benchmark", pickup_location="benchmark",
+            )
+            request_ids.append(request.request_id)
+        return request_ids
+
+    def _round(self, mode, agent_ids, targets):
+        barrier = threading.Barrier(len(agent_ids))
+
+        def attempt(agent_id, request_id):
+            try:
+                barrier.wait()
+                started = time.perf_counter()
+                try:
+                    accept_delivery_request(request_id, agent_id)
+                    outcome = "accepted"
+                except HttpError as e:
+                    outcome = "conflict" if e.status_code == 409 else f"http_{e.status_code}"
+                except Exception as e:
+                    outcome = f"error: {e}"
+                return agent_id, request_id, outcome, time.perf_counter() - started
+            finally:
+                connection.close()
+
+        started = time.perf_counter()
+        with ThreadPoolExecutor(max_workers=len(agent_ids)) as pool:
+            results = list(pool.map(attempt, agent_ids, targets))
+        elapsed = time.perf_counter() - started
+
+        winners = {}
+        outcomes = {}
+        for agent_id, request_id, outcome, _ in results:
+            outcomes[outcome] = outcomes.get(outcome, 0) + 1
+            if outcome == "accepted":
+                winners.setdefault(request_id, []).append(agent_id)
+        latencies = sorted(latency for *_, latency in results)
+        percentile = lambda p: latencies[min(int(len(latencies) * p), len(latencies) - 1)] * 1000
+
+        failures = []
+        stored = dict(DeliveryRequest.objects.filter(request_id__in=set(targets), status="accepted").values_list("request_id", "agent_id"))
+        for request_id in set(targets):
+            won = winners.get(request_id, [])
+            if len(won) != 1:
+                failures.append(f"{mode}: request {request_id} accepted {len(won)} times")
+            elif stored.get(request_id) != won[0]:
+                failures.append(f"{mode}: request {request_id} stored agent {stored.get(request_id)}, winner was {won[0]}")
+        expected_conflicts = len(agent_ids) - len(set(targets))
+        if outcomes.get("conflict", 0) != expected_conflicts:
+            failures.append(f"{mode}: expected {expected_conflicts} conflicts, got {outcomes.get('conflict', 0)}")
+
+        self.stdout.write(
+            f"[{mode}] {len(results)} accepts on {len(set(targets))} requests in {elapsed:.3f}s "
+            f"({len(results) / elapsed:.0f}/s), latency p50 {percentile(0.5):.1f} ms, p95 {percentile(0.95):.1f} ms, "
+            f"p99 {percentile(0.99):.1f} ms; outcomes {outcomes}; {'OK' if not failures else 'FAILED'}"
+        )
+        return failures
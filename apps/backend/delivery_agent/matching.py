@@ -0,0 +1,257 @@
+"""
+In-process matching of delivery agents to pending delivery requests.
+
+Availability is a 21-bit weekly bitmap, one bit per (day, slot): bit
+day * 3 + (slot - 1), Monday = day 0, slots 1-3 covering 08-12, 12-16 and
+16-20. An agent's bitmap comes from the pairs (day_of_week[i], time_slot[i]);
+a request's bitmap is the slot of its delivery_date, the whole day when the
+time is outside the slots, or every bit when it has no date yet.
+
+Pending requests are indexed by category, so feed() for an agent only looks
+at requests in the agent's categories and ranks the compatible ones by fit
+(exact slot and explicit category first, then earliest delivery date, then
+newest request).
+
+Agents with no categories take any category; agents without availability data
+(accounts from before availability was collected) are treated as always
+available. Requests whose product has no category can go to any agent.
+
+Like the product indexes it is built lazily per worker and kept current through
+signals (agent_status_changed, delivery_requests_changed). Agents and requests
+carry no change timestamp, so changes made in other workers show up when the
+background thread rebuilds the index (see backend.refresh), every
+MATCHING_REBUILD_SECONDS, without blocking feed requests.
+"""
+import time
+from collections import defaultdict
+from dataclasses import dataclass
+from datetime import datetime
+
+from django.conf import settings
+from django.dispatch import receiver
+from django.utils import timezone
+
+from backend.refresh import RefreshingIndex
+from products.models import Product
+from .models import DeliveryAgent, DeliveryRequest
+from .signals import agent_status_changed, delivery_requests_changed
+
+DAYS = ("monday", "tuesday", "wednesday", "thursday", "friday", "saturday", "sunday")
+SLOT_START_HOURS = (8, 12, 16)   # slot n covers SLOT_START_HOURS[n-1] up to 4 hours later
+SLOT_HOURS = 4
+SLOTS_PER_DAY = len(SLOT_START_HOURS)
+DAY_MASK = (1 << SLOTS_PER_DAY) - 1
+FULL_MASK = (1 << (len(DAYS) * SLOTS_PER_DAY)) - 1
+REBUILD_SECONDS = getattr(settings, "MATCHING_REBUILD_SECONDS", 60)
+BUILD_CHUNK_SIZE = 2000
+
+
+def _day_index(day):
+    day = str(day).strip().lower()
+    for index, name in enumerate(DAYS):
+        if day and name.startswith(day[:3]):
+            return index
+    return None
+
+
+def availability_mask(day_of_week, time_slot):
+    """Weekly bitmap of an agent's (day_of_week[i], time_slot[i]) pairs; FULL_MASK if there are none."""
+    if isinstance(day_of_week, str):
+        day_of_week = [day_of_week]
+    if isinstance(time_slot, int):
+        time_slot = [[time_slot]]
+    elif isinstance(time_slot, list) and all(isinstance(x, int) for x in time_slot):
+        time_slot = [[x] for x in time_slot]
+    mask = 0
+    for day, slots in zip(day_of_week or [], time_slot or []):
+        day = _day_index(day)
+        if day is None:
+            continue
+        for slot in slots or []:
+            if isinstance(slot, int) and 1 <= slot <= SLOTS_PER_DAY:
+                mask |= 1 << (day * SLOTS_PER_DAY + slot - 1)
+    return mask or FULL_MASK
+
+
+def request_mask(delivery_date):
+    """(bitmap, exact) for a delivery date: its slot, else its whole day, else the whole week."""
+    if delivery_date is None:
+        return FULL_MASK, False
+    if isinstance(delivery_date, datetime) and timezone.is_aware(delivery_date):
+        delivery_date = timezone.localtime(delivery_date)
+    day = delivery_date.weekday()
+    for slot, start in enumerate(SLOT_START_HOURS):
+        if start <= delivery_date.hour < start + SLOT_HOURS:
+            return 1 << (day * SLOTS_PER_DAY + slot), True
+    return DAY_MASK << (day * SLOTS_PER_DAY), False
+
+
+def _category_ids(category_ids):
+    """The agent's categories as ints, or None if it takes any category."""
+    if isinstance(category_ids, str):
+        category_ids = category_ids.split(",")
+    ids = set()
+    for category_id in category_ids or []:
+        try:
+            ids.add(int(category_id))
+        except (TypeError, ValueError):
+            continue
+    return frozenset(ids) or None
+
+
+@dataclass(frozen=True)
+class AgentEntry:
+    agent_id: int
+    mask: int
+    categories: frozenset = None   # None: any category
+
+
+@dataclass(frozen=True)
+class RequestEntry:
+    request_id: int
+    category_id: int
+    mask: int
+    exact: bool                 # the mask is a single slot, not a day or the whole week
+    delivery_date: datetime
+    request_date: datetime
+    agent_id: int = None
+
+
+class MatchingEngine(RefreshingIndex):
+    STATE = ("_agents", "_requests", "_requests_by_category")
+    name = "Matching index"
+
+    def __init__(self):
+        super().__init__(REBUILD_SECONDS, REBUILD_SECONDS)
+
+    def _reset(self):
+        self._agents = {}                          # agent_id -> AgentEntry (approved agents only)
+        self._requests = {}                        # request_id -> RequestEntry (pending requests only)
+        self._requests_by_category = defaultdict(set)   # category_id (None: uncategorized) -> request ids
+
+    def describe(self):
+        return f"{len(self._agents)} agents, {len(self._requests)} pending requests"
+
+    def _load(self):
+        agents = DeliveryAgent.objects.filter(approval_status="approved").values_list(
+            "agent_id", "category_ids", "day_of_week", "time_slot"
+        )
+        for row in agents.iterator(chunk_size=BUILD_CHUNK_SIZE):
+            self._add_agent(*row)
+        requests = DeliveryRequest.objects.filter(status="pending").values_list(
+            "request_id", "product__category_id", "delivery_date", "request_date", "agent_id"
+        )
+        for row in requests.iterator(chunk_size=BUILD_CHUNK_SIZE):
+            self._add_request(*row)
+
+    def _apply(self, change):
+        kind, key, value = change
+        if kind == "agents":
+            for agent_id in key:
+                self._remove_agent(agent_id)
+            for row in value:
+                self._add_agent(*row)
+        else:
+            self._remove_request(key)
+            if value is not None:
+                self._add_request(key, *value)
+
+    def _add_agent(self, agent_id, category_ids, day_of_week, time_slot):
+        self._agents[agent_id] = AgentEntry(agent_id, availability_mask(day_of_week, time_slot), _category_ids(category_ids))
+
+    def _remove_agent(self, agent_id):
+        self._agents.pop(agent_id, None)
+
+    def _add_request(self, request_id, category_id, delivery_date, request_date, agent_id=None):
+        mask, exact = request_mask(delivery_date)
+        self._requests[request_id] = RequestEntry(request_id, category_id, mask, exact, delivery_date, request_date, agent_id)
+        self._requests_by_category[category_id].add(request_id)
+
+    def _remove_request(self, request_id):
+        entry = self._requests.pop(request_id, None)
+        if entry is None:
+            return
+        self._requests_by_category[entry.category_id].discard(request_id)
+        if not self._requests_by_category[entry.category_id]:
+            del self._requests_by_category[entry.category_id]
+
+    def reload_agents(self, agent_ids):
+        """Re-read the given agents; the ones no longer approved (or deleted) leave the index."""
+        if not self.tracking:
+            return
+        rows = list(DeliveryAgent.objects.filter(agent_id__in=agent_ids, approval_status="approved").values_list(
+            "agent_id", "category_ids", "day_of_week", "time_slot"
+        ))
+        self.record(("agents", list(agent_ids), rows))
+
+    def update_request(self, request):
+        if not self.tracking:
+            return
+        entry = None
+        if request.status == "pending":
+            if DeliveryRequest._meta.get_field("product").is_cached(request):
+                category_id = request.product.category_id
+            else:
+                category_id = Product.objects.filter(product_id=request.product_id).values_list("category_id", flat=True).first()
+            entry = (category_id, request.delivery_date, request.request_date, request.agent_id)
+        self.record(("request", request.request_id, entry))
+
+    def remove_request(self, request_id):
+        self.record(("request", request_id, None))
+
+    def feed(self, agent_id):
+        """Ids of the pending requests compatible with the agent, best fit first."""
+        self.ensure_built()
+        with self._lock:
+            agent = self._agents.get(agent_id)
+            if agent is None:
+                return []
+            if agent.categories is None:
+                candidates = self._requests.keys()
+            else:
+                candidates = set(self._requests_by_category.get(None, ()))
+                for category_id in agent.categories:
+                    candidates.update(self._requests_by_category.get(category_id, ()))
+            ranked = []
+            for request_id in candidates:
+                entry = self._requests[request_id]
+                if not entry.mask & agent.mask:
+                    continue
+                if entry.agent_id is not None and entry.agent_id != agent_id and entry.agent_id in self._agents:
+                    continue   # held by another approved agent
+                fit = entry.exact + (agent.categories is not None and entry.category_id is not None)
+                ranked.append((
+                    -fit,
+                    entry.delivery_date is None,
+                    entry.delivery_date.timestamp() if entry.delivery_date else 0,
+                    -entry.request_date.timestamp() if entry.request_date else 0,
+                    -request_id,
+                ))
+        ranked.sort()
+        return [-key[-1] for key in ranked]
+
+    def stats(self):
+        with self._lock:
+            return {
+                "agents": len(self._agents),
+                "pending_requests": len(self._requests),
+                "categories": len({c for agent in self._agents.values() for c in agent.categories or ()}),
+                "built_seconds_ago": round(time.monotonic() - self._built_at, 1) if self._built_at else None,
+            }
+
+
+matching_engine = MatchingEngine()
+
+
+@receiver(agent_status_changed)
+def refresh_agents(sender, agent_ids, **kwargs):
+    matching_engine.reload_agents(agent_ids)
+
+
+@receiver(delivery_requests_changed)
+def refresh_requests(sender, requests, deleted=False, **kwargs):
+    for request in requests:
+        if deleted:
+            matching_engine.remove_request(request.request_id)
+        else:
+            matching_engine.update_request(request)
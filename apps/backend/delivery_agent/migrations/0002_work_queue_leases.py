@@ -0,0 +1,27 @@
+# Generated by Django 5.2 on 2026-10-17 02:47
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('delivery_agent', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='deliveryagent',
+            name='claim_expires_at',
+            field=models.DateTimeField(blank=True, null=True),
+        ),
+        migrations.AddField(
+            model_name='deliveryagent',
+            name='claimed_by',
+            field=models.IntegerField(blank=True, null=True),
+        ),
+        migrations.AddIndex(
+            model_name='deliveryagent',
+            index=models.Index(fields=['approval_status', 'claim_expires_at'], name='agent_claim_idx'),
+        ),
+    ]
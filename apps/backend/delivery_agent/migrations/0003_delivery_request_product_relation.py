@@ -0,0 +1,37 @@
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('delivery_agent', '0002_work_queue_leases'),
+        ('products', '0010_deduplicate_reports'),
+    ]
+
+    operations = [
+        # product_id becomes a relation in the model state only: the column, its
+        # unique index and the data stay as they are, no FK constraint is added.
+        migrations.SeparateDatabaseAndState(
+            state_operations=[
+                migrations.RemoveField(
+                    model_name='deliveryrequest',
+                    name='product_id',
+                ),
+                migrations.AddField(
+                    model_name='deliveryrequest',
+                    name='product',
+                    field=models.OneToOneField(db_column='product_id', db_constraint=False, on_delete=django.db.models.deletion.DO_NOTHING, related_name='delivery_request', to='products.product'),
+                    preserve_default=False,
+                ),
+            ],
+        ),
+        migrations.AddIndex(
+            model_name='deliveryrequest',
+            index=models.Index(fields=['agent', 'status', 'request_date'], name='delivery_agent_status_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='deliveryrequest',
+            index=models.Index(fields=['buyer_id', 'status', 'request_date'], name='delivery_buyer_status_idx'),
+        ),
+    ]
@@ -1,4 +1,5 @@
 from django.db import models
+from products.models import Product
 
 # Create your models here.
 
@@ -19,6 +20,8 @@ class DeliveryAgent(models.Model):
     time_slot = models.JSONField(default=list)    # Store array of arrays as JSON
     joined_date = models.DateField()
     approval_status = models.CharField(max_length=20, default="pending")
+    claimed_by = models.IntegerField(null=True, blank=True)  # moderator holding the review lease
+    claim_expires_at = models.DateTimeField(null=True, blank=True)
 
     def __str__(self):
         return f"{self.first_name} {self.last_name} ({self.transport_mode})"
@@ -27,12 +30,19 @@ class DeliveryAgent(models.Model):
         db_table = "delivery_agents"
         verbose_name = "Delivery Agent"
         verbose_name_plural = "Delivery Agents"
+        indexes = [
+            models.Index(fields=["approval_status", "claim_expires_at"], name="agent_claim_idx"),
+        ]
     
 class DeliveryRequest(models.Model):
     
     request_id = models.AutoField(primary_key=True)
     agent = models.ForeignKey(DeliveryAgent, on_delete=models.CASCADE, null=True, blank=True)
-    product_id = models.IntegerField(unique=True)
+    # Plain product_id column underneath; no FK constraint so delivery history outlives deleted listings
+    product = models.OneToOneField(
+        Product, on_delete=models.DO_NOTHING, db_column="product_id", db_constraint=False,
+        related_name="delivery_request",
+    )
     request_date = models.DateTimeField(auto_now_add=True)
     seller_id = models.IntegerField()
     buyer_id = models.IntegerField()
@@ -52,4 +62,8 @@ class DeliveryRequest(models.Model):
         db_table = "delivery_requests"
         verbose_name = "Delivery Request"
         verbose_name_plural = "Delivery Requests"
-        ordering = ['-request_date']
\ No newline at end of file
+        ordering = ['-request_date']
+        indexes = [
+            models.Index(fields=["agent", "status", "request_date"], name="delivery_agent_status_idx"),
+            models.Index(fields=["buyer_id", "status", "request_date"], name="delivery_buyer_status_idx"),
+        ]
\ No newline at end of file
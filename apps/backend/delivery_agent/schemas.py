@@ -18,6 +18,10 @@ class DeliveryAgentOut(Schema):
     time_slot: List[List[int]]
     joined_date: str
 
+class AgentClaimOut(Schema):
+    lease_expires_at: datetime
+    items: List[DeliveryAgentOut]
+
 class DeliveryRequestOut(Schema):
     request_id: int
     agent_id: Optional[int] = None  # Agent ID if assigned
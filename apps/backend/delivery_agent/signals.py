@@ -0,0 +1,28 @@
+from django.db.models.signals import post_save, post_delete
+from django.dispatch import Signal, receiver
+from .models import DeliveryAgent, DeliveryRequest
+
+# Sent with agent_ids=[...] whenever an agent's approval status may have changed
+# (or the agent was deleted). Per-process caches of agent status listen to this;
+# bulk UPDATE paths, which skip post_save, send it themselves.
+agent_status_changed = Signal()
+
+# Sent with requests=[DeliveryRequest, ...] and deleted=bool whenever delivery
+# requests change, for the in-process matching index.
+delivery_requests_changed = Signal()
+
+
+@receiver(post_save, sender=DeliveryAgent)
+@receiver(post_delete, sender=DeliveryAgent)
+def agent_saved(sender, instance, **kwargs):
+    agent_status_changed.send(sender=DeliveryAgent, agent_ids=[instance.agent_id])
+
+
+@receiver(post_save, sender=DeliveryRequest)
+def delivery_request_saved(sender, instance, **kwargs):
+    delivery_requests_changed.send(sender=DeliveryRequest, requests=[instance], deleted=False)
+
+
+@receiver(post_delete, sender=DeliveryRequest)
+def delivery_request_deleted(sender, instance, **kwargs):
+    delivery_requests_changed.send(sender=DeliveryRequest, requests=[instance], deleted=True)
@@ -1,3 +1,298 @@
+from datetime import datetime, timedelta
+
+from django.http import Http404
 from django.test import TestCase
+from django.utils import timezone
+from ninja.errors import HttpError
+
+from products.models import Product, Category
+from users.models import UserProfile
+from .database import (
+    accept_delivery_request,
+    approve_agent,
+    bulk_set_agent_approval,
+    create_delivery_request,
+    generate_tokens,
+    get_accepted_requests_for_agent,
+    get_pending_requests_for_agent,
+    get_previous_deliveries_for_user,
+    reject_agent,
+)
+from .matching import matching_engine, availability_mask, request_mask
+from .middleware import agent_token_cache, agent_status_cache, get_agent_status
+from .models import DeliveryAgent, DeliveryRequest
+from .schemas import DeliveryRequestIn
+
+
+class DeliveryAgentAuthMiddlewareTests(TestCase):
+    URL = "/api/delivery-agent/pending-requests/{}"
+
+    def setUp(self):
+        agent_token_cache.clear()
+        agent_status_cache.clear()
+        self.agent = DeliveryAgent.objects.create(
+            first_name="Dana", last_name="Driver", email="dana@example.com",
+            phone_number="0123456789", transport_mode="bike", joined_date="2024-01-01",
+        )
+        token, self.refresh_token = generate_tokens(self.agent)
+        matching_engine.build()
+        self.headers = {"HTTP_AUTHORIZATION": f"Bearer {token}"}
+
+    def get(self, **headers):
+        return self.client.get(self.URL.format(self.agent.agent_id), **headers)
+
+    def test_requires_access_token(self):
+        self.assertEqual(self.get().status_code, 401)
+        self.assertEqual(self.get(HTTP_AUTHORIZATION=f"Bearer {self.refresh_token}").status_code, 401)
+
+    def test_repeat_requests_skip_auth_queries(self):
+        approve_agent(self.agent.agent_id)
+        with self.assertNumQueries(2):   # status lookup + the view's agent check
+            self.assertEqual(self.get(**self.headers).status_code, 200)
+        with self.assertNumQueries(1):
+            self.assertEqual(self.get(**self.headers).status_code, 200)
+        self.assertGreater(agent_token_cache.stats()["hits"], 0)
+
+    def test_status_changes_invalidate_cache(self):
+        self.assertEqual(self.get(**self.headers).status_code, 403)
+        approve_agent(self.agent.agent_id)
+        self.assertEqual(self.get(**self.headers).status_code, 200)
+
+        other = DeliveryAgent.objects.create(
+            first_name="Ola", last_name="Other", email="ola@example.com",
+            phone_number="0987654321", transport_mode="car", joined_date="2024-01-01",
+        )
+        token, _ = generate_tokens(other)
+        headers = {"HTTP_AUTHORIZATION": f"Bearer {token}"}
+        self.assertEqual(self.client.get(self.URL.format(other.agent_id), **headers).status_code, 403)
+        bulk_set_agent_approval([other.agent_id], "approved")
+        self.assertEqual(self.client.get(self.URL.format(other.agent_id), **headers).status_code, 200)
+
+    def test_agent_cannot_act_for_another(self):
+        other = DeliveryAgent.objects.create(
+            first_name="Ola", last_name="Other", email="ola@example.com", phone_number="0987654321",
+            transport_mode="car", joined_date="2024-01-01", approval_status="approved",
+        )
+        token, _ = generate_tokens(other)
+        headers = {"HTTP_AUTHORIZATION": f"Bearer {token}"}
+        approve_agent(self.agent.agent_id)
+        for path in ("pending-requests", "accepted-deliveries", "previous-deliveries"):
+            response = self.client.get(f"/api/delivery-agent/{path}/{self.agent.agent_id}", **headers)
+            self.assertEqual(response.status_code, 403, path)
+        response = self.client.post(f"/api/delivery-agent/accept-request/999999/{self.agent.agent_id}", **headers)
+        self.assertEqual(response.status_code, 403)
+        response = self.client.post(f"/api/delivery-agent/accept-request/999999/{other.agent_id}", **headers)
+        self.assertEqual(response.status_code, 404)
+
+
+class DeliveryRequestListingTests(TestCase):
+    REQUEST_COUNT = 12
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.buyer = UserProfile.objects.create(
+            first_name="Bo", last_name="Buyer", email="buyer@example.com",
+            user_type="user", joined_date="2024-01-01",
+        )
+        cls.agent = DeliveryAgent.objects.create(
+            first_name="Dana", last_name="Driver", email="dana@example.com", phone_number="0123456789",
+            transport_mode="bike", joined_date="2024-01-01", approval_status="approved",
+        )
+        category = Category.objects.create(category_name="Books")
+        for i in range(cls.REQUEST_COUNT):
+            product = Product.objects.create(
+                name=f"Book {i}", description="desc", price=i, condition="Used",
+                seller=cls.buyer, category=category if i % 2 else None, status="Available",
+            )
+            DeliveryRequest.objects.create(
+                product=product, seller_id=cls.buyer.user_id, buyer_id=cls.buyer.user_id,
+                agent=cls.agent if i % 3 else None, status="accepted" if i % 3 else "pending",
+                dropoff_location="A", pickup_location="B",
+            )
+        # A request whose listing was deleted keeps its history
+        DeliveryRequest.objects.filter(product__name="Book 0").update(product_id=999999)
+
+    def test_listings_run_constant_queries(self):
+        with self.assertNumQueries(2):
+            deliveries = get_previous_deliveries_for_user(self.buyer.user_id)
+        self.assertEqual(len(deliveries), self.REQUEST_COUNT)
+        by_product = {d["product_id"]: d for d in deliveries}
+        self.assertIsNone(by_product[999999]["product"])
+        book = next(d["product"] for d in deliveries if d["product"] and d["product"]["name"] == "Book 1")
+        self.assertEqual(book["category_name"], "Books")
+
+        with self.assertNumQueries(2):
+            accepted = get_accepted_requests_for_agent(self.agent.agent_id)
+        self.assertEqual(len(accepted), 8)
+
+    def test_listings_paginate(self):
+        first = get_previous_deliveries_for_user(self.buyer.user_id, limit=5)
+        rest = get_previous_deliveries_for_user(self.buyer.user_id, limit=50, offset=5)
+        self.assertEqual(len(first), 5)
+        self.assertEqual(len(rest), self.REQUEST_COUNT - 5)
+        ids = [d["request_id"] for d in first + rest]
+        self.assertEqual(len(set(ids)), self.REQUEST_COUNT)
+
+
+class MatchingEngineTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        seller = UserProfile.objects.create(
+            first_name="Sam", last_name="Seller", email="seller@example.com",
+            user_type="user", joined_date="2024-01-01",
+        )
+        cls.books = Category.objects.create(category_name="Books")
+        cls.electronics = Category.objects.create(category_name="Electronics")
+
+        def agent(name, category_ids, day_of_week, time_slot):
+            return DeliveryAgent.objects.create(
+                first_name=name, last_name="Agent", email=f"{name}@example.com", phone_number=name,
+                transport_mode="bike", joined_date="2024-01-01", approval_status="approved",
+                category_ids=category_ids, day_of_week=day_of_week, time_slot=time_slot,
+            )
+        cls.book_agent = agent("books", [str(cls.books.category_id)], ["Monday"], [[1]])
+        cls.any_agent = agent("any", [], ["Tuesday"], [[2]])
+        cls.gadget_agent = agent("gadgets", [str(cls.electronics.category_id)], [], [])
+
+        def request(category, delivery_date):
+            product = Product.objects.create(
+                name="Item", description="desc", price=1, condition="Used",
+                seller=seller, category=category, status="Available",
+            )
+            return DeliveryRequest.objects.create(
+                product=product, seller_id=seller.user_id, buyer_id=seller.user_id,
+                dropoff_location="A", pickup_location="B", delivery_date=delivery_date,
+            )
+        monday_9am = timezone.make_aware(datetime(2024, 1, 1, 9))
+        tuesday_1pm = timezone.make_aware(datetime(2024, 1, 2, 13))
+        cls.monday_books = request(cls.books, monday_9am)
+        cls.tuesday_books = request(cls.books, tuesday_1pm)
+        cls.monday_gadget = request(cls.electronics, monday_9am)
+        cls.undated_books = request(cls.books, None)
+        cls.monday_9am = monday_9am
+
+    def setUp(self):
+        matching_engine.invalidate()
+        agent_status_cache.clear()
+
+    def test_masks(self):
+        self.assertEqual(availability_mask(["Monday", "Wednesday"], [[1, 3], [2]]), 0b10000101)
+        self.assertEqual(request_mask(self.monday_9am), (1, True))
+        self.assertEqual(request_mask(timezone.make_aware(datetime(2024, 1, 2, 22))), (0b111000, False))
+
+    def test_feed_is_filtered_and_ranked(self):
+        self.assertEqual(
+            matching_engine.feed(self.book_agent.agent_id),
+            [self.monday_books.request_id, self.undated_books.request_id],
+        )
+        self.assertEqual(
+            matching_engine.feed(self.any_agent.agent_id),
+            [self.tuesday_books.request_id, self.undated_books.request_id],
+        )
+
+    def test_feed_follows_changes(self):
+        feed = get_pending_requests_for_agent(self.book_agent.agent_id)
+        self.assertEqual([r["request_id"] for r in feed], [self.monday_books.request_id, self.undated_books.request_id])
+
+        accept_delivery_request(self.monday_books.request_id, self.book_agent.agent_id)
+        self.assertEqual(matching_engine.feed(self.book_agent.agent_id), [self.undated_books.request_id])
+
+        DeliveryAgent.objects.filter(agent_id=self.any_agent.agent_id).update(approval_status="rejected")
+        matching_engine.reload_agents([self.any_agent.agent_id])
+        self.assertEqual(matching_engine.feed(self.any_agent.agent_id), [])
+
+    def test_background_refresh_picks_up_other_workers(self):
+        matching_engine.ensure_built()
+        # Rejected in another worker: no agent_status_changed reaches this one
+        DeliveryAgent.objects.filter(agent_id=self.any_agent.agent_id).update(approval_status="rejected")
+        self.assertNotEqual(matching_engine.feed(self.any_agent.agent_id), [])
+        matching_engine.catch_up()
+        self.assertEqual(matching_engine.feed(self.any_agent.agent_id), [])
+
+    def test_new_request_reaches_matching_feeds(self):
+        matching_engine.ensure_built()
+        product = Product.objects.create(
+            name="Radio", description="desc", price=1, condition="Used",
+            seller_id=self.monday_gadget.seller_id, category=self.electronics, status="Available",
+        )
+        created = create_delivery_request(DeliveryRequestIn(
+            product_id=product.product_id, dropoff_location="C", pickup_location="D", delivery_fee=4.5,
+            buyer_id=self.monday_gadget.buyer_id, delivery_date_time=self.monday_9am,
+        ))
+        self.assertIn(created["request_id"], matching_engine.feed(self.gadget_agent.agent_id))
+        self.assertNotIn(created["request_id"], matching_engine.feed(self.book_agent.agent_id))
+
+
+class AcceptDeliveryRequestTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        seller = UserProfile.objects.create(
+            first_name="Sam", last_name="Seller", email="seller@example.com",
+            user_type="user", joined_date="2024-01-01",
+        )
+        product = Product.objects.create(
+            name="Item", description="desc", price=1, condition="Used", seller=seller, status="Available",
+        )
+        cls.delivery = DeliveryRequest.objects.create(
+            product=product, seller_id=seller.user_id, buyer_id=seller.user_id,
+            dropoff_location="A", pickup_location="B",
+        )
+
+        def agent(name):
+            return DeliveryAgent.objects.create(
+                first_name=name, last_name="Agent", email=f"{name}@example.com", phone_number=name,
+                transport_mode="bike", joined_date="2024-01-01", approval_status="approved",
+            )
+        cls.first = agent("first")
+        cls.second = agent("second")
+
+    def setUp(self):
+        matching_engine.invalidate()
+        agent_status_cache.clear()
+
+    def test_second_accept_conflicts(self):
+        accept_delivery_request(self.delivery.request_id, self.first.agent_id)
+        with self.assertRaises(HttpError) as raised:
+            accept_delivery_request(self.delivery.request_id, self.second.agent_id)
+        self.assertEqual(raised.exception.status_code, 409)
+        self.delivery.refresh_from_db()
+        self.assertEqual((self.delivery.status, self.delivery.agent_id), ("accepted", self.first.agent_id))
+
+    def test_approval_is_checked_in_the_update(self):
+        self.assertEqual(get_agent_status(self.first.agent_id), "approved")
+        # Rejected by another worker: this worker's status cache still says approved
+        DeliveryAgent.objects.filter(agent_id=self.first.agent_id).update(approval_status="rejected")
+        with self.assertRaises(Http404):
+            accept_delivery_request(self.delivery.request_id, self.first.agent_id)
+        self.delivery.refresh_from_db()
+        self.assertEqual((self.delivery.status, self.delivery.agent_id), ("pending", None))
+
+    def test_unknown_request(self):
+        with self.assertRaises(Http404):
+            accept_delivery_request(999999, self.first.agent_id)
+
+
+class AgentModerationLeaseTests(TestCase):
+    def setUp(self):
+        agent_status_cache.clear()
+        self.agent = DeliveryAgent.objects.create(
+            first_name="Pat", last_name="Pending", email="pat@example.com", phone_number="0123456789",
+            transport_mode="bike", joined_date="2024-01-01",
+            claimed_by=1, claim_expires_at=timezone.now() + timedelta(minutes=5),
+        )
+
+    def test_only_the_holder_decides_a_claimed_agent(self):
+        with self.assertRaises(HttpError) as raised:
+            reject_agent(self.agent.agent_id, 2)
+        self.assertEqual(raised.exception.status_code, 409)
+        outcome = bulk_set_agent_approval([self.agent.agent_id], "approved", 2)
+        self.assertEqual(outcome["results"], [{"id": self.agent.agent_id, "result": "claimed"}])
+        self.assertEqual(get_agent_status(self.agent.agent_id), "pending")
 
-# Create your tests here.
+        approve_agent(self.agent.agent_id, 1)
+        self.agent.refresh_from_db()
+        self.assertEqual((self.agent.approval_status, self.agent.claimed_by, self.agent.claim_expires_at), ("approved", None, None))
+        self.assertEqual(get_agent_status(self.agent.agent_id), "approved")
+        with self.assertRaises(HttpError) as raised:
+            reject_agent(self.agent.agent_id, 1)
+        self.assertEqual(raised.exception.status_code, 400)
@@ -2,33 +2,123 @@ from typing import List, Optional
 from ninja import Query, Router
 from ninja.errors import HttpError
 from .models import Category
-from .schemas import ProductIn, ProductOut, CategoryOut
+from .schemas import ProductIn, ProductOut, ProductPageOut, ProductFacetsOut, ProductImportOut, CategoryOut, SuggestionOut
+from .importer import import_products
+from .exporter import export_products_ndjson
+from .autocomplete import MAX_SUGGESTIONS
 from .database import (
+    DEFAULT_PAGE_SIZE,
+    MAX_PAGE_SIZE,
     create_product_entry,
-    get_filtered_products,
+    get_listing_page,
+    get_product_facets,
+    get_autocomplete_suggestions,
+    get_listing_cache_stats,
+    get_listing_etag,
+    get_product_etag,
+    get_nearby_products,
     get_product_by_id,
     update_product_entry,
     delete_product_entry,
 )
-from django.http import Http404
+from django.http import Http404, HttpResponse, StreamingHttpResponse
 from loguru import logger
 from typing import List
 
 prodcut_router = Router()
 
-@prodcut_router.get("", response=List[ProductOut], tags=["Products"])
+def etag_matches(request, etag):
+    """True if the request's If-None-Match already names this ETag."""
+    header = request.headers.get("If-None-Match")
+    if not header:
+        return False
+    candidates = [tag.strip() for tag in header.split(",")]
+    return "*" in candidates or etag in candidates
+
+def not_modified(etag):
+    response = HttpResponse(status=304)
+    response["ETag"] = etag
+    return response
+
+@prodcut_router.get("", response=ProductPageOut, tags=["Products"])
 def list_products(
     request,
+    response: HttpResponse,
     category: Optional[int] = Query(None),
     name: Optional[str] = Query(None),
     condition: Optional[str] = Query(None),
     location: Optional[str] = Query(None),
     min_price: Optional[float] = Query(None),
-    max_price: Optional[float] = Query(None)
+    max_price: Optional[float] = Query(None),
+    q: Optional[str] = Query(None),
+    lat: Optional[float] = Query(None, ge=-90, le=90),
+    lng: Optional[float] = Query(None, ge=-180, le=180),
+    radius_km: Optional[float] = Query(None, gt=0, le=500),
+    cursor: Optional[str] = Query(None),
+    limit: int = Query(DEFAULT_PAGE_SIZE, ge=1, le=MAX_PAGE_SIZE)
 ):
-    logger.info(f"Listing products with filters: category={category}, name={name}, condition={condition}, location={location}, min_price={min_price}, max_price={max_price}")
+    logger.info(f"Listing products with filters: q={q}, category={category}, name={name}, condition={condition}, location={location}, min_price={min_price}, max_price={max_price}, lat={lat}, lng={lng}, radius_km={radius_km}, cursor={cursor}, limit={limit}")
+    near = (lat, lng, radius_km)
+    if any(value is not None for value in near) and not all(value is not None for value in near):
+        raise HttpError(400, "lat, lng and radius_km must be given together")
     try:
-        result = get_filtered_products(
+        if lat is not None:
+            result = get_nearby_products(
+                lat, lng, radius_km,
+                category=category,
+                name=name,
+                condition=condition,
+                location=location,
+                min_price=min_price,
+                max_price=max_price,
+                cursor=cursor,
+                limit=limit,
+                q=q
+            )
+            logger.info(f"Found {len(result['results'])} products nearby")
+            etag = get_listing_etag(result)
+        else:
+            # A conditional request is checked against the database, not a cached page
+            result, etag = get_listing_page(
+                category=category,
+                name=name,
+                condition=condition,
+                location=location,
+                min_price=min_price,
+                max_price=max_price,
+                cursor=cursor,
+                limit=limit,
+                q=q,
+                fresh=bool(request.headers.get("If-None-Match"))
+            )
+            logger.info(f"Found {len(result['results'])} products")
+        if etag_matches(request, etag):
+            logger.info("Product listing not modified")
+            return not_modified(etag)
+        response["ETag"] = etag
+        return result
+    except ValueError as e:
+        logger.warning(f"Bad listing request: {e}")
+        raise HttpError(400, str(e))
+    except Exception as e:
+        logger.error(f"Error listing products: {e}")
+        raise HttpError(500, str(e))
+    
+@prodcut_router.get("/facets", response=ProductFacetsOut, tags=["Products"])
+def product_facets(
+    request,
+    category: Optional[int] = Query(None),
+    name: Optional[str] = Query(None),
+    condition: Optional[str] = Query(None),
+    location: Optional[str] = Query(None),
+    min_price: Optional[float] = Query(None),
+    max_price: Optional[float] = Query(None),
+    q: Optional[str] = Query(None)
+):
+    logger.info(f"Fetching product facets with filters: q={q}, category={category}, name={name}, condition={condition}, location={location}, min_price={min_price}, max_price={max_price}")
+    try:
+        return get_product_facets(
+            q=q,
             category=category,
             name=name,
             condition=condition,
@@ -36,12 +126,28 @@ def list_products(
             min_price=min_price,
             max_price=max_price
         )
-        logger.info(f"Found {len(result)} products")
-        return result
     except Exception as e:
-        logger.error(f"Error listing products: {e}")
+        logger.error(f"Error fetching product facets: {e}")
         raise HttpError(500, str(e))
-    
+
+@prodcut_router.get("/autocomplete", response=List[SuggestionOut], tags=["Products"])
+def autocomplete(request, q: str = Query(...), limit: int = Query(10, ge=1, le=MAX_SUGGESTIONS)):
+    """
+    Product name and category suggestions for what has been typed so far, most popular first.
+    """
+    try:
+        return get_autocomplete_suggestions(q, limit)
+    except Exception as e:
+        logger.error(f"Error fetching suggestions for '{q}': {e}")
+        raise HttpError(500, str(e))
+
+@prodcut_router.get("/cache-stats", tags=["Products"])
+def listing_cache_stats(request):
+    """
+    Hit/miss counters of this worker's product listing cache.
+    """
+    return get_listing_cache_stats()
+
 @prodcut_router.get("/categories", response=List[CategoryOut], tags=["Products"])
 def list_categories(request):
     logger.info("Listing all product categories")
@@ -52,12 +158,62 @@ def list_categories(request):
         logger.error(f"Error listing categories: {e}")
         raise HttpError(500, str(e))
     
+@prodcut_router.get("/export", tags=["Products"])
+def export_products_view(
+    request,
+    category: Optional[int] = Query(None),
+    name: Optional[str] = Query(None),
+    condition: Optional[str] = Query(None),
+    location: Optional[str] = Query(None),
+    min_price: Optional[float] = Query(None),
+    max_price: Optional[float] = Query(None)
+):
+    """
+    Stream every listed product matching the filters as NDJSON.
+    """
+    logger.info(f"Exporting products with filters: category={category}, name={name}, condition={condition}, location={location}, min_price={min_price}, max_price={max_price}")
+    lines = export_products_ndjson(
+        category=category,
+        name=name,
+        condition=condition,
+        location=location,
+        min_price=min_price,
+        max_price=max_price
+    )
+    response = StreamingHttpResponse(lines, content_type="application/x-ndjson")
+    response["Content-Disposition"] = 'attachment; filename="products.ndjson"'
+    return response
+
+@prodcut_router.post("/import", response=ProductImportOut, tags=["Products"])
+def import_products_view(request, format: Optional[str] = Query(None)):
+    """
+    Bulk create products from an NDJSON or CSV request body of ProductIn records.
+    The body is streamed; the format comes from ?format= or the Content-Type.
+    """
+    fmt = format or ("csv" if request.content_type == "text/csv" else "ndjson")
+    logger.info(f"Importing products from a {fmt} stream")
+    try:
+        lines = (line.decode("utf-8") for line in request)
+        return import_products(lines, fmt=fmt)
+    except ValueError as e:
+        logger.warning(f"Bad import request: {e}")
+        raise HttpError(400, str(e))
+    except Exception as e:
+        logger.error(f"Error importing products: {e}")
+        raise HttpError(500, str(e))
+
 @prodcut_router.get("/{id}", response=ProductOut, tags=["Products"])
-def product_detail_view(request, id: int):
+def product_detail_view(request, id: int, response: HttpResponse):
     logger.info(f"Fetching product detail for id={id}")
     try:
+        if request.headers.get("If-None-Match"):
+            etag = get_product_etag(id)
+            if etag_matches(request, etag):
+                logger.info(f"Product {id} not modified")
+                return not_modified(etag)
         product = get_product_by_id(id)
         logger.info(f"Product found: {product}")
+        response["ETag"] = get_product_etag(id, product["updated_at"])
         return product
     except Http404 as e:
         logger.warning(f"Product not found: {e}")
@@ -2,3 +2,7 @@ from django.apps import AppConfig
 class ProductsConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
     name = 'products'
+
+    def ready(self):
+        # Register signal receivers that keep in-process indexes current
+        from . import signals, search, facets, cache, geo, autocomplete  # noqa: F401
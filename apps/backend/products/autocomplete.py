@@ -0,0 +1,265 @@
+"""
+In-process typeahead over listed product names and category names.
+
+Suggestions are distinct product names (case/punctuation-insensitive) and
+categories. Each is stored under its full text and under every word suffix
+("wireless mouse" is also found by "mouse"), so a prefix lookup is a bisect
+plus a scan of the matching range. Popularity is the number of listed products
+behind a suggestion: identical names listed by many sellers, or products in a
+category.
+
+The (key, suggestion) pairs live in one sorted array per popularity tier
+(count.bit_length()). A lookup scans the tiers from most to least popular and
+stops once it has enough suggestions; every suggestion of a lower tier is less
+popular than all of a higher one, so the result is the exact top-k while the
+large low tiers are barely touched. The top results for one- and two-character
+prefixes are memoized and dropped whenever a suggestion under them changes.
+
+Like the search index it is built lazily per worker, kept current through the
+products_changed signal (and Category saves) and refreshed in the background
+(see backend.refresh) to pick up changes made in other workers.
+"""
+import heapq
+import re
+from bisect import bisect_left, insort
+from collections import defaultdict
+
+from django.db.models.signals import post_save, post_delete
+from django.conf import settings
+from django.dispatch import receiver
+
+from backend.refresh import RefreshingIndex
+from .models import Product, Category, ProductStatus
+from .signals import products_changed
+
+TOKEN_RE = re.compile(r"\w+")
+MAX_SUGGESTIONS = 20
+MAX_WORD_KEYS = 8
+CACHED_PREFIX_LENGTH = 2
+BUILD_CHUNK_SIZE = 2000
+REFRESH_SECONDS = getattr(settings, "PRODUCT_INDEX_REFRESH_SECONDS", 60)
+REBUILD_SECONDS = getattr(settings, "PRODUCT_INDEX_REBUILD_SECONDS", 3600)
+
+
+def normalize(text):
+    return " ".join(TOKEN_RE.findall(text.lower())) if text else ""
+
+
+def _keys(text):
+    words = text.split(" ")
+    return [" ".join(words[i:]) for i in range(min(len(words), MAX_WORD_KEYS))]
+
+
+class AutocompleteIndex(RefreshingIndex):
+    STATE = ("_tiers", "_suggestions", "_products", "_top")
+    name = "Autocomplete index"
+
+    def __init__(self):
+        super().__init__(REFRESH_SECONDS, REBUILD_SECONDS)
+
+    def _reset(self):
+        self._tiers = defaultdict(list)   # tier -> sorted (key, suggestion); suggestion is ("product", text) or ("category", id)
+        self._suggestions = {}    # suggestion -> [label, count, text]
+        self._products = {}       # product_id -> (name text, category_id)
+        self._top = {}            # short prefix -> best suggestions, most popular first
+
+    def describe(self):
+        return f"{len(self._suggestions)} suggestions in {len(self._tiers)} tiers"
+
+    def _load(self):
+        for category_id, category_name in Category.objects.values_list("category_id", "category_name"):
+            text = normalize(category_name)
+            if text:
+                self._suggestions[("category", category_id)] = [category_name.strip(), 0, text]
+        rows = Product.objects.filter(
+            approve_status="approved", status=ProductStatus.AVAILABLE
+        ).values_list("product_id", "name", "category_id")
+        for product_id, name, category_id in rows.iterator(chunk_size=BUILD_CHUNK_SIZE):
+            text = normalize(name)
+            if not text:
+                continue
+            entry = self._suggestions.setdefault(("product", text), [name.strip(), 0, text])
+            entry[1] += 1
+            if ("category", category_id) in self._suggestions:
+                self._suggestions[("category", category_id)][1] += 1
+            self._products[product_id] = (text, category_id)
+        # Fill the tiers in one pass and sort once instead of inserting key by key
+        for suggestion, (_, count, text) in self._suggestions.items():
+            self._tiers[count.bit_length()].extend((key, suggestion) for key in _keys(text))
+        for keys in self._tiers.values():
+            keys.sort()
+
+    def _changed_since(self, since):
+        # Categories first, so products moved into a new category are counted under it
+        changes = [
+            ("category", category_id, category_name)
+            for category_id, category_name in Category.objects.filter(
+                updated_at__gte=since
+            ).values_list("category_id", "category_name")
+        ]
+        products = Product.objects.filter(updated_at__gte=since).only(
+            "product_id", "name", "category_id", "status", "approve_status"
+        )
+        changes.extend(("product", product.product_id, product) for product in products.iterator(chunk_size=BUILD_CHUNK_SIZE))
+        return changes
+
+    def _apply(self, change):
+        kind, key, value = change
+        if kind == "category":
+            if value is None:
+                self._drop(("category", key))
+            else:
+                self._set_category(key, value)
+        else:
+            self._remove_product(key)
+            if value is not None and value.is_listed:
+                self._add_product(key, value.name, value.category_id)
+
+    def update(self, product):
+        self.record(("product", product.product_id, product))
+
+    def remove(self, product_id):
+        self.record(("product", product_id, None))
+
+    def update_category(self, category_id, category_name):
+        self.record(("category", category_id, category_name))
+
+    def remove_category(self, category_id):
+        self.record(("category", category_id, None))
+
+    def _insert(self, suggestion, label, text, count=0):
+        self._suggestions[suggestion] = [label, count, text]
+        self._place(suggestion, text, count.bit_length())
+
+    def _place(self, suggestion, text, tier):
+        keys = self._tiers[tier]
+        for key in _keys(text):
+            insort(keys, (key, suggestion))
+        self._forget(text)
+
+    def _unplace(self, suggestion, text, tier):
+        keys = self._tiers[tier]
+        for key in _keys(text):
+            del keys[bisect_left(keys, (key, suggestion))]
+        if not keys:
+            del self._tiers[tier]
+        self._forget(text)
+
+    def _drop(self, suggestion):
+        entry = self._suggestions.pop(suggestion, None)
+        if entry is not None:
+            self._unplace(suggestion, entry[2], entry[1].bit_length())
+
+    def _bump(self, suggestion, delta):
+        entry = self._suggestions.get(suggestion)
+        if entry is None:
+            return
+        old_tier = entry[1].bit_length()
+        entry[1] = max(entry[1] + delta, 0)
+        if entry[1] == 0 and suggestion[0] == "product":
+            del self._suggestions[suggestion]
+            self._unplace(suggestion, entry[2], old_tier)
+        elif entry[1].bit_length() != old_tier:
+            self._unplace(suggestion, entry[2], old_tier)
+            self._place(suggestion, entry[2], entry[1].bit_length())
+        else:
+            self._forget(entry[2])
+
+    def _forget(self, text):
+        """Drop memoized results of every short prefix the suggestion appears under."""
+        for key in _keys(text):
+            for length in range(1, CACHED_PREFIX_LENGTH + 1):
+                self._top.pop(key[:length], None)
+
+    def _set_category(self, category_id, category_name):
+        suggestion = ("category", category_id)
+        count = self._suggestions[suggestion][1] if suggestion in self._suggestions else 0
+        self._drop(suggestion)
+        text = normalize(category_name)
+        if text:
+            self._insert(suggestion, category_name.strip(), text, count)
+
+    def _add_product(self, product_id, name, category_id):
+        text = normalize(name)
+        if not text:
+            return
+        suggestion = ("product", text)
+        if suggestion not in self._suggestions:
+            self._insert(suggestion, name.strip(), text)
+        self._bump(suggestion, 1)
+        self._bump(("category", category_id), 1)
+        self._products[product_id] = (text, category_id)
+
+    def _remove_product(self, product_id):
+        entry = self._products.pop(product_id, None)
+        if entry is None:
+            return
+        text, category_id = entry
+        self._bump(("product", text), -1)
+        self._bump(("category", category_id), -1)
+
+    def _scan(self, prefix):
+        rank = lambda s: (self._suggestions[s][1], s[0] == "category")
+        found = []
+        for tier in sorted(self._tiers, reverse=True):
+            needed = MAX_SUGGESTIONS - len(found)
+            keys = self._tiers[tier]
+            seen = set()
+            for i in range(bisect_left(keys, (prefix,)), len(keys)):
+                key, suggestion = keys[i]
+                if not key.startswith(prefix):
+                    break
+                seen.add(suggestion)
+                # Tiers 0 and 1 hold a single count, so any `needed` of them are as good as the rest
+                if tier <= 1 and len(seen) >= needed:
+                    break
+            found.extend(heapq.nlargest(needed, seen, key=rank))
+            if len(found) >= MAX_SUGGESTIONS:
+                break
+        return found
+
+    def suggest(self, prefix, limit=10):
+        """Up to `limit` suggestions starting with prefix (at a word boundary), most popular first."""
+        self.ensure_built()
+        prefix = normalize(prefix)
+        if not prefix:
+            return []
+        with self._lock:
+            if len(prefix) <= CACHED_PREFIX_LENGTH:
+                top = self._top.get(prefix)
+                if top is None:
+                    top = self._top[prefix] = self._scan(prefix)
+            else:
+                top = self._scan(prefix)
+            results = []
+            for kind, value in top[:limit]:
+                label, count, _ = self._suggestions[(kind, value)]
+                results.append({
+                    "type": kind,
+                    "label": label,
+                    "count": count,
+                    "category_id": value if kind == "category" else None,
+                })
+            return results
+
+
+autocomplete_index = AutocompleteIndex()
+
+
+@receiver(products_changed)
+def refresh_suggestions(sender, products, deleted=False, **kwargs):
+    for product in products:
+        if deleted:
+            autocomplete_index.remove(product.product_id)
+        else:
+            autocomplete_index.update(product)
+
+
+@receiver(post_save, sender=Category)
+def category_saved(sender, instance, **kwargs):
+    autocomplete_index.update_category(instance.category_id, instance.category_name)
+
+
+@receiver(post_delete, sender=Category)
+def category_deleted(sender, instance, **kwargs):
+    autocomplete_index.remove_category(instance.category_id)
@@ -0,0 +1,101 @@
+"""
+Read-through cache for product listing pages.
+
+Pages are cached per worker under the normalized filter tuple. A product change
+drops exactly the pages it can affect: pages that contained the product, and
+pages whose filters the product now matches (it may have to appear in them).
+The TTL bounds how stale a page can get when another worker made the change.
+"""
+from django.conf import settings
+from django.dispatch import receiver
+from loguru import logger
+
+from backend.cache import TTLCache
+from .signals import products_changed
+
+_config = getattr(settings, "PRODUCT_LISTING_CACHE", {})
+product_listing_cache = TTLCache(
+    max_entries=_config.get("MAX_ENTRIES", 512),
+    ttl=_config.get("TTL_SECONDS", 30),
+    name="product_listing",
+)
+
+FILTER_FIELDS = ("category", "name", "condition", "location", "min_price", "max_price", "q")
+
+
+def _normalize_text(value):
+    value = (value or "").strip().lower()
+    return value or None
+
+
+def normalize_filters(category=None, name=None, condition=None, location=None,
+                      min_price=None, max_price=None, q=None):
+    """Canonical form of the browse filters; text filters are case-insensitive anyway."""
+    return (
+        category or None,
+        _normalize_text(name),
+        _normalize_text(condition),
+        _normalize_text(location),
+        float(min_price) if min_price is not None else None,
+        float(max_price) if max_price is not None else None,
+        _normalize_text(q),
+    )
+
+
+def cached_listing_page(filters, cursor, limit, loader, fresh=False):
+    """
+    Return (page, etag) for the normalized filters, loading and caching the page on a miss.
+    loader() returns (page, etag); the cached value also remembers which products
+    the page holds for precise invalidation. fresh=True skips the cache and reads
+    the database, for conditional requests that must not be answered from a page
+    another worker may have made stale.
+    """
+    if fresh:
+        page, etag = loader()
+        return page, etag
+    entry = product_listing_cache.get_or_load((filters, cursor, limit), lambda: _make_entry(*loader()))
+    return entry["page"], entry["etag"]
+
+
+def _make_entry(page, etag):
+    return {
+        "page": page,
+        "etag": etag,
+        "product_ids": {product["product_id"] for product in page["results"]},
+    }
+
+
+def _matches(filters, product):
+    category, name, condition, location, min_price, max_price, _ = filters
+    if not product.is_listed:
+        return False
+    if category and product.category_id != category:
+        return False
+    if name and name not in (product.name or "").lower():
+        return False
+    if condition and condition not in (product.condition or "").lower():
+        return False
+    if location and location not in (product.location or "").lower():
+        return False
+    if min_price is not None and product.price < min_price:
+        return False
+    if max_price is not None and product.price > max_price:
+        return False
+    return True
+
+
+def invalidate_products(products):
+    product_ids = {product.product_id for product in products}
+
+    def affected(key, entry):
+        filters = key[0]
+        return bool(entry["product_ids"] & product_ids) or any(_matches(filters, p) for p in products)
+
+    dropped = product_listing_cache.delete_matching(affected)
+    if dropped:
+        logger.debug(f"Invalidated {dropped} cached listing pages for products {sorted(product_ids)}")
+
+
+@receiver(products_changed)
+def invalidate_listing_pages(sender, products, deleted=False, **kwargs):
+    invalidate_products(products)
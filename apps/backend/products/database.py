@@ -1,20 +1,38 @@
 from .schemas import ProductIn
-from .models import Product, Category  
+from .models import Product, Category, ProductStatus, ProductReport
+from .search import search_index
+from .facets import facet_counter, PRICE_BUCKET_LABELS
+from .cache import normalize_filters, cached_listing_page, product_listing_cache
+from .geo import geo_index, resolve_location
+from .autocomplete import autocomplete_index
+from .signals import products_changed
+from backend.leases import claim_batch, release_claims, claimable_by, held_by_other, LEASE_CLEARED
+from users.models import UserProfile
+from django.conf import settings
 from django.http import Http404
-from enum import Enum
+from ninja.errors import HttpError
+from django.db import transaction
+from django.utils import timezone
+from django.db.models import Q, Min, F
+from datetime import datetime
 from loguru import logger 
+import base64
+import hashlib
+import json
 
-class ProductStatus(str, Enum):
-    AVAILABLE = "Available"
-    SOLD = "Sold"
-    DELETED = "Deleted"
-    PENDING = "Pending"
+DEFAULT_PAGE_SIZE = 50
+MAX_PAGE_SIZE = 100
+SEARCH_FILTER_BATCH = 1000
+MAX_SEARCH_FILTER_BATCH = 8000
+MAX_BULK_MODERATION = 500
+REPORT_HIDE_THRESHOLD = getattr(settings, "PRODUCT_REPORT_HIDE_THRESHOLD", 5)
 
 def create_product_entry(data: ProductIn):
     logger.info(f"Creating product entry with data: {data}")
     try:
         product_data = data.dict()
         product_data["status"] = ProductStatus.AVAILABLE
+        product_data["latitude"], product_data["longitude"] = resolve_location(data.location)
         product = Product.objects.create(**product_data)
         logger.info(f"Product entry created: {product}")
         return serialize_product(product) 
@@ -22,7 +40,27 @@ def create_product_entry(data: ProductIn):
         logger.error(f"Error creating product: {e}")
         raise Exception(f"Error creating product: {str(e)}")
 
-def get_filtered_products(
+def encode_cursor(payload: dict) -> str:
+    """
+    Encode a pagination position as an opaque, URL-safe cursor string.
+    """
+    raw = json.dumps(payload, separators=(",", ":")).encode()
+    return base64.urlsafe_b64encode(raw).decode().rstrip("=")
+
+def decode_cursor(cursor: str) -> dict:
+    """
+    Decode a cursor produced by encode_cursor. Raises ValueError if it is malformed.
+    """
+    try:
+        padded = cursor + "=" * (-len(cursor) % 4)
+        payload = json.loads(base64.urlsafe_b64decode(padded.encode()))
+    except (ValueError, TypeError) as e:
+        raise ValueError(f"Invalid cursor: {cursor}") from e
+    if not isinstance(payload, dict):
+        raise ValueError(f"Invalid cursor: {cursor}")
+    return payload
+
+def build_filtered_queryset(
     category=None,
     name=None,
     condition=None,
@@ -30,17 +68,16 @@ def get_filtered_products(
     min_price=None,
     max_price=None
 ):
+    """
+    Queryset of approved, available products matching the browse filters,
+    newest first. (product_id breaks ties so the order is total.)
+    """
     logger.info(f"Filtering products with: category={category}, name={name}, condition={condition}, location={location}, min_price={min_price}, max_price={max_price}")
-    queryset = Product.objects.filter(approve_status="approved", status=ProductStatus.AVAILABLE).order_by('-created_at')  # example order
+    queryset = Product.objects.filter(approve_status="approved", status=ProductStatus.AVAILABLE).order_by('-created_at', '-product_id')
 
     if category:
-        try:
-            category_obj = Category.objects.get(category_id=category)
-            queryset = queryset.filter(category=category_obj.category_id)
-            logger.info(f"Filtered by category: {category_obj}")
-        except Category.DoesNotExist:
-            logger.warning(f"Category not found: {category}")
-            return []
+        queryset = queryset.filter(category_id=category)
+        logger.info(f"Filtered by category: {category}")
     if name:
         queryset = queryset.filter(name__icontains=name)
         logger.info(f"Filtered by name: {name}")
@@ -56,16 +93,300 @@ def get_filtered_products(
     if max_price is not None:
         queryset = queryset.filter(price__lte=max_price)
         logger.info(f"Filtered by max_price: {max_price}")
+    return queryset
+
+def keyset_after(queryset, created_at, product_id):
+    """
+    Rows of a (-created_at, -product_id) ordered queryset that come after the given position.
+    A range predicate instead of OFFSET, so deep positions cost the same as the first.
+    """
+    return queryset.filter(
+        Q(created_at__lt=created_at) | Q(created_at=created_at, product_id__lt=product_id)
+    )
+
+def apply_keyset_cursor(queryset, cursor):
+    """
+    Restrict a (-created_at, -product_id) ordered queryset to the rows after the cursor.
+    """
+    position = decode_cursor(cursor)
+    try:
+        created_at = datetime.fromisoformat(position["created_at"])
+        product_id = int(position["product_id"])
+    except (KeyError, TypeError, ValueError) as e:
+        raise ValueError(f"Invalid cursor: {cursor}") from e
+    return keyset_after(queryset, created_at, product_id)
 
-    result = []
-    for product in queryset:
-        result.append(serialize_product(product))
-    return result
+def iter_filtered_products(chunk_size=1000, **filters):
+    """
+    Yield every product matching the browse filters, serialized, one bounded
+    keyset chunk at a time so memory stays flat however large the catalog is.
+    """
+    queryset = build_filtered_queryset(**filters)
+    chunk = serialize_products(queryset[:chunk_size])
+    while chunk:
+        yield from chunk
+        if len(chunk) < chunk_size:
+            return
+        last = chunk[-1]
+        chunk = serialize_products(keyset_after(queryset, last["created_at"], last["product_id"])[:chunk_size])
+
+def get_filtered_products(**filters):
+    """One listing page (see get_listing_page) without its ETag."""
+    page, _ = get_listing_page(**filters)
+    return page
+
+def get_listing_page(
+    category=None,
+    name=None,
+    condition=None,
+    location=None,
+    min_price=None,
+    max_price=None,
+    cursor=None,
+    limit=DEFAULT_PAGE_SIZE,
+    q=None,
+    fresh=False
+):
+    """(page, ETag) of a listing page; fresh=True bypasses the page cache."""
+    filters = normalize_filters(
+        category=category,
+        name=name,
+        condition=condition,
+        location=location,
+        min_price=min_price,
+        max_price=max_price,
+        q=q
+    )
+
+    def load():
+        page = load_filtered_products(*filters, cursor=cursor, limit=limit)
+        return page, get_listing_etag(page)
+
+    return cached_listing_page(filters, cursor, limit, load, fresh=fresh)
+
+def load_filtered_products(
+    category=None,
+    name=None,
+    condition=None,
+    location=None,
+    min_price=None,
+    max_price=None,
+    q=None,
+    cursor=None,
+    limit=DEFAULT_PAGE_SIZE
+):
+    if q:
+        return search_filtered_products(
+            q,
+            category=category,
+            name=name,
+            condition=condition,
+            location=location,
+            min_price=min_price,
+            max_price=max_price,
+            cursor=cursor,
+            limit=limit
+        )
+
+    queryset = build_filtered_queryset(
+        category=category,
+        name=name,
+        condition=condition,
+        location=location,
+        min_price=min_price,
+        max_price=max_price
+    )
+    if cursor:
+        queryset = apply_keyset_cursor(queryset, cursor)
+
+    # Fetch one extra row to learn whether another page exists
+    products = serialize_products(queryset[:limit + 1])
+    has_more = len(products) > limit
+    products = products[:limit]
+
+    next_cursor = None
+    if has_more:
+        last = products[-1]
+        next_cursor = encode_cursor({
+            "created_at": last["created_at"].isoformat(),
+            "product_id": last["product_id"],
+        })
+
+    return {
+        "results": products,
+        "next": next_cursor,
+    }
+
+def page_ranked_ids(ranked_ids, position, limit, **filters):
+    """
+    One page of the ranked ids that pass the browse filters, starting at
+    `position` in the ranking. Ids are checked in growing batches until the
+    page is full, so selective filters still fill their pages and every
+    match can be paged to. Returns (page ids, position of the next page or None).
+    """
+    page_ids = []
+    batch_size = SEARCH_FILTER_BATCH
+    while position < len(ranked_ids):
+        batch = ranked_ids[position:position + batch_size]
+        # The database has the final say, so filters apply and stale index entries drop out
+        allowed = set(
+            build_filtered_queryset(**filters)
+            .filter(product_id__in=batch)
+            .values_list("product_id", flat=True)
+        )
+        for rank, product_id in enumerate(batch, start=position):
+            if product_id not in allowed:
+                continue
+            if len(page_ids) == limit:
+                return page_ids, rank
+            page_ids.append(product_id)
+        position += len(batch)
+        batch_size = min(batch_size * 2, MAX_SEARCH_FILTER_BATCH)
+    return page_ids, None
+
+def search_filtered_products(q, cursor=None, limit=DEFAULT_PAGE_SIZE, **filters):
+    """
+    Full-text search ranked by relevance, narrowed by the regular browse filters.
+    Pages are addressed by position in the ranking since relevance order has
+    no stable keyset.
+    """
+    position = 0
+    if cursor:
+        try:
+            position = int(decode_cursor(cursor)["offset"])
+        except (KeyError, TypeError, ValueError) as e:
+            raise ValueError(f"Invalid cursor: {cursor}") from e
+
+    ranked_ids = [product_id for product_id, _ in search_index.search(q)]
+    logger.info(f"Search '{q}' matched {len(ranked_ids)} products")
+    page_ids, next_position = page_ranked_ids(ranked_ids, position, limit, **filters)
+
+    products = {
+        product["product_id"]: product
+        for product in serialize_products(Product.objects.filter(product_id__in=page_ids))
+    }
+    return {
+        "results": [products[product_id] for product_id in page_ids if product_id in products],
+        "next": encode_cursor({"offset": next_position}) if next_position is not None else None,
+    }
+
+def get_nearby_products(
+    latitude: float,
+    longitude: float,
+    radius_km: float,
+    cursor=None,
+    limit=DEFAULT_PAGE_SIZE,
+    q=None,
+    **filters
+):
+    """
+    Listed products within radius_km of a point, nearest first, narrowed by the
+    browse filters (and q, if given). Paged by position in the distance ranking.
+    """
+    position = 0
+    if cursor:
+        try:
+            position = int(decode_cursor(cursor)["offset"])
+        except (KeyError, TypeError, ValueError) as e:
+            raise ValueError(f"Invalid cursor: {cursor}") from e
+
+    nearby = geo_index.nearby(latitude, longitude, radius_km)
+    logger.info(f"Found {len(nearby)} products within {radius_km} km of ({latitude}, {longitude})")
+    if q:
+        matched = {product_id for product_id, _ in search_index.search(q)}
+        nearby = [(product_id, distance) for product_id, distance in nearby if product_id in matched]
+
+    distances = dict(nearby)
+    page_ids, next_position = page_ranked_ids([product_id for product_id, _ in nearby], position, limit, **filters)
+
+    products = {
+        product["product_id"]: product
+        for product in serialize_products(Product.objects.filter(product_id__in=page_ids))
+    }
+    results = []
+    for product_id in page_ids:
+        if product_id in products:
+            product = products[product_id]
+            product["distance_km"] = round(distances[product_id], 3)
+            results.append(product)
+    return {
+        "results": results,
+        "next": encode_cursor({"offset": next_position}) if next_position is not None else None,
+    }
+
+def get_autocomplete_suggestions(q: str, limit: int = 10):
+    """
+    Typeahead suggestions (product names and categories) for a search box prefix,
+    served from the in-memory autocomplete index.
+    """
+    return autocomplete_index.suggest(q, limit)
+
+def get_product_facets(q=None, **filters):
+    """
+    Counts of listed products per category, condition, location and price bucket
+    for the given browse filters, served from the in-memory facet counter.
+    """
+    logger.info(f"Computing product facets with: q={q}, filters={filters}")
+    product_ids = None
+    if q:
+        # Every match, not just a top slice, so total and buckets describe the whole result set
+        product_ids = [product_id for product_id, _ in search_index.search(q)]
+    total, counts = facet_counter.counts(product_ids=product_ids, **filters)
+
+    category_names = dict(
+        Category.objects.filter(category_id__in=[c for c in counts["category"] if c is not None])
+        .values_list("category_id", "category_name")
+    )
+    by_count = lambda counter: sorted(counter.items(), key=lambda item: (-item[1], str(item[0])))
+    return {
+        "total": total,
+        "category": [
+            {
+                "value": str(category_id) if category_id is not None else None,
+                "label": category_names.get(category_id, "Unknown"),
+                "count": count,
+            }
+            for category_id, count in by_count(counts["category"])
+        ],
+        "condition": [{"value": value, "label": value, "count": count} for value, count in by_count(counts["condition"])],
+        "location": [{"value": value, "label": value, "count": count} for value, count in by_count(counts["location"])],
+        "price": [
+            {"value": label, "label": label, "count": counts["price"][label]}
+            for label in PRICE_BUCKET_LABELS if counts["price"][label]
+        ],
+    }
+
+def make_etag(*parts):
+    """Strong ETag (quoted) derived from the given parts."""
+    digest = hashlib.sha1("|".join(str(part) for part in parts).encode()).hexdigest()
+    return f'"{digest}"'
+
+def get_product_etag(product_id: int, updated_at=None):
+    """
+    ETag of one product, from its updated_at. Pass updated_at when it is already
+    known; otherwise it is read with a single-column query. Raises Http404.
+    """
+    if updated_at is None:
+        updated_at = Product.objects.filter(product_id=product_id).values_list("updated_at", flat=True).first()
+        if updated_at is None:
+            raise Http404(f"Product with ID {product_id} not found")
+    return make_etag("product", product_id, updated_at.isoformat())
+
+def get_listing_etag(page: dict):
+    """
+    ETag of a listing page, from exactly what it serves (products, their
+    updated_at, next cursor). It moves whenever the page can, is the same in
+    every worker and costs one hash of the page, no query.
+    """
+    return make_etag("products", json.dumps(page, sort_keys=True, default=str))
+
+def get_listing_cache_stats():
+    return product_listing_cache.stats()
 
 def get_product_by_id(product_id):
     logger.info(f"Getting product by id: {product_id}")
     try:
-        product = Product.objects.get(product_id=product_id)
+        product = Product.objects.select_related('category').get(product_id=product_id)
         logger.info(f"Product found: {product}")
         return serialize_product(product) 
     except Product.DoesNotExist:
@@ -81,6 +402,7 @@ def update_product_entry(product_id: int, data: ProductIn):
         product = Product.objects.get(product_id=product_id)
         for attr, value in data.dict().items():
             setattr(product, attr, value)
+        product.latitude, product.longitude = resolve_location(product.location)
         product.save()
         logger.info(f"Product updated: {product}")
         return serialize_product(product) 
@@ -112,56 +434,165 @@ def serialize_product(product):
         "price": product.price,
         "condition": product.condition,
         "image_urls": product.image_urls,
-        "seller_id": product.seller.user_id,
+        "seller_id": product.seller_id,
         "category_id": product.category.category_id if product.category else None,
         "is_wanted": product.is_wanted,
         "location": product.location,
         "created_at": product.created_at,
         "updated_at": product.updated_at,
         "category_name": product.category.category_name if product.category else "Unknown",
-        "rejection_reason": product.rejection_reason
+        "rejection_reason": product.rejection_reason,
+        "latitude": product.latitude,
+        "longitude": product.longitude,
     }
 
-def approve_product_listing(product_id: int):
+# Columns ProductOut needs; category_name comes from a single LEFT JOIN
+PRODUCT_OUT_COLUMNS = (
+    "product_id",
+    "name",
+    "description",
+    "price",
+    "condition",
+    "image_urls",
+    "seller_id",
+    "category_id",
+    "is_wanted",
+    "location",
+    "created_at",
+    "updated_at",
+    "rejection_reason",
+    "latitude",
+    "longitude",
+    "category__category_name",
+)
+
+def serialize_product_row(row: dict):
+    """
+    Serialize a .values(*PRODUCT_OUT_COLUMNS) row into the same shape as serialize_product.
+    """
+    row = dict(row)
+    category_name = row.pop("category__category_name")
+    row["category_name"] = category_name if category_name is not None else "Unknown"
+    return row
+
+def serialize_products(queryset):
+    """
+    Serialize a product queryset with one joined query, no matter how many rows it holds.
+    """
+    return [serialize_product_row(row) for row in queryset.values(*PRODUCT_OUT_COLUMNS)]
+
+def approve_product_listing(product_id: int, moderator_id: int = None):
+    """
+    Approve a listing and drop its review lease in one conditional UPDATE.
+    Returns 409 if another moderator holds a live lease on it.
+    """
     logger.info(f"Approving product listing with ID {product_id}.")
     try:
-        product = Product.objects.get(product_id=product_id)
-        if product.approve_status == "approved":
-            logger.warning(f"Product {product_id} is already approved.")
-            raise ValueError("Product is already approved.")
-        product.approve_status = "approved"
-        product.save()
+        approved = Product.objects.filter(claimable_by(moderator_id), product_id=product_id).exclude(
+            approve_status="approved"
+        ).update(approve_status="approved", updated_at=timezone.now(), **LEASE_CLEARED)
+        if not approved:
+            product = Product.objects.get(product_id=product_id)
+            if product.approve_status == "approved":
+                logger.warning(f"Product {product_id} is already approved.")
+                raise ValueError("Product is already approved.")
+            logger.warning(f"Product {product_id} is claimed by moderator {product.claimed_by}.")
+            raise HttpError(409, "Product listing is claimed by another moderator.")
+        # update() bypasses post_save, so tell the indexes and caches directly
+        products_changed.send(sender=Product, products=list(Product.objects.filter(product_id=product_id)), deleted=False)
         logger.success(f"Product listing {product_id} approved.")
         return True
     except Product.DoesNotExist:
         logger.warning(f"Product with ID {product_id} not found.")
         raise Http404(f"Product with ID {product_id} not found.")
+    except HttpError:
+        raise
     except Exception as e:
         logger.error(f"Error approving product {product_id}: {e}")
         raise Exception(f"Error approving product: {str(e)}")
 
-def reject_product_listing(product_id: int, reason: str):
+def reject_product_listing(product_id: int, reason: str, moderator_id: int = None):
+    """
+    Reject a listing and drop its review lease in one conditional UPDATE.
+    Returns 409 if another moderator holds a live lease on it.
+    """
     logger.info(f"Rejecting product listing with ID {product_id}. Reason: {reason}")
     try:
-        product = Product.objects.get(product_id=product_id)
-        if product.approve_status == "approved":
-            logger.warning(f"Product {product_id} is already approved.")
-            raise ValueError("Product is already approved.")
-        if product.approve_status == "rejected":
-            logger.warning(f"Product {product_id} is already rejected.")
-            raise ValueError("Product is already rejected.")
-        product.approve_status = "rejected"
-        product.rejection_reason = reason
-        product.save()
+        rejected = Product.objects.filter(claimable_by(moderator_id), product_id=product_id).exclude(
+            approve_status__in=("approved", "rejected")
+        ).update(approve_status="rejected", rejection_reason=reason, updated_at=timezone.now(), **LEASE_CLEARED)
+        if not rejected:
+            product = Product.objects.get(product_id=product_id)
+            if product.approve_status in ("approved", "rejected"):
+                logger.warning(f"Product {product_id} is already {product.approve_status}.")
+                raise ValueError(f"Product is already {product.approve_status}.")
+            logger.warning(f"Product {product_id} is claimed by moderator {product.claimed_by}.")
+            raise HttpError(409, "Product listing is claimed by another moderator.")
+        products_changed.send(sender=Product, products=list(Product.objects.filter(product_id=product_id)), deleted=False)
         logger.success(f"Product listing {product_id} rejected.")
         return True
     except Product.DoesNotExist:
         logger.warning(f"Product with ID {product_id} not found.")
         raise Http404(f"Product with ID {product_id} not found.")
+    except HttpError:
+        raise
     except Exception as e:
         logger.error(f"Error rejecting product {product_id}: {e}")
         raise Exception(f"Error rejecting product: {str(e)}")
 
+def bulk_set_product_approval(product_ids, approve_status: str, reason: str = None, moderator_id: int = None):
+    """
+    Approve or reject many product listings with one conditional UPDATE.
+    Returns {"updated": n, "results": [{"id", "result"}, ...]} in request order, where
+    result is the new status, "not_found", "already_approved", "already_rejected"
+    or "claimed" (another moderator holds a live lease on it).
+    """
+    if approve_status not in ("approved", "rejected"):
+        raise ValueError(f"Invalid approve status: {approve_status}")
+    # Same rules as the single-item endpoints: approved listings are final,
+    # rejected ones can still be approved but not rejected again.
+    blocked = ("approved",) if approve_status == "approved" else ("approved", "rejected")
+    product_ids = list(dict.fromkeys(product_ids))
+    logger.info(f"Bulk setting {len(product_ids)} product listings to {approve_status}.")
+    try:
+        now = timezone.now()
+        with transaction.atomic():
+            rows = list(
+                Product.objects.select_for_update()
+                .filter(product_id__in=product_ids)
+                .values_list("product_id", "approve_status", "claimed_by", "claim_expires_at")
+            )
+            current = {pid: status for pid, status, _, _ in rows}
+            claimed = {pid for pid, _, claimed_by, expires_at in rows if held_by_other(claimed_by, expires_at, moderator_id, now)}
+            eligible = [pid for pid in product_ids if pid in current and current[pid] not in blocked and pid not in claimed]
+            fields = {"approve_status": approve_status, "updated_at": now, **LEASE_CLEARED}
+            if reason is not None:
+                fields["rejection_reason"] = reason
+            updated = Product.objects.filter(claimable_by(moderator_id, now), product_id__in=eligible).exclude(
+                approve_status__in=blocked
+            ).update(**fields)
+
+        results = []
+        for pid in product_ids:
+            if pid not in current:
+                result = "not_found"
+            elif current[pid] in blocked:
+                result = f"already_{current[pid]}"
+            elif pid in claimed:
+                result = "claimed"
+            else:
+                result = approve_status
+            results.append({"id": pid, "result": result})
+
+        if eligible:
+            # update() bypasses post_save, so tell the indexes and caches directly
+            products_changed.send(sender=Product, products=list(Product.objects.filter(product_id__in=eligible)), deleted=False)
+        logger.success(f"Bulk {approve_status} {updated} of {len(product_ids)} product listings.")
+        return {"updated": updated, "results": results}
+    except Exception as e:
+        logger.error(f"Error bulk updating product listings: {e}")
+        raise Exception(f"Error bulk updating product listings: {str(e)}")
+
 def get_pending_product_listings():
     """
     Fetch all products with approve_status='pending'.
@@ -169,21 +600,178 @@ def get_pending_product_listings():
     logger.info("Fetching all pending product listings.")
     try:
         queryset = Product.objects.filter(approve_status="pending")
-        products = [serialize_product(product) for product in queryset]
+        products = serialize_products(queryset)
         logger.success(f"Fetched {len(products)} pending product listings.")
         return products
     except Exception as e:
         logger.error(f"Error fetching pending product listings: {e}")
         raise Exception(f"Error fetching pending product listings: {str(e)}")
 
+def claim_pending_product_listings(moderator_id: int, limit: int):
+    """
+    Lease the next `limit` pending listings, oldest first, to a moderator.
+    Concurrent moderators get disjoint batches; expired leases are handed out again.
+    """
+    logger.info(f"Moderator {moderator_id} claiming up to {limit} pending product listings.")
+    try:
+        queryset = Product.objects.filter(approve_status="pending").order_by("created_at", "product_id")
+        product_ids, expires_at = claim_batch(queryset, moderator_id, limit)
+        products = serialize_products(Product.objects.filter(product_id__in=product_ids).order_by("created_at", "product_id"))
+        logger.success(f"Moderator {moderator_id} claimed {len(products)} product listings.")
+        return {"lease_expires_at": expires_at, "items": products}
+    except Exception as e:
+        logger.error(f"Error claiming pending product listings: {e}")
+        raise Exception(f"Error claiming pending product listings: {str(e)}")
+
+def release_product_listings(moderator_id: int, product_ids=None):
+    logger.info(f"Moderator {moderator_id} releasing product listing claims: {product_ids or 'all'}")
+    return release_claims(Product, moderator_id, product_ids)
+
 def get_user_listings(user_id: int):
     # Fetch all product listings for this user (optionally filter by status)
     logger.info("Fetching all my product listings.")
     try:
         queryset = Product.objects.filter(seller_id=user_id).order_by('-created_at')  # example order
-        products = [serialize_product(product) for product in queryset]
+        products = serialize_products(queryset)
         logger.success(f"Fetched {len(products)} my product listings.")
         return products
     except Exception as e:
         logger.error(f"Error fetching my product listings: {e}")
         raise Exception(f"Error fetching my product listings: {str(e)}")
+
+def report_product_entry(product_id: int, user_id: int):
+    """
+    Record a user's report on a product. Each (product, reporter) has one report
+    row: reporting again while it is pending changes nothing, reporting again
+    after a moderator closed it reopens it. Keeps Product.report_count in step
+    and hides the listing once its pending reports reach REPORT_HIDE_THRESHOLD.
+    Returns (report_id, created), created being True for a new or reopened report.
+    """
+    logger.info(f"User {user_id} reporting product {product_id}.")
+    if not UserProfile.objects.filter(user_id=user_id).exists():
+        raise Http404(f"User with ID {user_id} not found")
+    hidden = False
+    with transaction.atomic():
+        # Lock the product row so the counter and the hide decision see every report
+        if not Product.objects.select_for_update().filter(product_id=product_id).exists():
+            raise Http404(f"Product with ID {product_id} not found.")
+        report, created = ProductReport.objects.get_or_create(
+            product_id=product_id, reported_by_id=user_id, defaults={"status": "pending"}
+        )
+        if not created and report.status != "pending":
+            ProductReport.objects.filter(report_id=report.report_id).update(status="pending", created_at=timezone.now())
+            created = True
+        if created:
+            Product.objects.filter(product_id=product_id).update(report_count=F("report_count") + 1)
+            if REPORT_HIDE_THRESHOLD:
+                hidden = Product.objects.filter(
+                    product_id=product_id, report_count__gte=REPORT_HIDE_THRESHOLD, status=ProductStatus.AVAILABLE
+                ).update(status=ProductStatus.HIDDEN, updated_at=timezone.now()) > 0
+    if hidden:
+        logger.warning(f"Product {product_id} hidden after {REPORT_HIDE_THRESHOLD} reports.")
+        products_changed.send(sender=Product, products=list(Product.objects.filter(product_id=product_id)), deleted=False)
+    return report.report_id, created
+
+def _report_queue_rows(products):
+    """
+    One queue row per reported product. report_id is the product's oldest pending
+    report; deciding on it closes all of the product's pending reports.
+    """
+    product_ids = [product["product_id"] for product in products]
+    first_ids = (
+        ProductReport.objects.filter(product_id__in=product_ids, status="pending")
+        .values("product_id").annotate(first_id=Min("report_id")).values("first_id")
+    )
+    first_reports = {
+        product_id: (report_id, reported_by_id)
+        for report_id, product_id, reported_by_id in ProductReport.objects.filter(report_id__in=first_ids)
+        .values_list("report_id", "product_id", "reported_by_id")
+    }
+    rows = []
+    for product in products:
+        if product["product_id"] not in first_reports:
+            continue
+        report_id, reported_by_id = first_reports[product["product_id"]]
+        rows.append({
+            "report_id": report_id,
+            "status": "pending",
+            "product": product,
+            "reported_by_id": reported_by_id,
+            "rejection_reason": None,
+            "report_count": product["report_count"],
+        })
+    return rows
+
+def _reported_products():
+    return Product.objects.filter(report_count__gt=0).order_by("-report_count", "product_id")
+
+def get_report_queue(limit: int = DEFAULT_PAGE_SIZE, offset: int = 0):
+    """
+    Page through reported products, most reported first.
+    """
+    logger.info(f"Fetching report queue: limit={limit}, offset={offset}")
+    try:
+        page = list(_reported_products()[offset:offset + limit].values_list("product_id", "report_count"))
+        counts = dict(page)
+        products = serialize_products(Product.objects.filter(product_id__in=counts))
+        by_id = {product["product_id"]: {**product, "report_count": counts[product["product_id"]]} for product in products}
+        return _report_queue_rows([by_id[product_id] for product_id, _ in page if product_id in by_id])
+    except Exception as e:
+        logger.error(f"Error fetching report queue: {e}")
+        raise Exception(f"Error fetching report queue: {str(e)}")
+
+def claim_report_queue(moderator_id: int, limit: int):
+    """
+    Lease the most reported products to a moderator. The lease lives on the product,
+    since after deduplication a product is the unit of review.
+    """
+    logger.info(f"Moderator {moderator_id} claiming up to {limit} reported products.")
+    try:
+        product_ids, expires_at = claim_batch(_reported_products(), moderator_id, limit)
+        queryset = Product.objects.filter(product_id__in=product_ids).order_by("-report_count", "product_id")
+        counts = dict(queryset.values_list("product_id", "report_count"))
+        products = [{**product, "report_count": counts[product["product_id"]]} for product in serialize_products(queryset)]
+        return {"lease_expires_at": expires_at, "items": _report_queue_rows(products)}
+    except Exception as e:
+        logger.error(f"Error claiming reported products: {e}")
+        raise Exception(f"Error claiming reported products: {str(e)}")
+
+def release_report_queue(moderator_id: int, product_ids=None):
+    logger.info(f"Moderator {moderator_id} releasing reported product claims: {product_ids or 'all'}")
+    return release_claims(Product, moderator_id, product_ids)
+
+def close_product_reports(report_id: int, decision: str, moderator_id: int = None):
+    """
+    Close every pending report of the reported product with "deleted" or "kept".
+    Deleting takes the listing down; keeping restores it if reports had hidden it.
+    The report has to be pending: deciding on an already closed one (a stale or
+    repeated request) is a 409 and changes nothing. The product's review lease
+    is checked and cleared by the same UPDATE; a live lease held by another
+    moderator is a 409 too.
+    """
+    if decision not in ("deleted", "kept"):
+        raise ValueError(f"Invalid report decision: {decision}")
+    logger.info(f"Closing reports of report {report_id} as {decision}.")
+    with transaction.atomic():
+        product_id = ProductReport.objects.filter(report_id=report_id).values_list("product_id", flat=True).first()
+        if product_id is None:
+            raise Http404("Report not found")
+        # Lock the product before the report, in the same order as report_product_entry,
+        # so no report is filed or reopened between the check and the UPDATEs
+        Product.objects.select_for_update().filter(product_id=product_id).exists()
+        status = ProductReport.objects.select_for_update().filter(report_id=report_id).values_list("status", flat=True).first()
+        if status != "pending":
+            logger.warning(f"Report {report_id} is already closed as {status}.")
+            raise HttpError(409, f"Report is already closed as {status}.")
+        fields = {"report_count": 0, "updated_at": timezone.now(), **LEASE_CLEARED}
+        if decision == "deleted":
+            fields.update(status=ProductStatus.DELETED, approve_status="rejected")
+        if not Product.objects.filter(claimable_by(moderator_id), product_id=product_id).update(**fields):
+            logger.warning(f"Reported product {product_id} is claimed by another moderator.")
+            raise HttpError(409, "Reported product is claimed by another moderator.")
+        if decision == "kept":
+            Product.objects.filter(product_id=product_id, status=ProductStatus.HIDDEN).update(status=ProductStatus.AVAILABLE)
+        closed = ProductReport.objects.filter(product_id=product_id, status="pending").update(status=decision)
+    products_changed.send(sender=Product, products=list(Product.objects.filter(product_id=product_id)), deleted=False)
+    logger.success(f"Closed {closed} pending reports of product {product_id} as {decision}.")
+    return closed
@@ -0,0 +1,24 @@
+"""
+Streaming NDJSON export of the listed catalog.
+
+Rows come from iter_filtered_products, which walks the filtered set in keyset
+chunks; each chunk is a separate bounded query, so neither the worker nor the
+MySQL client library ever holds more than one chunk, whatever the catalog size.
+"""
+import json
+
+from django.core.serializers.json import DjangoJSONEncoder
+from loguru import logger
+
+from .database import iter_filtered_products
+
+EXPORT_CHUNK_SIZE = 2000
+
+
+def export_products_ndjson(chunk_size=EXPORT_CHUNK_SIZE, **filters):
+    """Yield one JSON line (ProductOut shape) per product matching the filters."""
+    count = 0
+    for product in iter_filtered_products(chunk_size=chunk_size, **filters):
+        count += 1
+        yield json.dumps(product, cls=DjangoJSONEncoder) + "\n"
+    logger.info(f"Exported {count} products")
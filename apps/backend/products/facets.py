@@ -0,0 +1,155 @@
+"""
+Incrementally maintained facet counts for the product browse page.
+
+FacetCounter keeps one compact tuple per listed product plus running totals per
+facet (category, condition, location, price bucket). Unfiltered requests are
+answered straight from the totals; filtered requests make one pass over the
+in-memory tuples (only the requested category's products when a category is
+given) and never touch the database. Like the search index it is built lazily
+per worker, kept current through the products_changed signal and refreshed in
+the background (see backend.refresh) to pick up changes made in other workers.
+"""
+from bisect import bisect_right
+from collections import Counter, defaultdict
+
+from django.conf import settings
+from django.dispatch import receiver
+
+from backend.refresh import RefreshingIndex
+from .models import Product, ProductStatus
+from .signals import products_changed
+
+# Lower bounds of the price buckets; the last bucket is open-ended
+PRICE_BUCKETS = (0, 10, 25, 50, 100, 250, 500, 1000)
+PRICE_BUCKET_LABELS = tuple(
+    f"{lower}-{upper}" if upper is not None else f"{lower}+"
+    for lower, upper in zip(PRICE_BUCKETS, PRICE_BUCKETS[1:] + (None,))
+)
+FACETS = ("category", "condition", "location", "price")
+BUILD_CHUNK_SIZE = 2000
+REFRESH_SECONDS = getattr(settings, "PRODUCT_INDEX_REFRESH_SECONDS", 60)
+REBUILD_SECONDS = getattr(settings, "PRODUCT_INDEX_REBUILD_SECONDS", 3600)
+
+
+def price_bucket(price):
+    index = bisect_right(PRICE_BUCKETS, price) - 1
+    return PRICE_BUCKET_LABELS[max(index, 0)]
+
+
+class FacetCounter(RefreshingIndex):
+    STATE = ("_entries", "_by_category", "_totals")
+    name = "Product facet counter"
+
+    def __init__(self):
+        super().__init__(REFRESH_SECONDS, REBUILD_SECONDS)
+
+    def _reset(self):
+        self._entries = {}                  # product_id -> (category_id, condition, location, price, name)
+        self._by_category = defaultdict(set)
+        self._totals = {facet: Counter() for facet in FACETS}
+
+    def describe(self):
+        return f"{len(self._entries)} products"
+
+    def _load(self):
+        rows = Product.objects.filter(
+            approve_status="approved", status=ProductStatus.AVAILABLE
+        ).values_list("product_id", "category_id", "condition", "location", "price", "name")
+        for product_id, *fields in rows.iterator(chunk_size=BUILD_CHUNK_SIZE):
+            self._add(product_id, *fields)
+
+    def _changed_since(self, since):
+        products = Product.objects.filter(updated_at__gte=since).only(
+            "product_id", "category_id", "condition", "location", "price", "name", "status", "approve_status"
+        )
+        return [(product.product_id, product) for product in products.iterator(chunk_size=BUILD_CHUNK_SIZE)]
+
+    def _apply(self, change):
+        product_id, product = change
+        self._remove(product_id)
+        if product is not None and product.is_listed:
+            self._add(
+                product_id, product.category_id, product.condition,
+                product.location, product.price, product.name,
+            )
+
+    def update(self, product):
+        self.record((product.product_id, product))
+
+    def remove(self, product_id):
+        self.record((product_id, None))
+
+    def _add(self, product_id, category_id, condition, location, price, name):
+        entry = (category_id, condition or "", location or "", float(price), (name or "").lower())
+        self._entries[product_id] = entry
+        self._by_category[category_id].add(product_id)
+        self._count(entry, 1)
+
+    def _remove(self, product_id):
+        entry = self._entries.pop(product_id, None)
+        if entry is None:
+            return
+        self._by_category[entry[0]].discard(product_id)
+        self._count(entry, -1)
+
+    def _count(self, entry, delta):
+        category_id, condition, location, price, _ = entry
+        for facet, value in zip(FACETS, (category_id, condition, location, price_bucket(price))):
+            totals = self._totals[facet]
+            totals[value] += delta
+            if totals[value] <= 0:
+                del totals[value]
+
+    def counts(self, category=None, name=None, condition=None, location=None,
+               min_price=None, max_price=None, product_ids=None):
+        """
+        Facet counts for the listed products matching the browse filters
+        (same semantics as build_filtered_queryset). product_ids, if given,
+        restricts the candidates further, e.g. to full-text search hits.
+        """
+        self.ensure_built()
+        with self._lock:
+            unfiltered = not any((category, name, condition, location, product_ids is not None)) \
+                and min_price is None and max_price is None
+            if unfiltered:
+                return len(self._entries), {facet: Counter(self._totals[facet]) for facet in FACETS}
+
+            candidates = self._by_category.get(category, ()) if category else self._entries.keys()
+            if product_ids is not None:
+                candidates = [pid for pid in product_ids if pid in self._entries and (not category or pid in candidates)]
+            name = name.lower() if name else None
+            condition = condition.lower() if condition else None
+            location = location.lower() if location else None
+
+            total = 0
+            counts = {facet: Counter() for facet in FACETS}
+            for product_id in candidates:
+                entry_category, entry_condition, entry_location, price, entry_name = self._entries[product_id]
+                if name and name not in entry_name:
+                    continue
+                if condition and condition not in entry_condition.lower():
+                    continue
+                if location and location not in entry_location.lower():
+                    continue
+                if min_price is not None and price < min_price:
+                    continue
+                if max_price is not None and price > max_price:
+                    continue
+                total += 1
+                counts["category"][entry_category] += 1
+                counts["condition"][entry_condition] += 1
+                counts["location"][entry_location] += 1
+                counts["price"][price_bucket(price)] += 1
+            return total, counts
+
+
+facet_counter = FacetCounter()
+
+
+@receiver(products_changed)
+def recount_products(sender, products, deleted=False, **kwargs):
+    for product in products:
+        if deleted:
+            facet_counter.remove(product.product_id)
+        else:
+            facet_counter.update(product)
@@ -0,0 +1,167 @@
+"""
+Offline geocoding and a grid index for "near me" product search.
+
+resolve_location() turns the free-text Product.location (usually a postal code,
+sometimes a city) into coordinates using the bundled gazetteer in
+data/gazetteer.csv. Unknown postal codes fall back to their region prefix.
+
+GeoIndex buckets listed products into fixed lat/lng grid cells, so a radius
+query only visits the cells overlapping the circle's bounding box, then
+filters them by exact haversine distance. It is built lazily per worker, kept
+current through the products_changed signal and refreshed in the background
+(see backend.refresh) to pick up changes made in other workers.
+"""
+import csv
+import heapq
+import math
+import re
+from collections import defaultdict
+from functools import lru_cache
+from pathlib import Path
+
+from django.conf import settings
+from django.dispatch import receiver
+from loguru import logger
+
+from backend.refresh import RefreshingIndex
+from .models import Product, ProductStatus
+from .signals import products_changed
+
+GAZETTEER_PATH = Path(__file__).resolve().parent / "data" / "gazetteer.csv"
+POSTAL_CODE_RE = re.compile(r"\b\d{5}\b")
+EARTH_RADIUS_KM = 6371.0
+CELL_SIZE_DEGREES = 0.1
+BUILD_CHUNK_SIZE = 2000
+REFRESH_SECONDS = getattr(settings, "PRODUCT_INDEX_REFRESH_SECONDS", 60)
+REBUILD_SECONDS = getattr(settings, "PRODUCT_INDEX_REBUILD_SECONDS", 3600)
+
+
+@lru_cache(maxsize=1)
+def load_gazetteer():
+    entries = {}
+    with open(GAZETTEER_PATH, encoding="utf-8") as f:
+        rows = csv.DictReader(line for line in f if not line.startswith("#"))
+        for row in rows:
+            entries[row["key"].strip().lower()] = (float(row["latitude"]), float(row["longitude"]))
+    logger.info(f"Loaded {len(entries)} gazetteer entries")
+    return entries
+
+
+def resolve_location(location):
+    """Return (latitude, longitude) for a free-text location, or (None, None) if unknown."""
+    if not location:
+        return None, None
+    gazetteer = load_gazetteer()
+    text = " ".join(re.findall(r"\w+", location.lower()))
+
+    match = POSTAL_CODE_RE.search(text)
+    if match:
+        code = match.group()
+        for key in (code, code[:3], code[:2]):
+            if key in gazetteer:
+                return gazetteer[key]
+
+    if text in gazetteer:
+        return gazetteer[text]
+    # Longest city name mentioned in the text, e.g. "Frankfurt am Main, Bockenheim"
+    cities = [key for key in gazetteer if not key.isdigit() and f" {key} " in f" {text} "]
+    if cities:
+        return gazetteer[max(cities, key=len)]
+    return None, None
+
+
+def haversine_km(lat1, lng1, lat2, lng2):
+    lat1, lng1, lat2, lng2 = map(math.radians, (lat1, lng1, lat2, lng2))
+    a = math.sin((lat2 - lat1) / 2) ** 2 + math.cos(lat1) * math.cos(lat2) * math.sin((lng2 - lng1) / 2) ** 2
+    return 2 * EARTH_RADIUS_KM * math.asin(math.sqrt(a))
+
+
+def _cell(latitude, longitude):
+    return int(math.floor(latitude / CELL_SIZE_DEGREES)), int(math.floor(longitude / CELL_SIZE_DEGREES))
+
+
+class GeoIndex(RefreshingIndex):
+    STATE = ("_cells", "_positions")
+    name = "Product geo index"
+
+    def __init__(self):
+        super().__init__(REFRESH_SECONDS, REBUILD_SECONDS)
+
+    def _reset(self):
+        self._cells = defaultdict(dict)   # (row, col) -> {product_id: (lat, lng)}
+        self._positions = {}              # product_id -> cell
+
+    def describe(self):
+        return f"{len(self._positions)} products in {len(self._cells)} cells"
+
+    def _load(self):
+        rows = Product.objects.filter(
+            approve_status="approved", status=ProductStatus.AVAILABLE,
+            latitude__isnull=False, longitude__isnull=False,
+        ).values_list("product_id", "latitude", "longitude")
+        for product_id, latitude, longitude in rows.iterator(chunk_size=BUILD_CHUNK_SIZE):
+            self._add(product_id, latitude, longitude)
+
+    def _changed_since(self, since):
+        products = Product.objects.filter(updated_at__gte=since).only(
+            "product_id", "latitude", "longitude", "status", "approve_status"
+        )
+        return [(product.product_id, product) for product in products.iterator(chunk_size=BUILD_CHUNK_SIZE)]
+
+    def _apply(self, change):
+        product_id, product = change
+        self._remove(product_id)
+        if product is not None and product.is_listed and product.latitude is not None and product.longitude is not None:
+            self._add(product_id, product.latitude, product.longitude)
+
+    def update(self, product):
+        self.record((product.product_id, product))
+
+    def remove(self, product_id):
+        self.record((product_id, None))
+
+    def _add(self, product_id, latitude, longitude):
+        cell = _cell(latitude, longitude)
+        self._cells[cell][product_id] = (latitude, longitude)
+        self._positions[product_id] = cell
+
+    def _remove(self, product_id):
+        cell = self._positions.pop(product_id, None)
+        if cell is None:
+            return
+        members = self._cells[cell]
+        members.pop(product_id, None)
+        if not members:
+            del self._cells[cell]
+
+    def nearby(self, latitude, longitude, radius_km, limit=None):
+        """(product_id, distance_km) pairs within radius_km, nearest first: all of them, or the nearest `limit`."""
+        self.ensure_built()
+        lat_span = radius_km / 111.0
+        lng_span = radius_km / max(111.0 * math.cos(math.radians(latitude)), 1e-6)
+        min_row, min_col = _cell(latitude - lat_span, longitude - lng_span)
+        max_row, max_col = _cell(latitude + lat_span, longitude + lng_span)
+
+        hits = []
+        with self._lock:
+            for row in range(min_row, max_row + 1):
+                for col in range(min_col, max_col + 1):
+                    for product_id, (lat, lng) in self._cells.get((row, col), {}).items():
+                        distance = haversine_km(latitude, longitude, lat, lng)
+                        if distance <= radius_km:
+                            hits.append((product_id, distance))
+        if limit is None:
+            return sorted(hits, key=lambda hit: hit[1])
+        return heapq.nsmallest(limit, hits, key=lambda hit: hit[1])
+
+
+geo_index = GeoIndex()
+
+
+@receiver(products_changed)
+def relocate_products(sender, products, deleted=False, **kwargs):
+    for product in products:
+        if deleted:
+            geo_index.remove(product.product_id)
+        else:
+            geo_index.update(product)
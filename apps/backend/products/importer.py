@@ -0,0 +1,143 @@
+"""
+Bulk product import from NDJSON or CSV streams.
+
+Rows are read lazily, validated against ProductIn in chunks (including one
+query per chunk to check sellers and categories), and written with bulk_create
+inside one transaction per chunk. A bad row is reported and skipped, it never
+aborts the rest of the import.
+"""
+import csv
+import json
+
+from django.db import transaction
+from loguru import logger
+from pydantic import ValidationError
+
+from users.models import UserProfile
+from .geo import resolve_location
+from .models import Product, Category, ProductStatus
+from .schemas import ProductIn
+
+IMPORT_CHUNK_SIZE = 1000
+MAX_REPORTED_ERRORS = 1000
+FORMATS = ("ndjson", "csv")
+
+
+def _parse_image_urls(value):
+    value = (value or "").strip()
+    if not value:
+        return []
+    if value.startswith("["):
+        return json.loads(value)
+    return [url.strip() for url in value.split("|") if url.strip()]
+
+
+def read_ndjson(lines):
+    """Yield (row_number, record or error message) for each non-blank line."""
+    for row_number, line in enumerate(lines, start=1):
+        if not line.strip():
+            continue
+        try:
+            record = json.loads(line)
+        except ValueError as e:
+            yield row_number, f"Invalid JSON: {e}"
+            continue
+        if not isinstance(record, dict):
+            yield row_number, "Expected a JSON object"
+            continue
+        yield row_number, record
+
+
+def read_csv(lines):
+    """Yield (row_number, record or error message); image_urls may be a JSON list or '|'-separated."""
+    reader = csv.DictReader(lines)
+    for row_number, row in enumerate(reader, start=1):
+        record = {key: value for key, value in row.items() if key is not None and value != ""}
+        try:
+            record["image_urls"] = _parse_image_urls(row.get("image_urls"))
+        except ValueError as e:
+            yield row_number, f"Invalid image_urls: {e}"
+            continue
+        yield row_number, record
+
+
+def _validate(record):
+    try:
+        return ProductIn.model_validate(record), None
+    except ValidationError as e:
+        return None, "; ".join(
+            f"{'.'.join(str(part) for part in error['loc'])}: {error['msg']}" for error in e.errors()
+        )
+
+
+def _write_chunk(chunk, report):
+    """Validate one chunk of (row_number, record) pairs and bulk insert the valid ones."""
+    valid = []
+    for row_number, record in chunk:
+        if isinstance(record, str):
+            _report_error(report, row_number, record)
+            continue
+        data, error = _validate(record)
+        if error:
+            _report_error(report, row_number, error)
+            continue
+        valid.append((row_number, data))
+
+    seller_ids = {data.seller_id for _, data in valid}
+    category_ids = {data.category_id for _, data in valid}
+    known_sellers = set(UserProfile.objects.filter(user_id__in=seller_ids).values_list("user_id", flat=True))
+    known_categories = set(Category.objects.filter(category_id__in=category_ids).values_list("category_id", flat=True))
+
+    products = []
+    for row_number, data in valid:
+        if data.seller_id not in known_sellers:
+            _report_error(report, row_number, f"Seller {data.seller_id} does not exist")
+            continue
+        if data.category_id not in known_categories:
+            _report_error(report, row_number, f"Category {data.category_id} does not exist")
+            continue
+        product_data = data.dict()
+        product_data["image_urls"] = product_data["image_urls"] or []
+        product_data["status"] = ProductStatus.AVAILABLE
+        product_data["latitude"], product_data["longitude"] = resolve_location(data.location)
+        products.append((row_number, Product(**product_data)))
+
+    if not products:
+        return
+    try:
+        with transaction.atomic():
+            Product.objects.bulk_create([product for _, product in products], batch_size=IMPORT_CHUNK_SIZE)
+        report["created"] += len(products)
+    except Exception as e:
+        logger.error(f"Error writing import chunk: {e}")
+        for row_number, _ in products:
+            _report_error(report, row_number, f"Database error: {e}")
+
+
+def _report_error(report, row_number, error):
+    report["failed"] += 1
+    if len(report["errors"]) < MAX_REPORTED_ERRORS:
+        report["errors"].append({"row": row_number, "error": error})
+
+
+def import_products(lines, fmt="ndjson", chunk_size=IMPORT_CHUNK_SIZE):
+    """
+    Import products from an iterable of text lines in the given format.
+    Returns {"created", "failed", "errors": [{"row", "error"}, ...]}; only the
+    first MAX_REPORTED_ERRORS errors are listed, "failed" counts all of them.
+    """
+    if fmt not in FORMATS:
+        raise ValueError(f"Unsupported import format '{fmt}'. Use one of: {', '.join(FORMATS)}")
+    records = read_ndjson(lines) if fmt == "ndjson" else read_csv(lines)
+
+    report = {"created": 0, "failed": 0, "errors": []}
+    chunk = []
+    for row in records:
+        chunk.append(row)
+        if len(chunk) >= chunk_size:
+            _write_chunk(chunk, report)
+            chunk = []
+    if chunk:
+        _write_chunk(chunk, report)
+    logger.info(f"Product import finished: {report['created']} created, {report['failed']} failed")
+    return report
@@ -0,0 +1,34 @@
+import sys
+
+from django.core.management.base import BaseCommand
+from products.exporter import export_products_ndjson, EXPORT_CHUNK_SIZE
+
+
+class Command(BaseCommand):
+    help = "Stream the listed product catalog as NDJSON, with the same filters as the listing API."
+
+    def add_arguments(self, parser):
+        parser.add_argument("--output", "-o", default="-", help="File to write, or - for stdout.")
+        parser.add_argument("--category", type=int)
+        parser.add_argument("--name")
+        parser.add_argument("--condition")
+        parser.add_argument("--location")
+        parser.add_argument("--min-price", type=float)
+        parser.add_argument("--max-price", type=float)
+        parser.add_argument("--chunk-size", type=int, default=EXPORT_CHUNK_SIZE)
+
+    def handle(self, *args, **options):
+        filters = {
+            "category": options["category"],
+            "name": options["name"],
+            "condition": options["condition"],
+            "location": options["location"],
+            "min_price": options["min_price"],
+            "max_price": options["max_price"],
+        }
+        lines = export_products_ndjson(chunk_size=options["chunk_size"], **filters)
+        if options["output"] == "-":
+            sys.stdout.writelines(lines)
+        else:
+            with open(options["output"], "w", encoding="utf-8") as f:
+                f.writelines(lines)
@@ -0,0 +1,36 @@
+from django.core.management.base import BaseCommand
+from django.utils import timezone
+from products.geo import resolve_location
+from products.models import Product
+
+
+class Command(BaseCommand):
+    help = "Resolve product locations to coordinates using the bundled gazetteer."
+
+    def add_arguments(self, parser):
+        parser.add_argument("--all", action="store_true", help="Re-resolve products that already have coordinates.")
+        parser.add_argument("--batch-size", type=int, default=1000)
+
+    def handle(self, *args, **options):
+        queryset = Product.objects.exclude(location__isnull=True).exclude(location="")
+        if not options["all"]:
+            queryset = queryset.filter(latitude__isnull=True)
+
+        batch_size = options["batch_size"]
+        batch = []
+        resolved = unresolved = 0
+        for product in queryset.only("product_id", "location").iterator(chunk_size=batch_size):
+            product.latitude, product.longitude = resolve_location(product.location)
+            product.updated_at = timezone.now()  # lets the workers' geo indexes pick the change up
+            if product.latitude is None:
+                unresolved += 1
+            else:
+                resolved += 1
+            batch.append(product)
+            if len(batch) >= batch_size:
+                Product.objects.bulk_update(batch, ["latitude", "longitude", "updated_at"])
+                batch = []
+        if batch:
+            Product.objects.bulk_update(batch, ["latitude", "longitude", "updated_at"])
+
+        self.stdout.write(self.style.SUCCESS(f"Geocoded {resolved} products, {unresolved} locations not in the gazetteer"))
@@ -0,0 +1,29 @@
+import sys
+
+from django.core.management.base import BaseCommand, CommandError
+from products.importer import import_products, IMPORT_CHUNK_SIZE, FORMATS
+
+
+class Command(BaseCommand):
+    help = "Bulk import products from an NDJSON or CSV file of ProductIn records."
+
+    def add_arguments(self, parser):
+        parser.add_argument("path", help="File to import, or - for stdin.")
+        parser.add_argument("--format", choices=FORMATS, help="Defaults to the file extension, else ndjson.")
+        parser.add_argument("--chunk-size", type=int, default=IMPORT_CHUNK_SIZE)
+
+    def handle(self, *args, **options):
+        path = options["path"]
+        fmt = options["format"] or ("csv" if path.endswith(".csv") else "ndjson")
+        try:
+            if path == "-":
+                report = import_products(sys.stdin, fmt=fmt, chunk_size=options["chunk_size"])
+            else:
+                with open(path, encoding="utf-8", newline="") as f:
+                    report = import_products(f, fmt=fmt, chunk_size=options["chunk_size"])
+        except OSError as e:
+            raise CommandError(str(e))
+
+        for error in report["errors"]:
+            self.stderr.write(f"row {error['row']}: {error['error']}")
+        self.stdout.write(self.style.SUCCESS(f"Imported {report['created']} products, {report['failed']} rows failed"))
@@ -0,0 +1,18 @@
+# Generated by Django 5.2 on 2026-10-17 02:38
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('products', '0006_productreport'),
+        ('users', '0003_moderator'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='product',
+            index=models.Index(fields=['approve_status', 'status', '-created_at', '-product_id'], name='product_browse_idx'),
+        ),
+    ]
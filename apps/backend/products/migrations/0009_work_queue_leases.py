@@ -0,0 +1,28 @@
+# Generated by Django 5.2 on 2026-10-17 02:47
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('products', '0008_product_latitude_longitude'),
+        ('users', '0003_moderator'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='product',
+            name='claim_expires_at',
+            field=models.DateTimeField(blank=True, null=True),
+        ),
+        migrations.AddField(
+            model_name='product',
+            name='claimed_by',
+            field=models.IntegerField(blank=True, null=True),
+        ),
+        migrations.AddIndex(
+            model_name='product',
+            index=models.Index(fields=['approve_status', 'claim_expires_at'], name='product_claim_idx'),
+        ),
+    ]
@@ -0,0 +1,61 @@
+# Generated by Django 5.2 on 2026-10-17 02:48
+
+from django.db import migrations, models
+from django.db.models import Count
+
+
+def deduplicate_reports(apps, schema_editor):
+    """
+    Keep one report per (product, reporter): the pending one if any, else the newest.
+    Then seed Product.report_count with the number of pending reports.
+    """
+    ProductReport = apps.get_model('products', 'ProductReport')
+    Product = apps.get_model('products', 'Product')
+
+    duplicated = (
+        ProductReport.objects.values('product_id', 'reported_by_id')
+        .annotate(n=Count('report_id')).filter(n__gt=1)
+    )
+    for pair in duplicated.iterator():
+        reports = ProductReport.objects.filter(
+            product_id=pair['product_id'], reported_by_id=pair['reported_by_id']
+        ).order_by('report_id')
+        pending = [r.report_id for r in reports if r.status == 'pending']
+        keep = pending[0] if pending else reports.last().report_id
+        reports.exclude(report_id=keep).delete()
+
+    counts = (
+        ProductReport.objects.filter(status='pending')
+        .values('product_id').annotate(n=Count('report_id'))
+    )
+    for row in counts.iterator():
+        Product.objects.filter(product_id=row['product_id']).update(report_count=row['n'])
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('products', '0009_work_queue_leases'),
+        ('users', '0003_moderator'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='product',
+            name='report_count',
+            field=models.IntegerField(default=0),
+        ),
+        migrations.AddIndex(
+            model_name='product',
+            index=models.Index(fields=['-report_count', 'product_id'], name='product_report_count_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='productreport',
+            index=models.Index(fields=['product', 'status'], name='report_product_status_idx'),
+        ),
+        migrations.RunPython(deduplicate_reports, migrations.RunPython.noop),
+        migrations.AddConstraint(
+            model_name='productreport',
+            constraint=models.UniqueConstraint(fields=('product', 'reported_by'), name='unique_product_reporter'),
+        ),
+    ]
@@ -1,4 +1,12 @@
 from django.db import models
+from enum import Enum
+
+class ProductStatus(str, Enum):
+    AVAILABLE = "Available"
+    SOLD = "Sold"
+    DELETED = "Deleted"
+    PENDING = "Pending"
+    HIDDEN = "Hidden"  # auto-hidden after too many reports, until a moderator decides
 
 class Category(models.Model):
     category_id = models.AutoField(primary_key=True)
@@ -25,13 +33,34 @@ class Product(models.Model):
     status = models.CharField(max_length=50)
     is_wanted = models.BooleanField(default=False)
     location = models.CharField(max_length=255, null=True, blank=True)
+    latitude = models.FloatField(null=True, blank=True)   # resolved from location via the gazetteer
+    longitude = models.FloatField(null=True, blank=True)
     approve_status = models.CharField(default="pending", max_length=20)  # pending, approved, rejected
     rejection_reason = models.TextField(null=True, blank=True)
+    claimed_by = models.IntegerField(null=True, blank=True)  # moderator holding the review lease
+    claim_expires_at = models.DateTimeField(null=True, blank=True)
+    report_count = models.IntegerField(default=0)  # pending reports, maintained by the report endpoints
     
     def __str__(self):
         return self.name
+
+    @property
+    def is_listed(self):
+        """True when the product shows up on the public browse page."""
+        return self.approve_status == "approved" and self.status == ProductStatus.AVAILABLE
+
     class Meta:
         db_table = "products"  
+        indexes = [
+            # Serves the browse listing and its (created_at, product_id) keyset cursor
+            models.Index(fields=["approve_status", "status", "-created_at", "-product_id"], name="product_browse_idx"),
+            # Moderation work queue: pending products whose lease is free or expired
+            models.Index(fields=["approve_status", "claim_expires_at"], name="product_claim_idx"),
+            # Report queue: most reported products first
+            models.Index(fields=["-report_count", "product_id"], name="product_report_count_idx"),
+            # Background catch-up of the in-memory indexes: rows changed since the last pass
+            models.Index(fields=["updated_at"], name="product_updated_idx"),
+        ]
 
 # models.py
 class ProductReport(models.Model):
@@ -43,3 +72,9 @@ class ProductReport(models.Model):
 
     class Meta:
         db_table = "product_reports"
+        constraints = [
+            models.UniqueConstraint(fields=["product", "reported_by"], name="unique_product_reporter"),
+        ]
+        indexes = [
+            models.Index(fields=["product", "status"], name="report_product_status_idx"),
+        ]
@@ -1,81 +1,61 @@
 # report_api.py
-from ninja import Router
-from .models import ProductReport, Product
-from .schemas import ProductOut, ProductReportResponse
-
-from users.models import UserProfile
+from ninja import Router, Query
+from ninja.errors import HttpError
+from .schemas import ProductReportResponse, ReportClaimOut
+from .database import (
+    DEFAULT_PAGE_SIZE,
+    MAX_PAGE_SIZE,
+    report_product_entry,
+    get_report_queue,
+    claim_report_queue,
+    release_report_queue,
+    close_product_reports,
+)
+
+from backend.leases import MAX_CLAIM_BATCH
+from users.schemas import ReleaseClaimsIn
+from users.database import get_moderator_by_id
 from typing import List
-from django.http import Http404
 
 report_router = Router()
 
-def serialize_product(product: Product) -> ProductOut:
-    """Serialize a Product model instance to ProductOut schema"""
-    return ProductOut(
-        product_id=product.product_id,
-        name=product.name,
-        description=product.description,
-        price=product.price,
-        condition=product.condition,
-        image_urls=product.image_urls,
-        seller_id=product.seller_id,
-        category_id=product.category_id if product.category else None,
-        is_wanted=product.is_wanted,
-        location=product.location,
-        created_at=product.created_at,
-        updated_at=product.updated_at,
-        category_name=product.category.category_name if product.category else None,
-        rejection_reason=product.rejection_reason
-    )
-
-
-#@report_router.get("", response=List[ProductOut])
-#def get_reported_products(request):
-    #reports = ProductReport.objects.filter(status="pending")
-    #return [serialize_product(report.product) for report in reports]
 @report_router.get("", response=List[ProductReportResponse])
-def get_reported_products(request):
-    reports = ProductReport.objects.filter(status="pending").select_related('product', 'product__category')
-    return [{
-        "report_id": report.report_id,
-        "status": report.status,
-        "product": serialize_product(report.product),
-        "reported_by_id": report.reported_by_id,
-        "rejection_reason": getattr(report, 'rejection_reason', None)
-    } for report in reports]
+def get_reported_products(request, limit: int = Query(DEFAULT_PAGE_SIZE, ge=1, le=MAX_PAGE_SIZE), offset: int = Query(0, ge=0)):
+    """One row per reported product, most reported first."""
+    try:
+        return get_report_queue(limit, offset)
+    except Exception as e:
+        raise HttpError(500, str(e))
+
+@report_router.post("/claim", response=ReportClaimOut)
+def claim_reports(request, moderator_id: int = Query(...), limit: int = Query(20, ge=1, le=MAX_CLAIM_BATCH)):
+    """Lease the next batch of reported products, most reported first, to a moderator."""
+    if not get_moderator_by_id(moderator_id):
+        raise HttpError(404, f"Moderator with ID {moderator_id} not found.")
+    try:
+        return claim_report_queue(moderator_id, limit)
+    except Exception as e:
+        raise HttpError(500, str(e))
+
+@report_router.post("/release")
+def release_reports(request, data: ReleaseClaimsIn, moderator_id: int = Query(...)):
+    """Return claimed reported products (by product ID) to the queue without deciding on them."""
+    return {"released": release_report_queue(moderator_id, data.ids)}
 
 
 @report_router.post("/{report_id}/delete")
-def delete_reported_product(request, report_id: int):
-    try:
-        report = ProductReport.objects.get(report_id=report_id)
-        report.product.status = "removed"
-        report.product.approve_status = "rejected"
-        report.status = "deleted"
-        report.save()
-        return {"detail": "Product deleted and report closed"}
-    except ProductReport.DoesNotExist:
-        raise Http404("Report not found")
+def delete_reported_product(request, report_id: int, moderator_id: int = Query(None)):
+    closed = close_product_reports(report_id, "deleted", moderator_id)
+    return {"detail": "Product deleted and report closed", "closed_reports": closed}
 
 @report_router.post("/{report_id}/keep")
-def keep_reported_product(request, report_id: int):
-    try:
-        report = ProductReport.objects.get(report_id=report_id)
-        report.status = "kept"
-        report.save()
-        return {"detail": "Product retained and report closed"}
-    except ProductReport.DoesNotExist:
-        raise Http404("Report not found")
+def keep_reported_product(request, report_id: int, moderator_id: int = Query(None)):
+    closed = close_product_reports(report_id, "kept", moderator_id)
+    return {"detail": "Product retained and report closed", "closed_reports": closed}
 
 @report_router.post("/{product_id}")
 def report_product(request, product_id: int, user_id: int):
-    try:
-        product = Product.objects.get(product_id=product_id)
-        report = ProductReport.objects.create(
-            product=product,
-            reported_by=UserProfile.objects.get(user_id=user_id),
-            status="pending"
-        )
-        return {"report_id": report.report_id, "detail": "Product reported successfully"}
-    except Product.DoesNotExist:
-        raise Http404("Product not found")
\ No newline at end of file
+    report_id, created = report_product_entry(product_id, user_id)
+    if not created:
+        return {"report_id": report_id, "detail": "Product already reported"}
+    return {"report_id": report_id, "detail": "Product reported successfully"}
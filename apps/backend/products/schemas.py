@@ -19,6 +19,40 @@ class ProductOut(ProductIn):
     updated_at: datetime
     category_name: str
     rejection_reason: Optional[str] = None
+    latitude: Optional[float] = None
+    longitude: Optional[float] = None
+    distance_km: Optional[float] = None  # only set on "near me" searches
+
+class ProductPageOut(Schema):
+    results: List[ProductOut]
+    next: Optional[str] = None  # opaque cursor for the following page, None on the last page
+
+class FacetValueOut(Schema):
+    value: Optional[str] = None
+    label: str
+    count: int
+
+class SuggestionOut(Schema):
+    type: str  # "product" or "category"
+    label: str
+    count: int  # listed products behind the suggestion
+    category_id: Optional[int] = None
+
+class ProductFacetsOut(Schema):
+    total: int
+    category: List[FacetValueOut]
+    condition: List[FacetValueOut]
+    location: List[FacetValueOut]
+    price: List[FacetValueOut]
+
+class ImportErrorOut(Schema):
+    row: int
+    error: str
+
+class ProductImportOut(Schema):
+    created: int
+    failed: int
+    errors: List[ImportErrorOut]
 
 class CategoryOut(Schema):
     category_id: int
@@ -29,4 +63,13 @@ class ProductReportResponse(Schema):
     status: str
     product: 'ProductOut'  
     rejection_reason: Optional[str] = None
-    reported_by_id: int
\ No newline at end of file
+    reported_by_id: int
+    report_count: int = 1
+
+class ProductClaimOut(Schema):
+    lease_expires_at: datetime
+    items: List[ProductOut]
+
+class ReportClaimOut(Schema):
+    lease_expires_at: datetime
+    items: List[ProductReportResponse]
@@ -0,0 +1,229 @@
+"""
+In-process full-text search over approved product listings.
+
+The index is an inverted index (term -> {product_id: term frequency}) over
+product names and descriptions, ranked with BM25. Name tokens are counted
+NAME_WEIGHT times so title hits outrank description hits. Query tokens are
+expanded to vocabulary terms by prefix (sorted vocabulary + bisect) and by
+one edit of typo tolerance (a deletion-neighbourhood index, so fuzzy lookups
+never scan the vocabulary).
+
+The index is built lazily from the database on the first search and then kept
+current through the products_changed signal. It lives in the worker process;
+every worker builds its own copy and picks up changes made in other workers in
+the background (see backend.refresh), within PRODUCT_INDEX_REFRESH_SECONDS.
+"""
+import heapq
+import math
+import re
+from bisect import bisect_left, insort
+from collections import Counter, defaultdict
+
+from django.conf import settings
+from django.dispatch import receiver
+
+from backend.refresh import RefreshingIndex
+from .models import Product, ProductStatus
+from .signals import products_changed
+
+TOKEN_RE = re.compile(r"\w+")
+NAME_WEIGHT = 3
+MAX_PREFIX_EXPANSIONS = 50
+MIN_PREFIX_LENGTH = 2
+MIN_FUZZY_LENGTH = 4
+PREFIX_MATCH_WEIGHT = 0.8
+FUZZY_MATCH_WEIGHT = 0.6
+BUILD_CHUNK_SIZE = 2000
+REFRESH_SECONDS = getattr(settings, "PRODUCT_INDEX_REFRESH_SECONDS", 60)
+REBUILD_SECONDS = getattr(settings, "PRODUCT_INDEX_REBUILD_SECONDS", 3600)
+
+
+def tokenize(text):
+    return TOKEN_RE.findall(text.lower()) if text else []
+
+
+def _deletion_variants(term):
+    return {term} | {term[:i] + term[i + 1:] for i in range(len(term))}
+
+
+def _within_one_edit(a, b):
+    """True if a and b differ by at most one insertion, deletion, substitution or adjacent swap."""
+    if a == b:
+        return True
+    if abs(len(a) - len(b)) > 1:
+        return False
+    if len(a) == len(b):
+        diffs = [i for i in range(len(a)) if a[i] != b[i]]
+        if len(diffs) == 1:
+            return True
+        return len(diffs) == 2 and diffs[1] == diffs[0] + 1 and a[diffs[0]] == b[diffs[1]] and a[diffs[1]] == b[diffs[0]]
+    if len(a) > len(b):
+        a, b = b, a
+    i = 0
+    while i < len(a) and a[i] == b[i]:
+        i += 1
+    return a[i:] == b[i + 1:]
+
+
+class ProductSearchIndex(RefreshingIndex):
+    STATE = ("_postings", "_doc_terms", "_doc_len", "_total_len", "_vocabulary", "_deletes")
+    name = "Product search index"
+
+    def __init__(self, k1=1.2, b=0.75):
+        self.k1 = k1
+        self.b = b
+        super().__init__(REFRESH_SECONDS, REBUILD_SECONDS)
+
+    def _reset(self):
+        self._postings = defaultdict(dict)   # term -> {product_id: tf}
+        self._doc_terms = {}                 # product_id -> Counter(term -> tf)
+        self._doc_len = {}                   # product_id -> weighted token count
+        self._total_len = 0
+        self._vocabulary = []                # sorted, for prefix lookups
+        self._deletes = defaultdict(set)     # deletion variant -> terms
+
+    @property
+    def size(self):
+        return len(self._doc_len)
+
+    def describe(self):
+        return f"{self.size} products, {len(self._vocabulary)} terms"
+
+    def _load(self):
+        rows = Product.objects.filter(
+            approve_status="approved", status=ProductStatus.AVAILABLE
+        ).values_list("product_id", "name", "description")
+        for product_id, name, description in rows.iterator(chunk_size=BUILD_CHUNK_SIZE):
+            self._add(product_id, name, description)
+
+    def _changed_since(self, since):
+        products = Product.objects.filter(updated_at__gte=since).only(
+            "product_id", "name", "description", "status", "approve_status"
+        )
+        return [(product.product_id, product) for product in products.iterator(chunk_size=BUILD_CHUNK_SIZE)]
+
+    def _apply(self, change):
+        product_id, product = change
+        self._remove(product_id)
+        if product is not None and product.is_listed:
+            self._add(product_id, product.name, product.description)
+
+    def update(self, product):
+        """Reindex one product, dropping it if it is no longer listed."""
+        self.record((product.product_id, product))
+
+    def remove(self, product_id):
+        self.record((product_id, None))
+
+    def _add(self, product_id, name, description):
+        terms = Counter()
+        for token in tokenize(name):
+            terms[token] += NAME_WEIGHT
+        for token in tokenize(description):
+            terms[token] += 1
+        if not terms:
+            return
+        for term, tf in terms.items():
+            postings = self._postings[term]
+            if not postings:
+                insort(self._vocabulary, term)
+                for variant in _deletion_variants(term):
+                    self._deletes[variant].add(term)
+            postings[product_id] = tf
+        length = sum(terms.values())
+        self._doc_terms[product_id] = terms
+        self._doc_len[product_id] = length
+        self._total_len += length
+
+    def _remove(self, product_id):
+        terms = self._doc_terms.pop(product_id, None)
+        if terms is None:
+            return
+        self._total_len -= self._doc_len.pop(product_id)
+        for term in terms:
+            postings = self._postings[term]
+            postings.pop(product_id, None)
+            if not postings:
+                del self._postings[term]
+                del self._vocabulary[bisect_left(self._vocabulary, term)]
+                for variant in _deletion_variants(term):
+                    variants = self._deletes[variant]
+                    variants.discard(term)
+                    if not variants:
+                        del self._deletes[variant]
+
+    def _expand(self, token):
+        """Vocabulary terms a query token may match, with a weight per match kind."""
+        expansions = {}
+        if len(token) >= MIN_PREFIX_LENGTH:
+            start = bisect_left(self._vocabulary, token)
+            for term in self._vocabulary[start:start + MAX_PREFIX_EXPANSIONS]:
+                if not term.startswith(token):
+                    break
+                expansions[term] = PREFIX_MATCH_WEIGHT
+        if len(token) >= MIN_FUZZY_LENGTH:
+            for variant in _deletion_variants(token):
+                for term in self._deletes.get(variant, ()):
+                    if term not in expansions and _within_one_edit(token, term):
+                        expansions[term] = FUZZY_MATCH_WEIGHT
+        if token in self._postings:
+            expansions[token] = 1.0
+        return expansions
+
+    def search(self, query, limit=None):
+        """
+        Return (product_id, score) pairs, best first: every match, or the top `limit`.
+        Every query token has to match (exactly, by prefix or within one typo).
+        """
+        self.ensure_built()
+        tokens = list(dict.fromkeys(tokenize(query)))
+        if not tokens:
+            return []
+        with self._lock:
+            if not self._doc_len:
+                return []
+            doc_count = len(self._doc_len)
+            avg_len = self._total_len / doc_count
+
+            expanded = [self._expand(token) for token in tokens]
+            if not all(expanded):
+                return []
+            # Score the most selective token first so later tokens only touch surviving candidates
+            expanded.sort(key=lambda terms: sum(len(self._postings[t]) for t in terms))
+
+            scores = None
+            for terms in expanded:
+                token_scores = {}
+                for term, weight in terms.items():
+                    postings = self._postings[term]
+                    idf = math.log(1 + (doc_count - len(postings) + 0.5) / (len(postings) + 0.5))
+                    if scores is None:
+                        candidates = postings.items()
+                    else:
+                        candidates = ((pid, postings[pid]) for pid in scores if pid in postings)
+                    for product_id, tf in candidates:
+                        norm = self.k1 * (1 - self.b + self.b * self._doc_len[product_id] / avg_len)
+                        score = weight * idf * tf * (self.k1 + 1) / (tf + norm)
+                        if score > token_scores.get(product_id, 0.0):
+                            token_scores[product_id] = score
+                if scores is None:
+                    scores = token_scores
+                else:
+                    scores = {pid: scores[pid] + s for pid, s in token_scores.items()}
+                if not scores:
+                    return []
+            if limit is None:
+                return sorted(scores.items(), key=lambda item: item[1], reverse=True)
+            return heapq.nlargest(limit, scores.items(), key=lambda item: item[1])
+
+
+search_index = ProductSearchIndex()
+
+
+@receiver(products_changed)
+def reindex_products(sender, products, deleted=False, **kwargs):
+    for product in products:
+        if deleted:
+            search_index.remove(product.product_id)
+        else:
+            search_index.update(product)
@@ -0,0 +1,18 @@
+from django.db.models.signals import post_save, post_delete
+from django.dispatch import Signal, receiver
+from .models import Product
+
+# Sent with products=[Product, ...] and deleted=bool whenever listings change.
+# In-process indexes listen to this instead of post_save so that bulk UPDATE
+# paths (which skip post_save) can notify them too.
+products_changed = Signal()
+
+
+@receiver(post_save, sender=Product)
+def product_saved(sender, instance, **kwargs):
+    products_changed.send(sender=Product, products=[instance], deleted=False)
+
+
+@receiver(post_delete, sender=Product)
+def product_deleted(sender, instance, **kwargs):
+    products_changed.send(sender=Product, products=[instance], deleted=True)
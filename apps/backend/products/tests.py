@@ -1,3 +1,918 @@
+import json
+import os
+import random
+import threading
+import tempfile
+from datetime import timedelta
+from io import StringIO
+
+from django.core.management import call_command
 from django.test import TestCase
+from django.utils import timezone
+from ninja.errors import HttpError
+
+from users.models import UserProfile, FavouriteProduct
+from users.database import get_user_favourites, get_favourited_product_ids
+from .models import Product, Category, ProductReport, ProductStatus
+from .cache import product_listing_cache
+from .importer import import_products
+from .exporter import export_products_ndjson
+from . import search, facets
+from .search import search_index
+from .facets import facet_counter
+from .geo import geo_index, resolve_location
+from .autocomplete import autocomplete_index, normalize
+from .database import (
+    encode_cursor,
+    serialize_product,
+    serialize_products,
+    get_filtered_products,
+    get_pending_product_listings,
+    get_user_listings,
+    approve_product_listing,
+    reject_product_listing,
+    bulk_set_product_approval,
+    REPORT_HIDE_THRESHOLD,
+    SEARCH_FILTER_BATCH,
+)
+
+
+class BulkProductSerializationTests(TestCase):
+    PRODUCT_COUNT = 25
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.seller = UserProfile.objects.create(
+            first_name="Sam", last_name="Seller", email="seller@example.com",
+            user_type="user", joined_date="2024-01-01",
+        )
+        cls.category = Category.objects.create(category_name="Electronics")
+        for i in range(cls.PRODUCT_COUNT):
+            Product.objects.create(
+                name=f"Product {i}", description="desc", price=i, condition="New",
+                seller=cls.seller, category=cls.category if i % 2 else None,
+                status="Available", approve_status="approved" if i % 3 else "pending",
+            )
+        FavouriteProduct.objects.bulk_create(
+            [FavouriteProduct(user=cls.seller, product=p) for p in Product.objects.all()]
+        )
+
+    def setUp(self):
+        product_listing_cache.clear()
+
+    def test_serialize_products_matches_single_serializer(self):
+        expected = [serialize_product(p) for p in Product.objects.order_by("product_id")]
+        self.assertEqual(serialize_products(Product.objects.order_by("product_id")), expected)
+
+    def test_serialize_products_runs_one_query(self):
+        with self.assertNumQueries(1):
+            products = serialize_products(Product.objects.all())
+        self.assertEqual(len(products), self.PRODUCT_COUNT)
+
+    def test_listing_paths_run_fixed_number_of_queries(self):
+        with self.assertNumQueries(1):
+            get_filtered_products(limit=self.PRODUCT_COUNT)
+        with self.assertNumQueries(1):
+            get_pending_product_listings()
+        with self.assertNumQueries(1):
+            get_user_listings(self.seller.user_id)
+        with self.assertNumQueries(1):
+            favourites = get_user_favourites(self.seller.user_id)
+        self.assertEqual(len(favourites.products), self.PRODUCT_COUNT)
+
+    def test_favourite_membership_runs_one_query(self):
+        product_ids = list(Product.objects.order_by("product_id").values_list("product_id", flat=True))
+        FavouriteProduct.objects.filter(product_id__in=product_ids[::2]).delete()
+        with self.assertNumQueries(1):
+            favourited = get_favourited_product_ids(self.seller.user_id, product_ids + [0])
+        self.assertEqual(favourited, product_ids[1::2])
+
+
+class ProductIndexRefreshTests(TestCase):
+    """Rows written by another worker reach no signal here; the indexes must still pick them up."""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.seller = UserProfile.objects.create(
+            first_name="Rea", last_name="Builder", email="rebuild@example.com",
+            user_type="user", joined_date="2024-01-01",
+        )
+
+    def setUp(self):
+        search_index.invalidate()
+        facet_counter.invalidate()
+        geo_index.invalidate()
+        autocomplete_index.invalidate()
+
+    def create_elsewhere(self, **fields):
+        """Insert a listed product without sending products_changed in this process."""
+        defaults = dict(
+            description="desc", price=20, condition="Used", seller=self.seller,
+            status="Available", approve_status="approved",
+        )
+        Product.objects.bulk_create([Product(**{**defaults, **fields})])
+        return Product.objects.get(name=fields["name"])
+
+    def test_search_index_catches_up_on_changed_rows(self):
+        self.assertEqual(search_index.search("gramophone"), [])
+        product = self.create_elsewhere(name="Gramophone")
+        self.assertEqual(search_index.search("gramophone"), [])
+        search_index.catch_up()
+        self.assertEqual([pid for pid, _ in search_index.search("gramophone")], [product.product_id])
+
+        Product.objects.filter(product_id=product.product_id).update(status="Sold", updated_at=timezone.now())
+        search_index.catch_up()
+        self.assertEqual(search_index.search("gramophone"), [])
+
+    def test_rebuild_loads_without_blocking_readers(self):
+        seen = {}
+
+        class ObservedIndex(search.ProductSearchIndex):
+            def _load(index):
+                super()._load()
+                # Another thread can take the lock while the fresh copy loads...
+                def probe():
+                    seen["free"] = index._lock.acquire(timeout=1)
+                    if seen["free"]:
+                        index._lock.release()
+                reader = threading.Thread(target=probe)
+                reader.start()
+                reader.join()
+                # ...and a change arriving meanwhile is replayed onto the copy before the swap
+                late = self.create_elsewhere(name="Harpsichord")
+                seen["late"] = late.product_id
+                index_under_test.update(late)
+
+        index_under_test = ObservedIndex()
+        index_under_test.build()
+        self.assertTrue(seen["free"])
+        self.assertEqual([pid for pid, _ in index_under_test.search("harpsichord")], [seen["late"]])
+
+    def test_facet_counts_catch_up_on_changed_rows(self):
+        total, counts = facet_counter.counts()
+        tuba = self.create_elsewhere(name="Tuba", condition="Vintage")
+        self.assertEqual(facet_counter.counts()[0], total)
+        facet_counter.catch_up()
+        total_after, counts_after = facet_counter.counts()
+        self.assertEqual(total_after, total + 1)
+        self.assertEqual(counts_after["condition"]["Vintage"], counts["condition"]["Vintage"] + 1)
+
+        Product.objects.filter(product_id=tuba.product_id).update(condition="Used", updated_at=timezone.now())
+        facet_counter.catch_up()
+        self.assertEqual(facet_counter.counts()[1]["condition"]["Vintage"], counts["condition"]["Vintage"])
+
+    def test_geo_index_catches_up_on_changed_rows(self):
+        self.assertEqual(geo_index.nearby(50.5530, 9.6770, 5), [])
+        product = self.create_elsewhere(name="Bicycle", location="36037", latitude=50.5530, longitude=9.6770)
+        self.assertEqual(geo_index.nearby(50.5530, 9.6770, 5), [])
+        geo_index.catch_up()
+        self.assertEqual([pid for pid, _ in geo_index.nearby(50.5530, 9.6770, 5)], [product.product_id])
+
+    def test_geocoding_command_reaches_the_geo_index(self):
+        product = self.create_elsewhere(name="Kayak", location="36037")
+        Product.objects.filter(product_id=product.product_id).update(updated_at=timezone.now() - timedelta(days=1))
+        geo_index.ensure_built()
+        call_command("geocode_products", stdout=StringIO())
+        geo_index.catch_up()
+        self.assertEqual([pid for pid, _ in geo_index.nearby(50.5530, 9.6770, 5)], [product.product_id])
+
+    def test_autocomplete_catches_up_on_changed_rows(self):
+        self.assertEqual(autocomplete_index.suggest("xylo"), [])
+        self.create_elsewhere(name="Xylophone")
+        self.assertEqual(autocomplete_index.suggest("xylo"), [])
+        autocomplete_index.catch_up()
+        self.assertEqual([s["label"] for s in autocomplete_index.suggest("xylo")], ["Xylophone"])
+
+        category = Category.objects.create(category_name="Instruments")
+        Category.objects.filter(category_id=category.category_id).update(
+            category_name="Zithers", updated_at=timezone.now()
+        )
+        autocomplete_index.catch_up()
+        self.assertEqual([s["label"] for s in autocomplete_index.suggest("zith")], ["Zithers"])
+
+
+class ConditionalRequestTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.seller = UserProfile.objects.create(
+            first_name="Eve", last_name="Tag", email="etag@example.com",
+            user_type="user", joined_date="2024-01-01",
+        )
+        category = Category.objects.create(category_name="Furniture")
+        cls.products = [
+            Product.objects.create(
+                name=f"Chair {i}", description="desc", price=i, condition="Used", category=category,
+                seller=cls.seller, status="Available", approve_status="approved",
+            )
+            for i in range(3)
+        ]
+
+    def setUp(self):
+        product_listing_cache.clear()
+
+    def test_listing_etag_costs_no_aggregate(self):
+        with self.assertNumQueries(1):
+            first = self.client.get("/api/products?limit=2")
+        self.assertEqual(first.status_code, 200)
+        with self.assertNumQueries(0):
+            cached = self.client.get("/api/products?limit=2")
+        self.assertEqual(cached["ETag"], first["ETag"])
+
+        # Checked against a fresh page read, still a single query
+        with self.assertNumQueries(1):
+            response = self.client.get("/api/products?limit=2", HTTP_IF_NONE_MATCH=first["ETag"])
+        self.assertEqual(response.status_code, 304)
+        self.assertEqual(response["ETag"], first["ETag"])
+
+    def test_listing_etag_moves_with_page_content(self):
+        etag = self.client.get("/api/products?limit=2")["ETag"]
+        # Written without products_changed, as another worker's change looks from here
+        Product.objects.filter(product_id=self.products[-1].product_id).update(name="Armchair")
+        response = self.client.get("/api/products?limit=2", HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 200)
+        self.assertNotEqual(response["ETag"], etag)
+        self.assertEqual(response.json()["results"][0]["name"], "Armchair")
+
+        # A change outside the page leaves its tag alone
+        etag = response["ETag"]
+        self.products[0].price = 99
+        self.products[0].save()
+        self.assertEqual(self.client.get("/api/products?limit=2", HTTP_IF_NONE_MATCH=etag).status_code, 304)
+
+    def test_detail_etag(self):
+        product = self.products[0]
+        etag = self.client.get(f"/api/products/{product.product_id}")["ETag"]
+        with self.assertNumQueries(1):
+            response = self.client.get(f"/api/products/{product.product_id}", HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 304)
+        product.name = "Stool"
+        product.save()
+        response = self.client.get(f"/api/products/{product.product_id}", HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 200)
+        self.assertNotEqual(response["ETag"], etag)
+        self.assertEqual(self.client.get("/api/products/999999", HTTP_IF_NONE_MATCH=etag).status_code, 404)
+
+
+class ModerationLeaseTests(TestCase):
+    HOLDER, OTHER = 1, 2
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.seller = UserProfile.objects.create(
+            first_name="Lee", last_name="Lease", email="lease@example.com",
+            user_type="user", joined_date="2024-01-01",
+        )
+        cls.reporter = UserProfile.objects.create(
+            first_name="Rey", last_name="Porter", email="reporter@example.com",
+            user_type="user", joined_date="2024-01-01",
+        )
+
+    def setUp(self):
+        self.product = Product.objects.create(
+            name="Lamp", description="desc", price=5, condition="Used", seller=self.seller,
+            status="Available", approve_status="pending",
+            claimed_by=self.HOLDER, claim_expires_at=timezone.now() + timedelta(minutes=5),
+        )
+
+    def assertLease(self, claimed_by):
+        self.product.refresh_from_db()
+        self.assertEqual(self.product.claimed_by, claimed_by)
+        self.assertEqual(self.product.claim_expires_at is None, claimed_by is None)
+
+    def test_only_the_holder_decides_a_claimed_listing(self):
+        with self.assertRaises(HttpError) as raised:
+            approve_product_listing(self.product.product_id, self.OTHER)
+        self.assertEqual(raised.exception.status_code, 409)
+        with self.assertRaises(HttpError):
+            reject_product_listing(self.product.product_id, "blurry", None)
+        self.assertLease(self.HOLDER)
+        self.assertEqual(self.product.approve_status, "pending")
+
+        self.assertTrue(reject_product_listing(self.product.product_id, "blurry", self.HOLDER))
+        self.assertLease(None)
+        self.assertEqual((self.product.approve_status, self.product.rejection_reason), ("rejected", "blurry"))
+
+    def test_expired_lease_does_not_block(self):
+        Product.objects.filter(pk=self.product.pk).update(claim_expires_at=timezone.now() - timedelta(seconds=1))
+        self.assertTrue(approve_product_listing(self.product.product_id, self.OTHER))
+        self.assertLease(None)
+        self.assertEqual(self.product.approve_status, "approved")
+
+    def test_bulk_skips_listings_claimed_by_others(self):
+        free = Product.objects.create(
+            name="Desk", description="desc", price=5, condition="Used", seller=self.seller,
+            status="Available", approve_status="pending",
+        )
+        outcome = bulk_set_product_approval([self.product.product_id, free.product_id], "approved", moderator_id=self.OTHER)
+        self.assertEqual(outcome["updated"], 1)
+        self.assertEqual([r["result"] for r in outcome["results"]], ["claimed", "approved"])
+        self.assertLease(self.HOLDER)
+
+        outcome = bulk_set_product_approval([self.product.product_id], "approved", moderator_id=self.HOLDER)
+        self.assertEqual(outcome["results"], [{"id": self.product.product_id, "result": "approved"}])
+        self.assertLease(None)
+
+    def test_report_decisions_respect_the_product_lease(self):
+        report = ProductReport.objects.create(product=self.product, reported_by=self.reporter, status="pending")
+        Product.objects.filter(pk=self.product.pk).update(report_count=1, status=ProductStatus.HIDDEN)
+
+        response = self.client.post(f"/api/reports/{report.report_id}/delete?moderator_id={self.OTHER}")
+        self.assertEqual(response.status_code, 409)
+        report.refresh_from_db()
+        self.assertEqual(report.status, "pending")
+        self.assertLease(self.HOLDER)
+
+        response = self.client.post(f"/api/reports/{report.report_id}/keep?moderator_id={self.HOLDER}")
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.json()["closed_reports"], 1)
+        self.assertLease(None)
+        self.assertEqual((self.product.status, self.product.report_count), (ProductStatus.AVAILABLE, 0))
+
+
+class CursorPaginationTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        seller = UserProfile.objects.create(
+            first_name="Kay", last_name="Set", email="keyset@example.com",
+            user_type="user", joined_date="2024-01-01",
+        )
+        category = Category.objects.create(category_name="Games")
+        products = [
+            Product.objects.create(
+                name=f"Game {i}", description="desc", price=i, condition="Used", category=category,
+                seller=seller, status="Available", approve_status="approved",
+            )
+            for i in range(7)
+        ]
+        # Ties on created_at are broken by product_id
+        stamp = timezone.now() - timedelta(days=1)
+        Product.objects.filter(pk__in=[p.pk for p in products[2:5]]).update(created_at=stamp)
+        cls.expected = list(
+            Product.objects.order_by("-created_at", "-product_id").values_list("product_id", flat=True)
+        )
+
+    def setUp(self):
+        product_listing_cache.clear()
+
+    def test_pages_cover_the_listing_once(self):
+        seen, cursor = [], None
+        for _ in range(5):
+            url = "/api/products?limit=3" + (f"&cursor={cursor}" if cursor else "")
+            page = self.client.get(url).json()
+            seen += [product["product_id"] for product in page["results"]]
+            cursor = page["next"]
+            if cursor is None:
+                break
+        self.assertEqual(seen, self.expected)
+
+    def test_last_page_has_no_cursor(self):
+        page = self.client.get("/api/products?limit=7").json()
+        self.assertEqual(len(page["results"]), 7)
+        self.assertIsNone(page["next"])
+
+    def test_bad_cursor_is_a_400(self):
+        for cursor in ("not-a-cursor!", encode_cursor({"product_id": 1}), encode_cursor({"created_at": "soon", "product_id": 1})):
+            self.assertEqual(self.client.get(f"/api/products?cursor={cursor}").status_code, 400, cursor)
+
+
+class ProductSearchTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        seller = UserProfile.objects.create(
+            first_name="Sue", last_name="Search", email="search@example.com",
+            user_type="user", joined_date="2024-01-01",
+        )
+        category = Category.objects.create(category_name="Music")
+
+        def product(name, description, approve_status="approved"):
+            return Product.objects.create(
+                name=name, description=description, price=10, condition="Used", category=category,
+                seller=seller, status="Available", approve_status=approve_status,
+            )
+        cls.amplifier = product("Guitar amplifier", "loud and clear")
+        cls.acoustic = product("Acoustic guitar", "wooden body")
+        cls.stand = product("Music stand", "holds guitar sheet music")
+        cls.lamp = product("Desk lamp", "bright")
+        cls.pending = product("Guitar strings", "new", approve_status="pending")
+
+    def setUp(self):
+        search_index.invalidate()
+        product_listing_cache.clear()
+
+    def ids(self, query):
+        return [product_id for product_id, _ in search_index.search(query)]
+
+    def test_name_hits_outrank_description_hits(self):
+        ranked = self.ids("guitar")
+        self.assertEqual(set(ranked[:2]), {self.amplifier.product_id, self.acoustic.product_id})
+        self.assertEqual(ranked[2:], [self.stand.product_id])
+
+    def test_every_token_must_match(self):
+        self.assertEqual(self.ids("guitar wooden"), [self.acoustic.product_id])
+        self.assertEqual(self.ids("guitar bright"), [])
+
+    def test_prefix_and_typo_matches(self):
+        self.assertEqual(self.ids("ampli"), [self.amplifier.product_id])
+        for typo in ("gutiar", "guitr", "guiter", "guitarr"):
+            self.assertEqual(set(self.ids(typo)), {self.amplifier.product_id, self.acoustic.product_id, self.stand.product_id}, typo)
+        # Exact matches score above the same word reached through a typo
+        exact = dict(search_index.search("lamp"))[self.lamp.product_id]
+        self.assertGreater(exact, dict(search_index.search("lammp"))[self.lamp.product_id])
+
+    def test_index_follows_saves(self):
+        self.ids("guitar")
+        self.lamp.name = "Guitar lamp"
+        self.lamp.save()
+        self.assertIn(self.lamp.product_id, self.ids("guitar"))
+        self.amplifier.status = "Sold"
+        self.amplifier.save()
+        self.assertNotIn(self.amplifier.product_id, self.ids("guitar"))
+
+    def test_search_pages_through_the_api(self):
+        first = self.client.get("/api/products?q=guitar&limit=2").json()
+        self.assertEqual(len(first["results"]), 2)
+        rest = self.client.get(f"/api/products?q=guitar&limit=2&cursor={first['next']}").json()
+        self.assertEqual([p["product_id"] for p in rest["results"]], [self.stand.product_id])
+        self.assertIsNone(rest["next"])
+
+    def test_filters_reach_past_the_first_batch_of_hits(self):
+        seller = self.lamp.seller
+        drums = Category.objects.create(category_name="Drums")
+        Product.objects.bulk_create([
+            Product(
+                name=f"Guitar pick {i}", description="plastic", price=1, condition="New", category=self.lamp.category,
+                seller=seller, status="Available", approve_status="approved",
+            )
+            for i in range(SEARCH_FILTER_BATCH + 5)
+        ])
+        # Description-only hits rank below every "Guitar pick"
+        snares = [
+            Product.objects.create(
+                name=f"Snare {i}", description="fits a guitar case", price=30, condition="Used", category=drums,
+                seller=seller, status="Available", approve_status="approved",
+            )
+            for i in range(3)
+        ]
+        search_index.invalidate()
+
+        first = self.client.get(f"/api/products?q=guitar&category={drums.category_id}&limit=2").json()
+        rest = self.client.get(f"/api/products?q=guitar&category={drums.category_id}&limit=2&cursor={first['next']}").json()
+        self.assertEqual(
+            {p["product_id"] for p in first["results"] + rest["results"]},
+            {snare.product_id for snare in snares},
+        )
+        self.assertIsNone(rest["next"])
+
+
+class ProductFacetTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.seller = UserProfile.objects.create(
+            first_name="Fay", last_name="Facet", email="facet@example.com",
+            user_type="user", joined_date="2024-01-01",
+        )
+        cls.bikes = Category.objects.create(category_name="Bikes")
+        cls.tools = Category.objects.create(category_name="Tools")
+        cls.road = cls.product("Road bike", cls.bikes, "Used", "Fulda", 120)
+        cls.kids = cls.product("Kids bike", cls.bikes, "New", "Kassel", 60)
+        cls.drill = cls.product("Drill", cls.tools, "Used", "Fulda", 40)
+        cls.product("Saw", cls.tools, "Used", "Fulda", 15, approve_status="pending")
+
+    @classmethod
+    def product(cls, name, category, condition, location, price, approve_status="approved"):
+        return Product.objects.create(
+            name=name, description="desc", price=price, condition=condition, location=location,
+            category=category, seller=cls.seller, status="Available", approve_status=approve_status,
+        )
+
+    def setUp(self):
+        facet_counter.invalidate()
+        search_index.invalidate()
+
+    def facets(self, query=""):
+        response = self.client.get(f"/api/products/facets{query}")
+        self.assertEqual(response.status_code, 200)
+        body = response.json()
+        return body["total"], {facet: {v["label"]: v["count"] for v in body[facet]} for facet in facets.FACETS}
+
+    def test_counts(self):
+        total, counts = self.facets()
+        self.assertEqual(total, 3)
+        self.assertEqual(counts["category"], {"Bikes": 2, "Tools": 1})
+        self.assertEqual(counts["condition"], {"Used": 2, "New": 1})
+        self.assertEqual(counts["location"], {"Fulda": 2, "Kassel": 1})
+        self.assertEqual(counts["price"], {"25-50": 1, "50-100": 1, "100-250": 1})
+
+    def test_filtered_counts(self):
+        total, counts = self.facets(f"?category={self.bikes.category_id}&min_price=100")
+        self.assertEqual((total, counts["category"]), (1, {"Bikes": 1}))
+        total, counts = self.facets("?location=fulda&q=bike")
+        self.assertEqual((total, counts["condition"]), (1, {"Used": 1}))
+
+    def test_search_counts_cover_every_match(self):
+        Product.objects.bulk_create([
+            Product(
+                name=f"Bike bell {i}", description="desc", price=5, condition="New", location="Kassel",
+                category=self.bikes, seller=self.seller, status="Available", approve_status="approved",
+            )
+            for i in range(SEARCH_FILTER_BATCH + 5)
+        ])
+        total, counts = self.facets("?q=bike")
+        self.assertEqual(total, SEARCH_FILTER_BATCH + 7)
+        self.assertEqual(counts["category"], {"Bikes": SEARCH_FILTER_BATCH + 7})
+        self.assertEqual(counts["price"]["0-10"], SEARCH_FILTER_BATCH + 5)
+
+    def test_counts_follow_changes(self):
+        self.assertEqual(self.facets()[0], 3)
+        self.kids.status = "Sold"
+        self.kids.save()
+        self.product("Wrench", self.tools, "New", "Kassel", 8)
+        self.drill.delete()
+        total, counts = self.facets()
+        self.assertEqual(total, 2)
+        self.assertEqual(counts["category"], {"Bikes": 1, "Tools": 1})
+        self.assertEqual(counts["price"], {"0-10": 1, "100-250": 1})
+
+        bulk_set_product_approval(list(Product.objects.filter(name="Saw").values_list("pk", flat=True)), "approved")
+        self.assertEqual(self.facets()[1]["category"], {"Bikes": 1, "Tools": 2})
+
+        # Incremental counts agree with a rebuild from the database
+        before = self.facets()
+        facet_counter.invalidate()
+        self.assertEqual(self.facets(), before)
+
+
+class NearbySearchTests(TestCase):
+    FULDA = (50.5530, 9.6770)
+
+    @classmethod
+    def setUpTestData(cls):
+        seller = UserProfile.objects.create(
+            first_name="Geo", last_name="Graph", email="geo@example.com",
+            user_type="user", joined_date="2024-01-01",
+        )
+        category = Category.objects.create(category_name="Garden")
+
+        def product(name, location):
+            latitude, longitude = resolve_location(location)
+            return Product.objects.create(
+                name=name, description="desc", price=10, condition="Used", category=category, seller=seller,
+                status="Available", approve_status="approved", location=location, latitude=latitude, longitude=longitude,
+            )
+        cls.centre = product("Rake", "36037")
+        cls.north = product("Hose", "36039 Fulda")
+        cls.kassel = product("Shovel", "Kassel")
+        cls.nowhere = product("Bucket", "Atlantis")
+
+    def setUp(self):
+        geo_index.invalidate()
+        product_listing_cache.clear()
+
+    def nearby(self, radius_km, extra=""):
+        lat, lng = self.FULDA
+        return self.client.get(f"/api/products?lat={lat}&lng={lng}&radius_km={radius_km}{extra}")
+
+    def test_resolve_location(self):
+        self.assertEqual(resolve_location("36037"), (50.5530, 9.6770))
+        self.assertEqual(resolve_location("36099 Somewhere"), (50.5558, 9.6808))   # region prefix
+        self.assertEqual(resolve_location("Frankfurt am Main, Bockenheim"), (50.1109, 8.6821))
+        self.assertEqual(resolve_location("Atlantis"), (None, None))
+        self.assertEqual(resolve_location(None), (None, None))
+
+    def test_radius_filters_and_orders_by_distance(self):
+        results = self.nearby(10).json()["results"]
+        self.assertEqual([p["product_id"] for p in results], [self.centre.product_id, self.north.product_id])
+        self.assertEqual(results[0]["distance_km"], 0)
+        self.assertGreater(results[1]["distance_km"], 2)
+
+        ids = [p["product_id"] for p in self.nearby(150).json()["results"]]
+        self.assertEqual(ids, [self.centre.product_id, self.north.product_id, self.kassel.product_id])
+
+    def test_nearby_pages_and_filters(self):
+        first = self.nearby(150, "&limit=2").json()
+        self.assertEqual(len(first["results"]), 2)
+        rest = self.nearby(150, f"&limit=2&cursor={first['next']}").json()
+        self.assertEqual([p["product_id"] for p in rest["results"]], [self.kassel.product_id])
+        self.assertEqual([p["product_id"] for p in self.nearby(150, "&name=hose").json()["results"]], [self.north.product_id])
+
+    def test_filters_reach_past_the_nearest_batch(self):
+        Product.objects.bulk_create([
+            Product(
+                name=f"Seed packet {i}", description="desc", price=2, condition="New", category=self.centre.category,
+                seller=self.centre.seller, status="Available", approve_status="approved",
+                location="36037", latitude=self.FULDA[0], longitude=self.FULDA[1],
+            )
+            for i in range(SEARCH_FILTER_BATCH + 5)
+        ])
+        first = self.nearby(150, "&name=shovel&limit=1").json()
+        self.assertEqual([p["product_id"] for p in first["results"]], [self.kassel.product_id])
+        self.assertIsNone(first["next"])
+
+    def test_parameter_validation(self):
+        lat, lng = self.FULDA
+        self.assertEqual(self.client.get(f"/api/products?lat={lat}&lng={lng}").status_code, 400)
+        self.assertEqual(self.client.get(f"/api/products?radius_km=5").status_code, 400)
+        for query in (f"lat=91&lng={lng}&radius_km=5", f"lat={lat}&lng=181&radius_km=5",
+                      f"lat={lat}&lng={lng}&radius_km=0", f"lat={lat}&lng={lng}&radius_km=501"):
+            self.assertEqual(self.client.get(f"/api/products?{query}").status_code, 422, query)
+
+
+class ProductImportTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.seller = UserProfile.objects.create(
+            first_name="Ima", last_name="Porter", email="import@example.com",
+            user_type="user", joined_date="2024-01-01",
+        )
+        cls.category = Category.objects.create(category_name="Records")
+
+    def record(self, name, **overrides):
+        record = {
+            "name": name, "description": "desc", "price": 12.5, "condition": "Used", "image_urls": [],
+            "seller_id": self.seller.user_id, "category_id": self.category.category_id,
+            "is_wanted": False, "location": "36037",
+        }
+        record.update(overrides)
+        return record
+
+    def test_ndjson_rows_fail_individually(self):
+        lines = [
+            json.dumps(self.record("Vinyl A")),
+            "",
+            "{not json",
+            json.dumps(self.record("Vinyl B", price="cheap")),
+            json.dumps(self.record("Vinyl C", seller_id=999999)),
+            json.dumps(self.record("Vinyl D", category_id=999999)),
+            "[1, 2]",
+            json.dumps(self.record("Vinyl E")),
+        ]
+        response = self.client.post("/api/products/import", "\n".join(lines), content_type="application/x-ndjson")
+        self.assertEqual(response.status_code, 200)
+        report = response.json()
+        self.assertEqual((report["created"], report["failed"]), (2, 5))
+        errors = {error["row"]: error["error"] for error in report["errors"]}
+        self.assertEqual(sorted(errors), [3, 4, 5, 6, 7])
+        self.assertTrue(errors[3].startswith("Invalid JSON"))
+        self.assertIn("price", errors[4])
+        self.assertEqual(errors[5], "Seller 999999 does not exist")
+        self.assertEqual(errors[7], "Expected a JSON object")
+
+        imported = Product.objects.get(name="Vinyl A")
+        self.assertEqual((imported.status, imported.latitude), (ProductStatus.AVAILABLE, 50.5530))
+        self.assertTrue(Product.objects.filter(name="Vinyl E").exists())
+
+    def test_csv_import(self):
+        body = (
+            "name,description,price,condition,image_urls,seller_id,category_id,is_wanted\n"
+            f"Tape,desc,3,Used,a.jpg|b.jpg,{self.seller.user_id},{self.category.category_id},false\n"
+            f"CD,desc,,Used,,{self.seller.user_id},{self.category.category_id},false\n"
+        )
+        report = self.client.post("/api/products/import", body, content_type="text/csv").json()
+        self.assertEqual((report["created"], report["failed"]), (1, 1))
+        self.assertEqual(report["errors"][0]["row"], 2)
+        self.assertEqual(Product.objects.get(name="Tape").image_urls, ["a.jpg", "b.jpg"])
+
+    def test_unknown_format_is_a_400(self):
+        response = self.client.post("/api/products/import?format=xml", "<products/>", content_type="application/xml")
+        self.assertEqual(response.status_code, 400)
+
+    def test_chunks_are_written_independently(self):
+        lines = [json.dumps(self.record(f"Single {i}", category_id=999999 if i == 1 else self.category.category_id)) for i in range(5)]
+        report = import_products(lines, chunk_size=2)
+        self.assertEqual((report["created"], report["failed"]), (4, 1))
+        self.assertEqual(report["errors"], [{"row": 2, "error": "Category 999999 does not exist"}])
+
+    def test_management_command(self):
+        with tempfile.NamedTemporaryFile("w", suffix=".ndjson", delete=False) as f:
+            f.write(json.dumps(self.record("EP")) + "\n" + json.dumps(self.record("LP", seller_id=999999)) + "\n")
+        self.addCleanup(os.remove, f.name)
+        out, err = StringIO(), StringIO()
+        call_command("import_products", f.name, "--chunk-size", "1", stdout=out, stderr=err)
+        self.assertIn("Imported 1 products, 1 rows failed", out.getvalue())
+        self.assertIn("row 2: Seller 999999 does not exist", err.getvalue())
+        self.assertTrue(Product.objects.filter(name="EP").exists())
+
+
+class ProductExportTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        seller = UserProfile.objects.create(
+            first_name="Ex", last_name="Porter", email="export@example.com",
+            user_type="user", joined_date="2024-01-01",
+        )
+        cls.maps = Category.objects.create(category_name="Maps")
+        cls.globes = Category.objects.create(category_name="Globes")
+        for i in range(7):
+            Product.objects.create(
+                name=f"Atlas {i}", description="desc", price=i, condition="Used", seller=seller,
+                category=cls.maps if i % 2 else cls.globes, status="Available",
+                approve_status="pending" if i == 6 else "approved",
+            )
+        # Chunk boundaries fall inside a run of equal created_at values
+        Product.objects.update(created_at=timezone.now() - timedelta(days=1))
+        cls.listed = set(Product.objects.filter(approve_status="approved").values_list("product_id", flat=True))
+
+    def test_streams_every_listed_product(self):
+        response = self.client.get("/api/products/export")
+        self.assertEqual(response.status_code, 200)
+        self.assertTrue(response.streaming)
+        self.assertEqual(response["Content-Type"], "application/x-ndjson")
+        rows = [json.loads(line) for line in b"".join(response.streaming_content).decode().splitlines()]
+        self.assertEqual({row["product_id"] for row in rows}, self.listed)
+        self.assertEqual(len(rows), len(self.listed))
+        by_name = {row["name"]: row for row in rows}
+        self.assertEqual((by_name["Atlas 3"]["category_name"], by_name["Atlas 4"]["category_name"]), ("Maps", "Globes"))
+
+    def test_filters(self):
+        response = self.client.get(f"/api/products/export?category={self.maps.category_id}&min_price=2")
+        rows = [json.loads(line) for line in b"".join(response.streaming_content).decode().splitlines()]
+        self.assertEqual(sorted(row["name"] for row in rows), ["Atlas 3", "Atlas 5"])
+
+    def test_one_bounded_query_per_chunk(self):
+        lines = export_products_ndjson(chunk_size=4)
+        with self.assertNumQueries(2):   # a full chunk of 4, then the last 2 rows
+            rows = [json.loads(line) for line in lines]
+        ids = [row["product_id"] for row in rows]
+        self.assertEqual(len(ids), len(set(ids)))
+        self.assertEqual(set(ids), self.listed)
+
+    def test_management_command(self):
+        with tempfile.NamedTemporaryFile(suffix=".ndjson", delete=False) as f:
+            pass
+        self.addCleanup(os.remove, f.name)
+        call_command("export_products", "--output", f.name, "--chunk-size", "4")
+        with open(f.name, encoding="utf-8") as exported:
+            self.assertEqual({json.loads(line)["product_id"] for line in exported}, self.listed)
+
+
+class ProductReportTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.seller = UserProfile.objects.create(
+            first_name="Rita", last_name="Report", email="rita@example.com",
+            user_type="user", joined_date="2024-01-01",
+        )
+        cls.reporters = [
+            UserProfile.objects.create(
+                first_name=f"User{i}", last_name="Report", email=f"reporter{i}@example.com",
+                user_type="user", joined_date="2024-01-01",
+            )
+            for i in range(REPORT_HIDE_THRESHOLD)
+        ]
+        category = Category.objects.create(category_name="Reported")
+        cls.widget, cls.gadget = [
+            Product.objects.create(
+                name=name, description="desc", price=3, condition="Used", category=category,
+                seller=cls.seller, status="Available", approve_status="approved",
+            )
+            for name in ("Widget", "Gadget")
+        ]
+
+    def setUp(self):
+        product_listing_cache.clear()
+
+    def report(self, product, user):
+        return self.client.post(f"/api/reports/{product.product_id}?user_id={user.user_id}")
+
+    def test_reports_are_deduplicated(self):
+        first = self.report(self.widget, self.reporters[0]).json()
+        again = self.report(self.widget, self.reporters[0]).json()
+        self.assertEqual(again, {"report_id": first["report_id"], "detail": "Product already reported"})
+        self.assertEqual(ProductReport.objects.filter(product=self.widget).count(), 1)
+        self.widget.refresh_from_db()
+        self.assertEqual(self.widget.report_count, 1)
+
+        self.assertEqual(self.client.post(f"/api/reports/999999?user_id={self.seller.user_id}").status_code, 404)
+        self.assertEqual(self.client.post(f"/api/reports/{self.widget.product_id}?user_id=999999").status_code, 404)
+
+    def test_closed_report_can_be_filed_again(self):
+        first = self.report(self.widget, self.reporters[0]).json()
+        self.client.post(f"/api/reports/{first['report_id']}/keep")
+        again = self.report(self.widget, self.reporters[0]).json()
+        self.assertEqual(again, {"report_id": first["report_id"], "detail": "Product reported successfully"})
+        self.assertEqual(ProductReport.objects.get(report_id=first["report_id"]).status, "pending")
+        self.widget.refresh_from_db()
+        self.assertEqual(self.widget.report_count, 1)
+        self.assertEqual([row["product"]["product_id"] for row in self.client.get("/api/reports").json()], [self.widget.product_id])
+
+    def test_listing_is_hidden_at_the_threshold(self):
+        for reporter in self.reporters[:-1]:
+            self.report(self.widget, reporter)
+        self.widget.refresh_from_db()
+        self.assertEqual(self.widget.status, ProductStatus.AVAILABLE)
+
+        self.report(self.widget, self.reporters[-1])
+        self.widget.refresh_from_db()
+        self.assertEqual((self.widget.status, self.widget.report_count), (ProductStatus.HIDDEN, REPORT_HIDE_THRESHOLD))
+        listed = [p["product_id"] for p in self.client.get("/api/products").json()["results"]]
+        self.assertEqual(listed, [self.gadget.product_id])
+
+        # Keeping it closes every pending report and lists it again
+        report_id = ProductReport.objects.filter(product=self.widget).order_by("report_id").first().report_id
+        self.assertEqual(self.client.post(f"/api/reports/{report_id}/keep").json()["closed_reports"], REPORT_HIDE_THRESHOLD)
+        self.widget.refresh_from_db()
+        self.assertEqual((self.widget.status, self.widget.report_count), (ProductStatus.AVAILABLE, 0))
+
+    def test_closed_report_cannot_be_decided_again(self):
+        first = self.report(self.widget, self.reporters[0]).json()["report_id"]
+        self.assertEqual(self.client.post(f"/api/reports/{first}/keep").status_code, 200)
+        self.report(self.widget, self.reporters[1])
+
+        # A repeated or stale decision on the closed report must not touch the new one
+        for action in ("keep", "delete"):
+            self.assertEqual(self.client.post(f"/api/reports/{first}/{action}").status_code, 409)
+        self.widget.refresh_from_db()
+        self.assertEqual((self.widget.status, self.widget.report_count), (ProductStatus.AVAILABLE, 1))
+        self.assertEqual(ProductReport.objects.get(report_id=first).status, "kept")
+        self.assertEqual(self.client.post("/api/reports/999999/keep").status_code, 404)
+
+    def test_queue_has_one_row_per_product(self):
+        for reporter in self.reporters[:3]:
+            self.report(self.gadget, reporter)
+        self.report(self.widget, self.reporters[0])
+        with self.assertNumQueries(3):
+            queue = self.client.get("/api/reports").json()
+        self.assertEqual([(row["product"]["product_id"], row["report_count"]) for row in queue],
+                         [(self.gadget.product_id, 3), (self.widget.product_id, 1)])
+        first_gadget_report = ProductReport.objects.filter(product=self.gadget).order_by("report_id").first()
+        self.assertEqual(queue[0]["report_id"], first_gadget_report.report_id)
+
+        self.client.post(f"/api/reports/{queue[0]['report_id']}/delete")
+        self.gadget.refresh_from_db()
+        self.assertEqual((self.gadget.status, self.gadget.approve_status), (ProductStatus.DELETED, "rejected"))
+        self.assertEqual([row["product"]["product_id"] for row in self.client.get("/api/reports").json()], [self.widget.product_id])
+
+
+class AutocompleteTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.seller = UserProfile.objects.create(
+            first_name="Otto", last_name="Complete", email="otto@example.com",
+            user_type="user", joined_date="2024-01-01",
+        )
+        cls.peripherals = Category.objects.create(category_name="Wireless gear")
+        for name in ("Wireless mouse", "wireless  MOUSE!", "Wireless mouse", "Wired keyboard", "Webcam"):
+            cls.product(name)
+        cls.product("Wireless charger", approve_status="pending")
+
+    @classmethod
+    def product(cls, name, approve_status="approved"):
+        return Product.objects.create(
+            name=name, description="desc", price=20, condition="New", category=cls.peripherals,
+            seller=cls.seller, status="Available", approve_status=approve_status,
+        )
+
+    def setUp(self):
+        autocomplete_index.invalidate()
+
+    def labels(self, prefix, limit=10):
+        return [(s["label"], s["count"]) for s in autocomplete_index.suggest(prefix, limit)]
+
+    def test_most_popular_first(self):
+        self.assertEqual(self.labels("wi"), [("Wireless gear", 5), ("Wireless mouse", 3), ("Wired keyboard", 1)])
+        self.assertEqual(self.labels("wi", limit=1), [("Wireless gear", 5)])
+        # Any word of a name is a prefix entry point
+        self.assertEqual(self.labels("mou"), [("Wireless mouse", 3)])
+        self.assertEqual(self.labels("ireless"), [])
+
+    def test_follows_changes(self):
+        self.assertEqual(self.labels("w")[1], ("Wireless mouse", 3))   # memoized short prefix
+        for _ in range(3):
+            self.product("Webcam")
+        self.assertEqual(self.labels("w")[1], ("Webcam", 4))
+        Product.objects.filter(name="Webcam").delete()
+        self.assertNotIn("Webcam", [label for label, _ in self.labels("w")])
+
+        self.peripherals.category_name = "Peripherals"
+        self.peripherals.save()
+        self.assertEqual(self.labels("per"), [("Peripherals", 4)])
+        self.assertEqual(self.labels("wireless"), [("Wireless mouse", 3)])
+
+    def test_matches_a_full_scan(self):
+        rng = random.Random(7)
+        words = ["red", "rad", "radio", "ring", "robot", "rope"]
+        Product.objects.bulk_create([
+            Product(
+                name=" ".join(rng.sample(words, rng.randint(1, 2))), description="desc", price=1,
+                condition="New", category=self.peripherals, seller=self.seller,
+                status="Available", approve_status="approved",
+            )
+            for _ in range(150)
+        ])
+        autocomplete_index.invalidate()
+        counts = {}
+        for name in Product.objects.filter(approve_status="approved").values_list("name", flat=True):
+            counts[normalize(name)] = counts.get(normalize(name), 0) + 1
+        for prefix in ("r", "ra", "rob", "ro"):
+            expected = sorted(
+                (count for text, count in counts.items() if any(word.startswith(prefix) for word in text.split())),
+                reverse=True,
+            )[:10]
+            self.assertEqual([s["count"] for s in autocomplete_index.suggest(prefix)], expected, prefix)
 
-# Create your tests here.
+    def test_api(self):
+        response = self.client.get("/api/products/autocomplete?q=Wire&limit=2")
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual([s["label"] for s in response.json()], ["Wireless gear", "Wireless mouse"])
+        self.assertEqual(self.client.get("/api/products/autocomplete").status_code, 422)
+        self.assertEqual(self.client.get("/api/products/autocomplete?q=w&limit=21").status_code, 422)
@@ -37,6 +37,9 @@ else
     echo "Skipping fixture loading (SKIP_FIXTURES=true)"
 fi
 
+# Place listings on the map for "near me" search
+python manage.py geocode_products || echo "Warning: Failed to geocode products"
+
 # Check DEBUG value to determine server type
 if [ "$DEBUG" = "False" ] || [ "$DEBUG" = "false" ]; then
   echo "🔧 Starting Gunicorn server for production..."
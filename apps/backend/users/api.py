@@ -1,17 +1,20 @@
-from ninja import Router 
+from ninja import Router, Query
 from ninja.errors import HttpError 
-from .schemas import UserSignupIn, UserLoginIn, UserOut, FavouritesOut, FavouritesIn, UserIn, AddressOut, TokenRefreshIn
+from .schemas import UserSignupIn, UserLoginIn, UserOut, FavouritesOut, FavouritesIn, FavouritesContainOut, UserIn, AddressOut, TokenRefreshIn
 from .database import create_user_entry, validate_user_login, add_product_to_favourites, get_user_favourites, remove_product_from_favourites
+from .database import get_favourited_product_ids, MAX_FAVOURITE_LOOKUP
 from django.http import Http404 , JsonResponse
 from loguru import logger
+from typing import List
 from .models import UserProfile, Address
 from delivery_agent.database import get_previous_deliveries_for_user, get_delivery_request_by_id
 from delivery_agent.schemas import DeliveryRequestOut
 from products.schemas import ProductOut
-from products.database import get_user_listings
+from products.database import get_user_listings, DEFAULT_PAGE_SIZE, MAX_PAGE_SIZE
 from .schemas import UserIn, UserOut, AddressIn  # import AddressIn/Out
 from rest_framework_simplejwt.tokens import AccessToken, RefreshToken # type: ignore
 from rest_framework_simplejwt.exceptions import TokenError # type: ignore
+from backend.hashing import password_hasher, HashingBusy
 
 user_router = Router()
 
@@ -53,6 +56,8 @@ def user_signup(request, data: UserSignupIn):
             token=access_token,
             refresh_token=refresh_token
         )
+    except HashingBusy:
+        raise
     except Exception as e:
         raise HttpError(400, str(e))
 
@@ -94,9 +99,18 @@ def user_login(request, data: UserLoginIn):
         )
     except Http404 as e:
         raise HttpError(404, str(e))
+    except HashingBusy:
+        raise
     except Exception as e:
         raise HttpError(400, str(e))
 
+@user_router.get("/hashing-stats", tags=["Authentication"])
+def hashing_stats(request):
+    """
+    Queue length, throughput and latency of this worker's password hashing pool.
+    """
+    return password_hasher.stats()
+
 @user_router.post("/token/refresh", response={200: dict, 400: str}, tags=["Authentication"])
 def refresh_token(request, data: TokenRefreshIn):
     try:
@@ -133,6 +147,18 @@ def get_favourites(request, user_id: int):
     except Exception as e:
         raise HttpError(400, str(e))
     
+@user_router.get("/favourites/{user_id}/contains", response=FavouritesContainOut, tags=["User"])
+def favourites_contain(request, user_id: int, product_ids: List[int] = Query(...)):
+    """
+    Which of the given products (?product_ids=1&product_ids=2...) the user has favourited.
+    """
+    if len(product_ids) > MAX_FAVOURITE_LOOKUP:
+        raise HttpError(400, f"At most {MAX_FAVOURITE_LOOKUP} product ids can be checked per request.")
+    try:
+        return {"user_id": user_id, "product_ids": get_favourited_product_ids(user_id, product_ids)}
+    except Exception as e:
+        raise HttpError(400, str(e))
+    
 @user_router.delete("/favourites/{user_id}/{product_id}", response={204: None, 404: str}, tags=["User"])
 def remove_favourite(request, user_id: int, product_id: str):
     try:
@@ -145,13 +171,13 @@ def remove_favourite(request, user_id: int, product_id: str):
         raise HttpError(400, str(e))
     
 @user_router.get("/{user_id}", response=list[DeliveryRequestOut], tags=["User"])
-def get_users_previous_deliveries(request, user_id: int):
+def get_users_previous_deliveries(request, user_id: int, limit: int = Query(DEFAULT_PAGE_SIZE, ge=1, le=MAX_PAGE_SIZE), offset: int = Query(0, ge=0)):
     """
     API endpoint to fetch user details by user ID.
     """
     try:
         user = UserProfile.objects.get(user_id=user_id)
-        return get_previous_deliveries_for_user(user_id)
+        return get_previous_deliveries_for_user(user_id, limit, offset)
     except UserProfile.DoesNotExist:
         raise HttpError(404, f"User with ID {user_id} not found.")
     except Exception as e:
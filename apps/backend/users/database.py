@@ -1,10 +1,10 @@
-from .models import UserProfile, Address, Role, UserFavourites
+from .models import UserProfile, Address, Role, FavouriteProduct
 from .schemas import UserSignupIn, UserLoginIn, FavouritesOut,  UserOut
-from products.database import serialize_product 
+from products.database import serialize_products
 from django.http import Http404 # type: ignore
-from django.contrib.auth.hashers import make_password, check_password # type: ignore
+from backend.hashing import hash_password, verify_password, HashingBusy
 from loguru import logger
-from django.db import IntegrityError
+from django.db import IntegrityError, transaction
 from typing import Optional
 from products.models import Product
 
@@ -26,10 +26,12 @@ def create_user_entry(data: UserSignupIn):
         user = UserProfile.objects.create(
             address=address,
             role=role,
-            password=make_password(password),
+            password=hash_password(password),
             **signup_data
         )
         return user
+    except HashingBusy:
+        raise
     except Exception as e:
         raise Exception(f"Error creating user: {str(e)}")
 
@@ -39,16 +41,25 @@ def validate_user_login(data: UserLoginIn):
         password = data.password
         user = UserProfile.objects.get(email=email)
 
-        if not check_password(password, user.password):
+        is_correct, upgraded = verify_password(password, user.password)
+        if not is_correct:
             raise Http404("Invalid password")
+        if upgraded:
+            # Only if nobody changed the password meanwhile
+            UserProfile.objects.filter(user_id=user.user_id, password=user.password).update(password=upgraded)
+            user.password = upgraded
 
         return user
     except UserProfile.DoesNotExist:
         raise Http404(f"User with email {email} not found")
+    except (Http404, HashingBusy):
+        raise
     except Exception as e:
         raise Exception(f"Login error: {str(e)}")
     
 
+MAX_FAVOURITE_LOOKUP = 200
+
 def add_product_to_favourites(user_id: int, product_id: str):
     try:
         # Check if user exists
@@ -62,24 +73,17 @@ def add_product_to_favourites(user_id: int, product_id: str):
             logger.error(f"Product with id={product_id} does not exist.")
             raise Exception("Product does not exist.")
 
+        # One INSERT; the unique (user, product) constraint rejects duplicates,
+        # so concurrent adds can't overwrite each other
         try:
-            userFavourites = UserFavourites.objects.get(user=user)
-            if product_id in userFavourites.product_ids:
-                logger.warning(f"Product_id={product_id} already in favourites for user_id={user_id}")
-                raise Exception("Product already in favourites")
-
-            logger.info(f"Adding product_id={product_id} to favourites for user_id={user_id}")
-            userFavourites.product_ids.append(product_id)
-            userFavourites.save()
-            return userFavourites
-        except UserFavourites.DoesNotExist:
-            logger.info(f"Creating new favourites entry for user_id={user_id}")
-            userFavourites = UserFavourites.objects.create(user=user, product_ids=[product_id])
-            return userFavourites
+            with transaction.atomic():
+                favourite = FavouriteProduct.objects.create(user=user, product=product)
+        except IntegrityError:
+            logger.warning(f"Product_id={product_id} already in favourites for user_id={user_id}")
+            raise Exception("Product already in favourites")
+        logger.info(f"Added product_id={product_id} to favourites for user_id={user_id}")
+        return favourite
 
-    except IntegrityError as e:
-        logger.error(f"Database integrity error: {str(e)}")
-        raise Exception("Database integrity error. Please check user and product IDs.")
     except Exception as e:
         logger.error(f"Error adding product to favourites: {str(e)}")
         raise Exception(f"Error adding product to favourites: {str(e)}")
@@ -87,32 +91,34 @@ def add_product_to_favourites(user_id: int, product_id: str):
 def get_user_favourites(user_id: int):
     try:
         favouritesOut = FavouritesOut(user_id=user_id, products=[])
-        userFavourites = UserFavourites.objects.get(user_id=user_id)
-        for product_id in userFavourites.product_ids:
-            try:
-                favouritesOut.products.append(serialize_product(Product.objects.get(product_id=product_id)))
-            except Product.DoesNotExist:
-                logger.warning(f"Product with id={product_id} does not exist in favourites for user_id={user_id}")
-                continue
+        # Keep the order in which the user favourited them
+        queryset = Product.objects.filter(favourited_by__user_id=user_id).order_by(
+            "favourited_by__created_at", "favourited_by__id"
+        )
+        favouritesOut.products.extend(serialize_products(queryset))
         return favouritesOut
-    except UserFavourites.DoesNotExist:
-        return FavouritesOut(user_id=user_id, products=[])
-    except UserProfile.DoesNotExist:
-        raise Http404(f"User with ID {user_id} not found")
     except Exception as e:
         raise Exception(f"Error fetching user favourites: {str(e)}")
 
+def get_favourited_product_ids(user_id: int, product_ids):
+    """
+    Which of the given products the user has favourited, in one indexed query.
+    """
+    favourited = set(
+        FavouriteProduct.objects.filter(user_id=user_id, product_id__in=product_ids).values_list("product_id", flat=True)
+    )
+    return [product_id for product_id in dict.fromkeys(product_ids) if product_id in favourited]
+
 def remove_product_from_favourites(user_id: int, product_id: str):
     try:
-        userFavourites = UserFavourites.objects.get(user_id=user_id)
-        if product_id not in userFavourites.product_ids:
+        deleted, _ = FavouriteProduct.objects.filter(user_id=user_id, product_id=product_id).delete()
+        if not deleted:
+            if not UserProfile.objects.filter(user_id=user_id).exists():
+                raise Http404(f"User with ID {user_id} not found")
             raise Exception("Product not found in favourites")
-
-        userFavourites.product_ids.remove(product_id)
-        userFavourites.save()
-        return userFavourites
-    except UserFavourites.DoesNotExist:
-        raise Http404(f"User with ID {user_id} not found")
+        return deleted
+    except Http404:
+        raise
     except Exception as e:
         raise Exception(f"Error removing product from favourites: {str(e)}")
     
@@ -0,0 +1,137 @@
+"""
+Cached identity resolution for WebSocket connects.
+
+A connect needs two things: the user id inside the access token and the few
+profile fields ChatConsumer uses. Both are cached per worker so reconnect
+storms don't re-verify the same tokens or re-read the same profiles:
+
+- access_token_cache maps a verified token to its user id until the token
+  expires (capped by the cache TTL).
+- user_identity_cache maps a user id to a frozen UserIdentity. It is dropped
+  on every UserProfile save/delete in this process; the TTL bounds staleness
+  for changes made by other workers.
+
+Cache misses go through IdentityLoader, which coalesces the misses of
+concurrent connects into one `user_id IN (...)` query and one thread hop, so
+even a cold cache after a deploy costs a handful of queries, not one per socket.
+"""
+import asyncio
+import time
+from dataclasses import dataclass
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.db.models.signals import post_save, post_delete
+from django.dispatch import receiver
+from rest_framework_simplejwt.tokens import AccessToken
+
+from backend.cache import TTLCache
+from .models import UserProfile
+
+_config = getattr(settings, "WEBSOCKET_AUTH_CACHE", {})
+BATCH_WINDOW_SECONDS = _config.get("BATCH_WINDOW_MS", 5) / 1000
+
+access_token_cache = TTLCache(
+    max_entries=_config.get("MAX_ENTRIES", 10000),
+    ttl=_config.get("TOKEN_TTL_SECONDS", 3600),
+    name="websocket_access_token",
+)
+user_identity_cache = TTLCache(
+    max_entries=_config.get("MAX_ENTRIES", 10000),
+    ttl=_config.get("IDENTITY_TTL_SECONDS", 300),
+    name="websocket_user_identity",
+)
+
+
+@dataclass(frozen=True)
+class UserIdentity:
+    """The part of a UserProfile a chat connection needs."""
+    user_id: int
+    email: str
+    first_name: str
+    last_name: str
+
+    is_authenticated = True
+    is_anonymous = False
+
+    @property
+    def pk(self):
+        return self.user_id
+
+    def __str__(self):
+        return self.email
+
+
+def user_id_from_token(token):
+    """Verify an access token (or recall that it was verified) and return its user id."""
+    user_id = access_token_cache.get(token)
+    if user_id is not None:
+        return user_id
+    access_token = AccessToken(token)  # raises TokenError if invalid or expired
+    user_id = access_token["user_id"]
+    remaining = access_token["exp"] - time.time()
+    if remaining > 0:
+        access_token_cache.set(token, user_id, ttl=min(remaining, access_token_cache.ttl))
+    return user_id
+
+
+def fetch_identities(user_ids):
+    rows = UserProfile.objects.filter(user_id__in=user_ids).values_list("user_id", "email", "first_name", "last_name")
+    return {row[0]: UserIdentity(*row) for row in rows}
+
+
+class IdentityLoader:
+    def __init__(self, window=BATCH_WINDOW_SECONDS):
+        self.window = window
+        self._loop = None
+        self._pending = {}   # user_id -> future shared by every connect waiting on it
+        self._scheduled = False
+        self._flushing = set()   # running flush tasks, referenced so they aren't garbage collected
+
+    async def load(self, user_id):
+        """The UserIdentity for user_id, or None if there is no such user."""
+        identity = user_identity_cache.get(user_id)
+        if identity is not None:
+            return identity
+        loop = asyncio.get_running_loop()
+        if loop is not self._loop:
+            self._loop, self._pending, self._scheduled = loop, {}, False
+        future = self._pending.get(user_id)
+        if future is None:
+            future = self._pending[user_id] = loop.create_future()
+            if not self._scheduled:
+                self._scheduled = True
+                loop.call_later(self.window, self._start_flush)
+        # Shielded: a connect dropped mid-handshake cancels only its own wait, not
+        # the future the other connects for this user share. Only _flush resolves it.
+        return await asyncio.shield(future)
+
+    def _start_flush(self):
+        task = asyncio.ensure_future(self._flush())
+        self._flushing.add(task)
+        task.add_done_callback(self._flushing.discard)
+
+    async def _flush(self):
+        pending, self._pending, self._scheduled = self._pending, {}, False
+        try:
+            identities = await sync_to_async(fetch_identities)(list(pending))
+        except Exception as e:
+            for future in pending.values():
+                if not future.done():
+                    future.set_exception(e)
+            return
+        for user_id, future in pending.items():
+            identity = identities.get(user_id)
+            if identity is not None:
+                user_identity_cache.set(user_id, identity)
+            if not future.done():
+                future.set_result(identity)
+
+
+identity_loader = IdentityLoader()
+
+
+@receiver(post_save, sender=UserProfile)
+@receiver(post_delete, sender=UserProfile)
+def forget_identity(sender, instance, **kwargs):
+    user_identity_cache.delete(instance.user_id)
@@ -0,0 +1,68 @@
+# Generated by Django 5.2 on 2026-10-17 02:52
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+def copy_favourites(apps, schema_editor):
+    """One FavouriteProduct row per id in the old JSON lists, keeping their order."""
+    UserFavourites = apps.get_model('users', 'UserFavourites')
+    FavouriteProduct = apps.get_model('users', 'FavouriteProduct')
+    Product = apps.get_model('products', 'Product')
+
+    for favourites in UserFavourites.objects.iterator():
+        product_ids = []
+        for product_id in favourites.product_ids or []:
+            try:
+                product_ids.append(int(product_id))
+            except (TypeError, ValueError):
+                continue
+        existing = set(Product.objects.filter(product_id__in=product_ids).values_list('product_id', flat=True))
+        rows = [
+            FavouriteProduct(user_id=favourites.user_id, product_id=product_id)
+            for product_id in dict.fromkeys(product_ids) if product_id in existing
+        ]
+        FavouriteProduct.objects.bulk_create(rows, ignore_conflicts=True)
+
+
+def restore_favourites(apps, schema_editor):
+    UserFavourites = apps.get_model('users', 'UserFavourites')
+    FavouriteProduct = apps.get_model('users', 'FavouriteProduct')
+
+    lists = {}
+    for user_id, product_id in FavouriteProduct.objects.order_by('created_at', 'id').values_list('user_id', 'product_id'):
+        lists.setdefault(user_id, []).append(str(product_id))
+    UserFavourites.objects.bulk_create(
+        [UserFavourites(user_id=user_id, product_ids=product_ids) for user_id, product_ids in lists.items()]
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('products', '0010_deduplicate_reports'),
+        ('users', '0003_moderator'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='FavouriteProduct',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('product', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='favourited_by', to='products.product')),
+                ('user', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='favourite_products', to='users.userprofile')),
+            ],
+            options={
+                'db_table': 'user_favourite_products',
+            },
+        ),
+        migrations.AddConstraint(
+            model_name='favouriteproduct',
+            constraint=models.UniqueConstraint(fields=('user', 'product'), name='unique_user_favourite'),
+        ),
+        migrations.RunPython(copy_favourites, restore_favourites),
+        migrations.DeleteModel(
+            name='UserFavourites',
+        ),
+    ]
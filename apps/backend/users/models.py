@@ -45,18 +45,20 @@ class UserProfile(models.Model):
     class Meta:
         db_table = "users"
 
-class UserFavourites(models.Model):
-    user = models.ForeignKey(UserProfile, on_delete=models.CASCADE, related_name='favourites')
-    product_ids = models.JSONField(default=list)
+class FavouriteProduct(models.Model):
+    user = models.ForeignKey(UserProfile, on_delete=models.CASCADE, related_name='favourite_products')
+    product = models.ForeignKey('products.Product', on_delete=models.CASCADE, related_name='favourited_by')
     created_at = models.DateTimeField(auto_now_add=True)
-    updated_at = models.DateTimeField(auto_now=True)
 
     def __str__(self):
-        return f"Favourites of {self.user.first_name} {self.user.last_name} - {len(self.product_ids)} products favourited"
+        return f"User {self.user_id} favourited product {self.product_id}"
 
     class Meta:
-        db_table = "user_favourites"
-
+        db_table = "user_favourite_products"
+        constraints = [
+            # Also the index behind "this user's favourites" and batch membership lookups
+            models.UniqueConstraint(fields=["user", "product"], name="unique_user_favourite"),
+        ]
 
 class Moderator(models.Model):
     moderator_id = models.AutoField(primary_key=True)
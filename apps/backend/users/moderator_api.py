@@ -1,18 +1,34 @@
-from ninja import Router
+from ninja import Router, Query
 from ninja.errors import HttpError, Http404
 from .schemas import ModeratorIn, UserOut, UserIn
-from .schemas import RejectReasonIn
+from .schemas import RejectReasonIn, BulkIdsIn, BulkRejectIn, BulkModerationOut, ReleaseClaimsIn
 from products.database import approve_product_listing, reject_product_listing, get_pending_product_listings
+from products.database import bulk_set_product_approval, MAX_BULK_MODERATION
+from products.database import claim_pending_product_listings, release_product_listings
 from delivery_agent.database import get_pending_delivery_agent, get_pending_delivery_agents, approve_agent, reject_agent
+from delivery_agent.database import bulk_set_agent_approval, claim_pending_delivery_agents, release_delivery_agents
 from delivery_agent.models import DeliveryAgent
-from delivery_agent.schemas import DeliveryAgentOut
-from products.schemas import ProductOut
+from delivery_agent.schemas import DeliveryAgentOut, AgentClaimOut
+from products.schemas import ProductOut, ProductClaimOut
+from backend.leases import MAX_CLAIM_BATCH
 from loguru import logger
 from .database import get_moderator_by_id, update_moderator
 
 moderator_router = Router()
 
 
+def check_moderator(moderator_id: int):
+    if not get_moderator_by_id(moderator_id):
+        raise HttpError(404, f"Moderator with ID {moderator_id} not found.")
+
+
+def check_bulk_size(ids):
+    if not ids:
+        raise HttpError(400, "ids must not be empty.")
+    if len(ids) > MAX_BULK_MODERATION:
+        raise HttpError(400, f"At most {MAX_BULK_MODERATION} ids can be moderated per request.")
+
+
 @moderator_router.get("/pending-listings", response=list[ProductOut], tags=["Moderator-Listings"])
 def pending_listings(request):
     """
@@ -29,15 +45,17 @@ def pending_listings(request):
 
 
 @moderator_router.post("/approve-listings/{product_id}", tags=["Moderator-Listings"])
-def approve_listing(request, product_id: int):
+def approve_listing(request, product_id: int, moderator_id: int = Query(None)):
     """
     Approve a product listing by its ID.
     """
     logger.info(f"Approving product listing with ID {product_id}.")
     try:
-        approve_product_listing(product_id)
+        approve_product_listing(product_id, moderator_id)
         logger.success(f"Product listing {product_id} approved.")
         return {"message": "Product listing approved successfully."}
+    except HttpError:
+        raise
     except Exception as e:
         logger.error(f"Error approving product {product_id}: {e}")
         if hasattr(e, "status_code") and e.status_code == 404:
@@ -45,15 +63,17 @@ def approve_listing(request, product_id: int):
         raise HttpError(500, f"An error occurred while approving the product: {str(e)}")
 
 @moderator_router.post("/reject-listings/{product_id}", tags=["Moderator-Listings"])
-def reject_listing(request, product_id: int, data: RejectReasonIn):
+def reject_listing(request, product_id: int, data: RejectReasonIn, moderator_id: int = Query(None)):
     """
     Reject a product listing by its ID.
     """
     logger.info(f"Rejecting product listing with ID {product_id}. Reason: {data.reason}")
     try:
-        reject_product_listing(product_id, data.reason)
+        reject_product_listing(product_id, data.reason, moderator_id)
         logger.success(f"Product listing {product_id} rejected.")
         return {"message": "Product listing rejected successfully."}
+    except HttpError:
+        raise
     except Exception as e:
         logger.error(f"Error rejecting product {product_id}: {e}")
         if hasattr(e, "status_code") and e.status_code == 404:
@@ -61,6 +81,54 @@ def reject_listing(request, product_id: int, data: RejectReasonIn):
         raise HttpError(500, f"An error occurred while rejecting the product: {str(e)}")
     
 
+@moderator_router.post("/bulk-approve-listings", response=BulkModerationOut, tags=["Moderator-Listings"])
+def bulk_approve_listings(request, data: BulkIdsIn, moderator_id: int = Query(None)):
+    """
+    Approve many product listings at once, with a result per ID.
+    """
+    check_bulk_size(data.ids)
+    logger.info(f"Bulk approving {len(data.ids)} product listings.")
+    try:
+        return bulk_set_product_approval(data.ids, "approved", moderator_id=moderator_id)
+    except Exception as e:
+        logger.error(f"Error bulk approving product listings: {e}")
+        raise HttpError(500, f"An error occurred while approving the products: {str(e)}")
+
+@moderator_router.post("/bulk-reject-listings", response=BulkModerationOut, tags=["Moderator-Listings"])
+def bulk_reject_listings(request, data: BulkRejectIn, moderator_id: int = Query(None)):
+    """
+    Reject many product listings at once with one reason, with a result per ID.
+    """
+    check_bulk_size(data.ids)
+    logger.info(f"Bulk rejecting {len(data.ids)} product listings. Reason: {data.reason}")
+    try:
+        return bulk_set_product_approval(data.ids, "rejected", data.reason, moderator_id)
+    except Exception as e:
+        logger.error(f"Error bulk rejecting product listings: {e}")
+        raise HttpError(500, f"An error occurred while rejecting the products: {str(e)}")
+
+
+@moderator_router.post("/claim-listings", response=ProductClaimOut, tags=["Moderator-Listings"])
+def claim_listings(request, moderator_id: int = Query(...), limit: int = Query(20, ge=1, le=MAX_CLAIM_BATCH)):
+    """
+    Lease the next batch of pending listings to a moderator; nobody else gets them until the lease expires.
+    """
+    check_moderator(moderator_id)
+    try:
+        return claim_pending_product_listings(moderator_id, limit)
+    except Exception as e:
+        logger.error(f"Error claiming pending listings: {e}")
+        raise HttpError(500, f"An error occurred while claiming pending listings: {str(e)}")
+
+@moderator_router.post("/release-listings", tags=["Moderator-Listings"])
+def release_listings(request, data: ReleaseClaimsIn, moderator_id: int = Query(...)):
+    """
+    Return claimed listings to the queue without deciding on them.
+    """
+    released = release_product_listings(moderator_id, data.ids)
+    return {"released": released}
+
+
 @moderator_router.get("/pending-agents", response=list[DeliveryAgentOut] ,tags=["Moderator-Agents"])
 def pending_agents_list(request):
     """
@@ -92,40 +160,92 @@ def get_pending_agent(request, agent_id: int):
         raise HttpError(500, f"An error occurred while fetching the delivery agent: {str(e)}")
     
 @moderator_router.post("/approve-agents/{agent_id}", tags=["Moderator-Agents"])
-def approve_agent_api(request, agent_id: int):
+def approve_agent_api(request, agent_id: int, moderator_id: int = Query(None)):
     """
     Approve a delivery agent by ID.
     """
     logger.info(f"Approving delivery agent with ID {agent_id}.")
     try:
-        approve_agent(agent_id)
+        approve_agent(agent_id, moderator_id)
         logger.success(f"Delivery agent {agent_id} approved.")
         return {"message": "Delivery agent approved successfully."}
     except DeliveryAgent.DoesNotExist:
         logger.warning(f"Delivery agent with ID {agent_id} not found.")
         raise HttpError(404, f"Delivery agent with ID {agent_id} not found.")
+    except HttpError:
+        raise
     except Exception as e:
         logger.error(f"Error approving delivery agent {agent_id}: {e}")
         raise HttpError(500, f"An error occurred while approving the delivery agent: {str(e)}")
 
 @moderator_router.post("/reject-agents/{agent_id}", tags=["Moderator-Agents"])
-def reject_agent_api(request, agent_id: int):
+def reject_agent_api(request, agent_id: int, moderator_id: int = Query(None)):
     """
     Reject a delivery agent by ID.
     """
     logger.info(f"Rejecting delivery agent with ID {agent_id}.")
     try:
-        reject_agent(agent_id) 
+        reject_agent(agent_id, moderator_id)
         logger.success(f"Delivery agent {agent_id} rejected.")
         return {"message": "Delivery agent rejected successfully."}
     except DeliveryAgent.DoesNotExist:
         logger.warning(f"Delivery agent with ID {agent_id} not found.")
         raise HttpError(404, f"Delivery agent with ID {agent_id} not found.")
+    except HttpError:
+        raise
     except Exception as e:
         logger.error(f"Error rejecting delivery agent {agent_id}: {e}")
         raise HttpError(500, f"An error occurred while rejecting the delivery agent: {str(e)}")
     
 
+@moderator_router.post("/bulk-approve-agents", response=BulkModerationOut, tags=["Moderator-Agents"])
+def bulk_approve_agents(request, data: BulkIdsIn, moderator_id: int = Query(None)):
+    """
+    Approve many pending delivery agents at once, with a result per ID.
+    """
+    check_bulk_size(data.ids)
+    logger.info(f"Bulk approving {len(data.ids)} delivery agents.")
+    try:
+        return bulk_set_agent_approval(data.ids, "approved", moderator_id)
+    except Exception as e:
+        logger.error(f"Error bulk approving delivery agents: {e}")
+        raise HttpError(500, f"An error occurred while approving the delivery agents: {str(e)}")
+
+@moderator_router.post("/bulk-reject-agents", response=BulkModerationOut, tags=["Moderator-Agents"])
+def bulk_reject_agents(request, data: BulkIdsIn, moderator_id: int = Query(None)):
+    """
+    Reject many pending delivery agents at once, with a result per ID.
+    """
+    check_bulk_size(data.ids)
+    logger.info(f"Bulk rejecting {len(data.ids)} delivery agents.")
+    try:
+        return bulk_set_agent_approval(data.ids, "rejected", moderator_id)
+    except Exception as e:
+        logger.error(f"Error bulk rejecting delivery agents: {e}")
+        raise HttpError(500, f"An error occurred while rejecting the delivery agents: {str(e)}")
+
+
+@moderator_router.post("/claim-agents", response=AgentClaimOut, tags=["Moderator-Agents"])
+def claim_agents(request, moderator_id: int = Query(...), limit: int = Query(20, ge=1, le=MAX_CLAIM_BATCH)):
+    """
+    Lease the next batch of pending delivery agents to a moderator.
+    """
+    check_moderator(moderator_id)
+    try:
+        return claim_pending_delivery_agents(moderator_id, limit)
+    except Exception as e:
+        logger.error(f"Error claiming pending delivery agents: {e}")
+        raise HttpError(500, f"An error occurred while claiming pending delivery agents: {str(e)}")
+
+@moderator_router.post("/release-agents", tags=["Moderator-Agents"])
+def release_agents(request, data: ReleaseClaimsIn, moderator_id: int = Query(...)):
+    """
+    Return claimed delivery agents to the queue without deciding on them.
+    """
+    released = release_delivery_agents(moderator_id, data.ids)
+    return {"released": released}
+
+
 @moderator_router.get("/{id}", response=UserOut, tags=["Moderators"])
 def get_moderator_details(request, id: int):
     """
@@ -60,6 +60,10 @@ class FavouritesOut(Schema):
     user_id: int
     products: Optional[List[ProductOut]]
 
+class FavouritesContainOut(Schema):
+    user_id: int
+    product_ids: List[int]  # the requested products this user has favourited
+
 class FavouritesIn(Schema):
     user_id: int
     product_id: str
@@ -67,6 +71,24 @@ class FavouritesIn(Schema):
 class RejectReasonIn(Schema):
     reason: str
 
+class BulkIdsIn(Schema):
+    ids: List[int]
+
+class BulkRejectIn(Schema):
+    ids: List[int]
+    reason: str
+
+class ReleaseClaimsIn(Schema):
+    ids: Optional[List[int]] = None  # None releases every item the moderator holds
+
+class BulkResultOut(Schema):
+    id: int
+    result: str
+
+class BulkModerationOut(Schema):
+    updated: int
+    results: List[BulkResultOut]
+
 
 class ModeratorIn(Schema):
     first_name: Optional[str] = ""
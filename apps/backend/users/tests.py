@@ -1,3 +1,237 @@
-from django.test import TestCase
+import asyncio
+import threading
+import time
 
-# Create your tests here.
+from asgiref.sync import async_to_sync
+from django.contrib.auth.hashers import PBKDF2PasswordHasher, make_password
+from django.test import SimpleTestCase, TestCase
+from django.utils import timezone
+
+from delivery_agent.middleware import agent_status_cache, get_agent_status
+from delivery_agent.models import DeliveryAgent
+from products.database import MAX_BULK_MODERATION
+from products.models import Category, Product
+from backend.hashing import HashingBusy, HashingExecutor, password_hasher, verify_password
+from .identity import IdentityLoader, user_identity_cache
+from .models import Role, UserProfile
+
+
+class IdentityLoaderTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.alice, cls.bob = [
+            UserProfile.objects.create(
+                first_name=name, last_name="Socket", email=f"{name}@example.com",
+                user_type="user", joined_date="2024-01-01",
+            )
+            for name in ("alice", "bob")
+        ]
+
+    def setUp(self):
+        user_identity_cache.clear()
+
+    def test_concurrent_loads_share_one_query_and_survive_a_cancelled_waiter(self):
+        user_ids = [self.alice.user_id, self.alice.user_id, self.bob.user_id, self.alice.user_id, 999999]
+
+        async def connect_burst():
+            loader = IdentityLoader(window=0.01)
+            waits = [asyncio.ensure_future(loader.load(user_id)) for user_id in user_ids]
+            await asyncio.sleep(0)
+            waits[1].cancel()   # one client drops mid-handshake
+            return await asyncio.gather(*waits, return_exceptions=True)
+
+        with self.assertNumQueries(1):
+            results = async_to_sync(connect_burst)()
+
+        self.assertIsInstance(results[1], asyncio.CancelledError)
+        self.assertEqual([r.email for r in (results[0], results[2], results[3])],
+                         ["alice@example.com", "bob@example.com", "alice@example.com"])
+        self.assertIsNone(results[4])
+        self.assertEqual(user_identity_cache.get(self.bob.user_id).email, "bob@example.com")
+
+
+class PasswordHashingTests(SimpleTestCase):
+    def test_full_queue_rejects_with_503(self):
+        executor = HashingExecutor(workers=0, max_pending=1)
+        started, release = threading.Event(), threading.Event()
+
+        def slow_hash():
+            started.set()
+            release.wait(5)
+            return "hashed"
+
+        holder = threading.Thread(target=executor.run, args=(slow_hash,))
+        holder.start()
+        started.wait(5)
+        with self.assertRaises(HashingBusy) as busy:
+            executor.run(lambda: "never runs")
+        self.assertEqual(busy.exception.status_code, 503)
+        release.set()
+        holder.join(5)
+
+        with self.assertRaises(ValueError):
+            executor.run(int, "not a number")
+        self.assertEqual(executor.run(lambda: "ok"), "ok")
+        stats = executor.stats()
+        self.assertEqual((stats["completed"], stats["failed"], stats["rejected"], stats["pending"]), (2, 1, 1, 0))
+
+    def test_timed_out_job_keeps_its_slot_until_it_finishes(self):
+        executor = HashingExecutor(workers=1, max_pending=1, timeout=10)
+        self.addCleanup(executor.shutdown)
+        executor.run(time.sleep, 0)   # start the pool outside the timed part
+
+        executor.timeout = 0.2
+        with self.assertRaises(HashingBusy):
+            executor.run(time.sleep, 1)
+        # The abandoned sleep still occupies the pool, so there is no room for more work
+        with self.assertRaises(HashingBusy):
+            executor.run(time.sleep, 0)
+        self.assertEqual(executor.stats()["pending"], 1)
+
+        time.sleep(1.2)
+        executor.timeout = 10
+        executor.run(time.sleep, 0)
+        stats = executor.stats()
+        self.assertEqual((stats["completed"], stats["timed_out"], stats["rejected"], stats["pending"]), (3, 1, 1, 0))
+
+    def test_verify_upgrades_outdated_hashes(self):
+        self.addCleanup(password_hasher.shutdown)
+        outdated = PBKDF2PasswordHasher().encode("s3cret", "saltsaltsalt", iterations=1000)
+        is_correct, upgraded = verify_password("s3cret", outdated)
+        self.assertTrue(is_correct)
+        self.assertNotEqual(upgraded, outdated)
+        self.assertEqual(verify_password("s3cret", upgraded), (True, None))
+
+        self.assertEqual(verify_password("wrong", outdated), (False, None))
+        self.assertEqual(verify_password("s3cret", make_password("s3cret")), (True, None))
+
+
+class BulkModerationTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        seller = UserProfile.objects.create(
+            first_name="Bulk", last_name="Seller", email="bulk@example.com",
+            user_type="user", joined_date="2024-01-01",
+        )
+
+        def product(name, approve_status):
+            return Product.objects.create(
+                name=name, description="desc", price=1, condition="Used", seller=seller,
+                status="Available", approve_status=approve_status,
+            )
+        cls.pending = [product(f"Pending {i}", "pending") for i in range(3)]
+        cls.approved = product("Approved", "approved")
+        cls.rejected = product("Rejected", "rejected")
+
+        def agent(name, approval_status):
+            return DeliveryAgent.objects.create(
+                first_name=name, last_name="Agent", email=f"{name}@example.com", phone_number=name,
+                transport_mode="bike", joined_date="2024-01-01", approval_status=approval_status,
+            )
+        cls.pending_agent = agent("pending", "pending")
+        cls.approved_agent = agent("approved", "approved")
+
+    def post(self, path, ids, **extra):
+        return self.client.post(f"/api/moderator/{path}", {"ids": ids, **extra}, content_type="application/json")
+
+    def test_request_size_is_capped(self):
+        self.assertEqual(self.post("bulk-approve-listings", []).status_code, 400)
+        too_many = list(range(1, MAX_BULK_MODERATION + 2))
+        self.assertEqual(self.post("bulk-approve-listings", too_many).status_code, 400)
+        self.assertEqual(self.post("bulk-reject-agents", too_many).status_code, 400)
+        self.assertEqual(self.post("bulk-approve-listings", too_many[:MAX_BULK_MODERATION]).status_code, 200)
+
+    def test_listing_results_per_id(self):
+        first = self.pending[0].product_id
+        ids = [first, self.approved.product_id, self.rejected.product_id, 999999, first]
+        body = self.post("bulk-reject-listings", ids, reason="duplicate").json()
+        self.assertEqual(body["updated"], 1)
+        self.assertEqual(body["results"], [
+            {"id": first, "result": "rejected"},
+            {"id": self.approved.product_id, "result": "already_approved"},
+            {"id": self.rejected.product_id, "result": "already_rejected"},
+            {"id": 999999, "result": "not_found"},
+        ])
+        self.assertEqual(Product.objects.get(pk=first).rejection_reason, "duplicate")
+
+        # Rejected listings can still be approved
+        body = self.post("bulk-approve-listings", [first, self.pending[1].product_id]).json()
+        self.assertEqual(body["updated"], 2)
+        self.assertEqual(Product.objects.filter(approve_status="approved").count(), 3)
+
+    def test_agent_results_per_id(self):
+        agent_status_cache.clear()
+        self.assertEqual(get_agent_status(self.pending_agent.agent_id), "pending")
+        body = self.post("bulk-approve-agents", [self.pending_agent.agent_id, self.approved_agent.agent_id, 999999]).json()
+        self.assertEqual([r["result"] for r in body["results"]], ["approved", "already_approved", "not_found"])
+        # The update skips post_save; the status cache is still told
+        self.assertEqual(get_agent_status(self.pending_agent.agent_id), "approved")
+
+
+class ModerationClaimTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        role = Role.objects.create(role_id=2, role_name="moderator")
+        cls.ann, cls.ben = [
+            UserProfile.objects.create(
+                first_name=name, last_name="Mod", email=f"{name}@example.com",
+                user_type="moderator", joined_date="2024-01-01", role=role,
+            )
+            for name in ("ann", "ben")
+        ]
+        category = Category.objects.create(category_name="Queue")
+        cls.products = [
+            Product.objects.create(
+                name=f"Listing {i}", description="desc", price=1, condition="Used", seller=cls.ann,
+                category=category, status="Available", approve_status="pending",
+            )
+            for i in range(5)
+        ]
+        Product.objects.create(
+            name="Done", description="desc", price=1, condition="Used", seller=cls.ann,
+            status="Available", approve_status="approved",
+        )
+
+    def claim(self, moderator, limit=2):
+        response = self.client.post(f"/api/moderator/claim-listings?moderator_id={moderator.user_id}&limit={limit}")
+        self.assertEqual(response.status_code, 200)
+        return [item["product_id"] for item in response.json()["items"]]
+
+    def release(self, moderator, ids=None):
+        return self.client.post(
+            f"/api/moderator/release-listings?moderator_id={moderator.user_id}", {"ids": ids}, content_type="application/json"
+        ).json()["released"]
+
+    def test_moderators_get_disjoint_batches(self):
+        ids = [p.product_id for p in self.products]
+        self.assertEqual(self.claim(self.ann), ids[:2])   # oldest first
+        self.assertEqual(self.claim(self.ben), ids[2:4])
+        # Ben keeps his own items and gets what is left; Ann's stay hers
+        self.assertEqual(self.claim(self.ben, limit=10), ids[2:])
+
+    def test_reclaim_renews_own_lease(self):
+        first = self.claim(self.ann)
+        expires = set(Product.objects.filter(pk__in=first).values_list("claim_expires_at", flat=True))
+        self.assertEqual(self.claim(self.ann), first)
+        renewed = set(Product.objects.filter(pk__in=first).values_list("claim_expires_at", flat=True))
+        self.assertGreater(min(renewed), max(expires))
+
+    def test_expired_lease_is_handed_out_again(self):
+        first = self.claim(self.ann)
+        Product.objects.filter(pk__in=first).update(claim_expires_at=timezone.now())
+        self.assertEqual(self.claim(self.ben), first)
+        self.assertEqual(set(Product.objects.filter(pk__in=first).values_list("claimed_by", flat=True)), {self.ben.user_id})
+
+    def test_release(self):
+        first = self.claim(self.ann, limit=3)
+        self.assertEqual(self.release(self.ben, first), 0)
+        self.assertEqual(self.release(self.ann, first[:1]), 1)
+        self.assertEqual(self.claim(self.ben, limit=1), first[:1])
+        self.assertEqual(self.release(self.ann), 2)
+        self.assertFalse(Product.objects.filter(claimed_by=self.ann.user_id).exists())
+
+    def test_claim_validation(self):
+        self.assertEqual(self.client.post("/api/moderator/claim-listings?moderator_id=999999").status_code, 404)
+        self.assertEqual(self.client.post(f"/api/moderator/claim-listings?moderator_id={self.ann.user_id}&limit=0").status_code, 422)
+        response = self.client.post(f"/api/moderator/claim-agents?moderator_id={self.ann.user_id}")
+        self.assertEqual(response.json()["items"], [])
@@ -35,7 +35,8 @@ const AcceptedDeliveries: React.FC = () => {
     const fetchDeliveries = async () => {
       try {
         const response = await fetch(
-          `${baseUrl}/delivery-agent/accepted-deliveries/${agentId}`
+          `${baseUrl}/delivery-agent/accepted-deliveries/${agentId}`,
+          { headers: { Authorization: `Bearer ${localStorage.getItem("token")}` } }
         );
         const data = await response.json();
         const accepted = data.filter(
@@ -93,7 +93,8 @@ const UserNavbar: React.FC = () => {
       const response = await fetch(`${API_BASE_URL}/chats/count/${userId}`);
       if (response.ok) {
         const data = await response.json();
-        setActiveChatCount(data.active_chats_count || 0);
+        // Badge shows conversations with unread messages
+        setActiveChatCount(data.unread_chats_count || 0);
       }
     } catch (err) {
       console.error("Error fetching chat count:", err);
@@ -34,7 +34,9 @@ const PendingRequest: React.FC = () => {
       setLoading(false);
       return;
     }
-    fetch(`${baseUrl}/delivery-agent/pending-requests/${agentId}`)
+    fetch(`${baseUrl}/delivery-agent/pending-requests/${agentId}`, {
+      headers: { Authorization: `Bearer ${localStorage.getItem("token")}` },
+    })
       .then(res => {
         if (!res.ok) throw new Error("Failed to fetch requests");
         return res.json();
@@ -52,8 +54,16 @@ const PendingRequest: React.FC = () => {
     try {
       const res = await fetch(
         `${baseUrl}/delivery-agent/accept-request/${requestId}/${agentId}`,
-        { method: "POST" }
+        {
+          method: "POST",
+          headers: { Authorization: `Bearer ${localStorage.getItem("token")}` },
+        }
       );
+      if (res.status === 409) {
+        showToast("Another agent already accepted this request.", "info");
+        setRequests(prev => prev.filter(r => r.request_id !== requestId));
+        return;
+      }
       if (!res.ok) throw new Error("Accept request failed");
 
       showToast("Request accepted!", "success");
@@ -33,7 +33,9 @@ const DeliveryDetails = () => {
     
     try {
       const API_BASE_URL = import.meta.env.VITE_API_BASE_URL;
-      const response = await fetch(`${API_BASE_URL}/delivery-agent/accepted-delivery-details/${requestId}`);
+      const response = await fetch(`${API_BASE_URL}/delivery-agent/accepted-delivery-details/${requestId}`, {
+        headers: { 'Authorization': `Bearer ${localStorage.getItem('token')}` },
+      });
       
       if (!response.ok) {
         throw new Error(`Failed to fetch delivery details: ${response.status} ${response.statusText}`);
@@ -62,6 +64,7 @@ const DeliveryDetails = () => {
         method: 'POST',
         headers: {
           'Content-Type': 'application/json',
+          'Authorization': `Bearer ${localStorage.getItem('token')}`,
         },
         body: JSON.stringify({ status: selectedStatus }),
       });
@@ -4,6 +4,7 @@ import { Send, ArrowLeft, User, Loader2 } from 'lucide-react';
 import { useWebSocket } from '../../hooks/useWebSocket'; // Adjust path as needed
 
 interface Message {
+  id?: number;
   type: string;
   message: string;
   original?: string;
@@ -24,8 +25,16 @@ const ChatRoom = () => {
   const [currentUser, setCurrentUser] = useState<any>(null);
   const [showOriginal, setShowOriginal] = useState<{[key: string]: boolean}>({});
   const [translationLoading, setTranslationLoading] = useState<{[key: string]: boolean}>({});
+  const [hasMoreHistory, setHasMoreHistory] = useState(false);
+  const [historyCursor, setHistoryCursor] = useState<number | null>(null);
+  const [loadingHistory, setLoadingHistory] = useState(false);
   const messagesEndRef = useRef<HTMLDivElement>(null);
   const chatContainerRef = useRef<HTMLDivElement>(null);
+  // Newest message id received; reconnects pass it as ?since= to get only what was missed
+  const lastMessageId = useRef<number | null>(null);
+  // Newest message id we've reported as read, and how far the other side has read
+  const lastReadSent = useRef<number>(0);
+  const [otherReadId, setOtherReadId] = useState<number>(0);
   const otherUserName = location.state?.otherUserName || '';
   // const other_user_email = useRef<string | null>(null);
 
@@ -48,11 +57,59 @@ const ChatRoom = () => {
   // WebSocket URL
   const wsUrl = getWebSocketUrl();
 
+  const toMessage = (msg: any): Message => ({
+    id: msg.id,
+    type: 'chat_message',
+    message: msg.message,
+    original: msg.message,
+    translated: msg.translated || undefined,
+    language: msg.language || undefined,
+    sender: msg.sender,
+    timestamp: msg.timestamp,
+    showTranslation: false
+  });
+
+  const trackMessageId = (id?: number) => {
+    if (id !== undefined && (lastMessageId.current === null || id > lastMessageId.current)) {
+      lastMessageId.current = id;
+    }
+  };
+
   // Handle incoming WebSocket messages
   const handleMessage = (data: any) => {
     console.log('Received WebSocket message:', data);
     
-    if (data.type === 'translation_result') {
+    if (data.type === 'sync') {
+      // Messages missed while disconnected, oldest first, in one or more batches
+      data.messages.forEach((msg: any) => trackMessageId(msg.id));
+      setMessages(prev => {
+        const known = new Set(prev.map(msg => msg.id).filter(id => id !== undefined));
+        const missed = data.messages.filter((msg: any) => !known.has(msg.id)).map(toMessage);
+        if (missed.length === 0) return prev;
+        // Broadcasts received while catching up may already be in the list
+        return [...prev, ...missed].sort((a, b) => (a.id ?? Infinity) - (b.id ?? Infinity));
+      });
+    } else if (data.type === 'history') {
+      // One page of past messages, oldest first; earlier pages go in front
+      setHasMoreHistory(data.has_more);
+      setHistoryCursor(data.before);
+      setLoadingHistory(false);
+      data.messages.forEach((msg: any) => trackMessageId(msg.id));
+      setMessages(prev => {
+        const known = new Set(prev.map(msg => msg.id).filter(id => id !== undefined));
+        const older: Message[] = data.messages.filter((msg: any) => !known.has(msg.id)).map(toMessage);
+        return [...older, ...prev];
+      });
+    } else if (data.type === 'read') {
+      // Read receipts are broadcast to the whole room, our own included
+      const ownEmail = JSON.parse(localStorage.getItem('currentUser') || '{}').email;
+      if (data.reader !== ownEmail) {
+        setOtherReadId(prev => Math.max(prev, data.message_id));
+      }
+    } else if (data.type === 'error') {
+      console.error('Chat error:', data.message);
+      setLoadingHistory(false);
+    } else if (data.type === 'translation_result') {
       console.log('Received translation result:', data);
       
       // Clear loading state for this translation
@@ -84,16 +141,20 @@ const ChatRoom = () => {
     } else {
       // Handle both chat_message type and regular messages
       console.log('Received chat message:', data);
+      trackMessageId(data.id);
       setMessages(prev => {
         // Check if message already exists
         const exists = prev.some(msg => 
-          msg.message === data.message && 
-          msg.sender === data.sender && 
-          msg.timestamp === data.timestamp
+          data.id !== undefined ? msg.id === data.id : (
+            msg.message === data.message && 
+            msg.sender === data.sender && 
+            msg.timestamp === data.timestamp
+          )
         );
         
         if (!exists) {
           const newMessage: Message = {
+            id: data.id,
             type: data.type || 'chat_message',
             message: data.message,
             original: data.original || data.message,
@@ -126,7 +187,8 @@ const ChatRoom = () => {
     wsUrl as string,
     handleMessage,
     handleConnect,
-    handleDisconnect
+    handleDisconnect,
+    () => (lastMessageId.current !== null ? { since: String(lastMessageId.current) } : {})
   );
 
   useEffect(() => {
@@ -151,6 +213,17 @@ const ChatRoom = () => {
     scrollToBottom();
   }, [messages]);
 
+  // Report messages as read once they're on screen
+  useEffect(() => {
+    const latest = lastMessageId.current;
+    if (!isConnected || latest === null || latest <= lastReadSent.current || document.visibilityState !== 'visible') {
+      return;
+    }
+    if (sendWSMessage({ type: 'read', message_id: latest })) {
+      lastReadSent.current = latest;
+    }
+  }, [messages, isConnected]);
+
   const scrollToBottom = () => {
     messagesEndRef.current?.scrollIntoView({ behavior: 'smooth' });
   };
@@ -171,6 +244,16 @@ const ChatRoom = () => {
     }
   };
 
+  const loadEarlierMessages = () => {
+    if (!isConnected || !hasMoreHistory || loadingHistory) {
+      return;
+    }
+    setLoadingHistory(true);
+    if (!sendWSMessage({ type: 'history', before: historyCursor })) {
+      setLoadingHistory(false);
+    }
+  };
+
   const handleKeyPress = (e: React.KeyboardEvent) => {
     if (e.key === 'Enter' && !e.shiftKey) {
       e.preventDefault();
@@ -214,6 +297,11 @@ const ChatRoom = () => {
     });
   };
 
+  const lastOwnMessageId = () => {
+    const own = messages.filter(msg => msg.id !== undefined && isOwnMessage(msg.sender));
+    return own.length ? own[own.length - 1].id : undefined;
+  };
+
   // Improved function to determine message ownership
   const isOwnMessage = (sender: string) => {
     if (!currentUser) return false;
@@ -323,7 +411,21 @@ const ChatRoom = () => {
             )}
           </div>
         ) : (
-          messages.map((msg, index) => (
+          <>
+          {hasMoreHistory && (
+            <div className="text-center">
+              <button
+                onClick={loadEarlierMessages}
+                disabled={loadingHistory || !isConnected}
+                className="text-sm hover:opacity-80 inline-flex items-center gap-1"
+                style={{ color: '#3A1078' }}
+              >
+                {loadingHistory && <Loader2 className="w-3 h-3 animate-spin" />}
+                Load earlier messages
+              </button>
+            </div>
+          )}
+          {messages.map((msg, index) => (
             <div
               key={`${msg.sender}-${msg.timestamp}-${index}`}
               className={`flex ${isOwnMessage(msg.sender) ? 'justify-end' : 'justify-start'}`}
@@ -354,6 +456,7 @@ const ChatRoom = () => {
                         isOwnMessage(msg.sender) ? 'text-white text-opacity-70' : 'text-gray-500'
                       }`}>
                         {formatTime(msg.timestamp)}
+                        {msg.id !== undefined && msg.id === lastOwnMessageId() && otherReadId >= msg.id && ' · Seen'}
                       </p>
                     )}
                     
@@ -397,7 +500,8 @@ const ChatRoom = () => {
                 </div>
               </div>
             </div>
-          ))
+          ))}
+          </>
         )}
         <div ref={messagesEndRef} />
       </div>
@@ -9,7 +9,7 @@ export default function MyProfile() {
             try {
                 const response = await fetch("http://127.0.0.1:8000/api/products");
                 const data = await response.json();
-                setProducts(data);
+                setProducts(data.results);
             } catch (err) {
                 console.error("Failed to fetch products", err);
             }
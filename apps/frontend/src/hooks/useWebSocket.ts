@@ -14,7 +14,8 @@ export const useWebSocket = (
   url: string,
   onMessage?: (data: any) => void,
   onConnect?: () => void,
-  onDisconnect?: () => void
+  onDisconnect?: () => void,
+  getQueryParams?: () => Record<string, string> // read on every (re)connect
 ): UseWebSocketReturn => {
   const [socket, setSocket] = useState<WebSocket | null>(null);
   const [isConnected, setIsConnected] = useState<boolean>(false);
@@ -35,6 +36,9 @@ export const useWebSocket = (
       // Add the token as a query parameter
       const wsUrl = new URL(url);
       wsUrl.searchParams.append('token', token);
+      if (getQueryParams) {
+        Object.entries(getQueryParams()).forEach(([key, value]) => wsUrl.searchParams.set(key, value));
+      }
       
       console.log('Connecting to WebSocket with token:', token.substring(0, 20) + '...');
       